@@ -1,21 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import Any, List, Optional
 from datetime import date, datetime
 
-from ....core.database import get_session
+from ....core.config import settings
+from ....core.database import get_async_session, stream_rows
+from ....core.response_cache import cache_tags, response_cache
+from ....core.pagination import apply_keyset, decode_cursor, set_next_cursor
 from ....core.security import get_current_user
+from ....core.serialization import SERIES_RESPONSES, export_response, series_response
 from ....models.user import User
 from ....models.asset import Asset, AssetPrice
-from ....schemas.asset import AssetCreate, AssetResponse, AssetUpdate, AssetPriceResponse
+from ....schemas.asset import (
+    AssetCreate, AssetResponse, AssetUpdate, AssetPriceResponse, AssetSentimentResponse, EventCorrelationResponse,
+)
+from ....services.correlation import load_asset_correlations
+from ....services.price_store import BAR_FIELDS
+from ....services.resampling import load_price_columns, parse_interval, price_export_queries
+from ....services.sentiment import load_sentiment_columns
 
 router = APIRouter()
 
-@router.get("/", response_model=List[AssetResponse])
-def get_assets(
+@router.get("/", response_model=List[AssetResponse], dependencies=[Depends(cache_tags("assets"))])
+async def get_assets(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
+    response: Response,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
     asset_type: Optional[str] = None,
@@ -36,22 +50,25 @@ def get_assets(
         query = query.filter(Asset.region == region)
     
     # Apply pagination
+    cursor_values = decode_cursor(cursor, "assets") if cursor else None
+    query = apply_keyset(query, (Asset.id,), cursor_values)
     query = query.offset(skip).limit(limit)
     
-    assets = session.exec(query).all()
+    assets = (await session.exec(query)).all()
+    set_next_cursor(response, "assets", [(asset.id,) for asset in assets], limit)
     return assets
 
-@router.get("/{asset_id}", response_model=AssetResponse)
-def get_asset(
+@router.get("/{asset_id}", response_model=AssetResponse, dependencies=[Depends(cache_tags("asset:{asset_id}"))])
+async def get_asset(
     *,
     asset_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Get a specific asset by id.
     """
-    asset = session.get(Asset, asset_id)
+    asset = await session.get(Asset, asset_id)
     if not asset:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -61,24 +78,24 @@ def get_asset(
     return asset
 
 @router.post("/", response_model=AssetResponse, status_code=status.HTTP_201_CREATED)
-def create_asset(
+async def create_asset(
     *,
     asset_in: AssetCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Create new asset.
     """
     # Check if user has permission to create assets
-    if not current_user.is_admin:
+    if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
     # Check if asset with given symbol already exists
-    existing_asset = session.query(Asset).filter(Asset.symbol == asset_in.symbol).first()
+    existing_asset = (await session.exec(select(Asset).where(Asset.symbol == asset_in.symbol))).first()
     if existing_asset:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -86,33 +103,34 @@ def create_asset(
         )
     
     # Create new asset
-    asset = Asset.from_schema(asset_in)
+    asset = Asset.model_validate(asset_in)
     
     session.add(asset)
-    session.commit()
-    session.refresh(asset)
+    await session.commit()
+    await session.refresh(asset)
+    response_cache.invalidate("assets")
     
     return asset
 
 @router.put("/{asset_id}", response_model=AssetResponse)
-def update_asset(
+async def update_asset(
     *,
     asset_id: int,
     asset_in: AssetUpdate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Update an asset.
     """
     # Check if user has permission to update assets
-    if not current_user.is_admin:
+    if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    asset = session.get(Asset, asset_id)
+    asset = await session.get(Asset, asset_id)
     if not asset:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -120,86 +138,199 @@ def update_asset(
         )
     
     # Update asset attributes
-    asset_data = asset_in.dict(exclude_unset=True)
+    asset_data = asset_in.model_dump(exclude_unset=True)
     for key, value in asset_data.items():
         setattr(asset, key, value)
     
     session.add(asset)
-    session.commit()
-    session.refresh(asset)
+    await session.commit()
+    await session.refresh(asset)
+    response_cache.invalidate("assets", f"asset:{asset_id}")
     
     return asset
 
 @router.delete("/{asset_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_asset(
+async def delete_asset(
     *,
     asset_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> None:
     """
     Delete an asset.
     """
     # Check if user has permission to delete assets
-    if not current_user.is_admin:
+    if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    asset = session.get(Asset, asset_id)
+    asset = await session.get(Asset, asset_id)
     if not asset:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Asset not found"
         )
     
-    session.delete(asset)
-    session.commit()
+    await session.delete(asset)
+    await session.commit()
+    response_cache.invalidate("assets", f"asset:{asset_id}")
 
-@router.get("/{asset_id}/prices", response_model=List[AssetPriceResponse])
-def get_asset_prices(
+@router.get(
+    "/{asset_id}/prices", response_model=List[AssetPriceResponse], responses=SERIES_RESPONSES,
+    dependencies=[Depends(cache_tags("asset:{asset_id}", "asset-prices:{asset_id}"))],
+)
+async def get_asset_prices(
     *,
     asset_id: int,
-    session: Session = Depends(get_session),
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    interval: Optional[str] = "1d"  # Options: 1m, 1h, 1d
+    interval: Optional[str] = "1d"  # e.g. 1m, 5m, 1h, 4h, 1d, 1w
 ) -> Any:
     """
     Get historical price data for an asset.
+
+    Rows are JSON objects by default; send `Accept` with the columnar JSON or
+    Arrow stream media type for one array per field.
     """
-    asset = session.get(Asset, asset_id)
+    asset = await session.get(Asset, asset_id)
     if not asset:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Asset not found"
         )
     
-    query = select(AssetPrice).where(AssetPrice.asset_id == asset_id)
-    
-    # Apply date range filters if provided
-    if start_date:
-        query = query.filter(AssetPrice.timestamp >= start_date)
-    if end_date:
-        query = query.filter(AssetPrice.timestamp <= end_date)
-    
-    # Apply interval filter (this is a simplified implementation)
-    # In a real application, you might have different tables for different intervals
-    # or a more sophisticated way to handle this
-    if interval == "1m":
-        # Return minute-by-minute data
-        pass
-    elif interval == "1h":
-        # Return hourly data
-        pass
-    elif interval == "1d":
-        # Return daily data
-        pass
-    
-    # Order by timestamp
-    query = query.order_by(AssetPrice.timestamp)
-    
-    prices = session.exec(query).all()
-    return prices 
\ No newline at end of file
+    # Bars are bucketed server side: rollup intervals come from the rollup
+    # tables, anything else is resampled from the closest finer source
+    if interval:
+        try:
+            parse_interval(interval)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported interval: {interval}"
+            )
+    
+    # DB output is trusted, so it is serialized directly instead of being
+    # validated row by row through the response model
+    prices = await session.run_sync(
+        load_price_columns, asset_id, interval, start_date, end_date
+    )
+    return series_response(request, prices)
+
+@router.get("/{asset_id}/prices/export", response_class=StreamingResponse)
+async def export_asset_prices(
+    *,
+    asset_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    interval: Optional[str] = None  # Raw bars, or one of PRICE_ROLLUP_INTERVALS
+) -> Any:
+    """
+    Export the price history of an asset as NDJSON or CSV.
+
+    Rows are streamed from a server-side cursor in chunks, so a full
+    history of raw bars exports in constant memory. The body is gzip
+    compressed when the request accepts it.
+    """
+    asset = await session.get(Asset, asset_id)
+    if not asset:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Asset not found"
+        )
+    
+    try:
+        queries = await session.run_sync(price_export_queries, asset_id, interval, start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    # The body outlives this request's session; rows are read on a session
+    # of their own
+    await session.close()
+    return export_response(
+        request, stream_rows(queries, settings.EXPORT_BATCH_SIZE), BAR_FIELDS, format, f"{asset.symbol}-prices"
+    )
+
+@router.get(
+    "/{asset_id}/events", response_model=List[EventCorrelationResponse], responses=SERIES_RESPONSES,
+    dependencies=[Depends(cache_tags("asset:{asset_id}", "asset-prices:{asset_id}", "news"))],
+)
+async def get_asset_event_correlations(
+    *,
+    asset_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    window: Optional[int] = Query(None, ge=1, le=250)
+) -> Any:
+    """
+    News mentioning an asset, each with the daily bar of its publication day:
+    price change, abnormal return and volume spike against the preceding
+    `window` bars.
+    """
+    asset = await session.get(Asset, asset_id)
+    if not asset:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Asset not found"
+        )
+    
+    correlations = await session.run_sync(
+        load_asset_correlations, asset_id, start_date, end_date, window
+    )
+    return series_response(request, correlations)
+
+@router.get(
+    "/{asset_id}/sentiment", response_model=List[AssetSentimentResponse], responses=SERIES_RESPONSES,
+    dependencies=[Depends(cache_tags("asset:{asset_id}", "asset-sentiment:{asset_id}"))],
+)
+async def get_asset_sentiment(
+    *,
+    asset_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    interval: str = "1d"  # One of SENTIMENT_ROLLUP_INTERVALS or a multiple, e.g. 1w
+) -> Any:
+    """
+    Sentiment of the news mentioning an asset over time: per bucket, the
+    mean sentiment weighted by how often each item mentions the asset,
+    with analyst overrides in place of the analysis score.
+
+    Read from rollups kept current on every analysis, annotation and
+    mention write, so the cost grows with the number of buckets, not of
+    news items.
+    """
+    asset = await session.get(Asset, asset_id)
+    if not asset:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Asset not found"
+        )
+    
+    try:
+        sentiment = await session.run_sync(
+            load_sentiment_columns, asset_id, interval, start_date, end_date
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return series_response(request, sentiment)
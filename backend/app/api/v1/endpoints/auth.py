@@ -1,16 +1,39 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import timedelta
+from typing import Optional
 from ....core.config import settings
+from ....core.database import get_async_session
+from ....core.hashing import HashingUnavailable, password_hasher
 from ....core.security import create_access_token
-from ....schemas.user import User, UserCreate
+from ....models.user import User as UserModel
+from ....schemas.user import UserCreate, UserRead
 
 router = APIRouter()
 
+async def authenticate_user(session: AsyncSession, username: str, password: str) -> Optional[UserModel]:
+    user = (await session.exec(select(UserModel).where(UserModel.username == username))).first()
+    if user is None:
+        return None
+    try:
+        # bcrypt runs in the hashing worker pool, off the event loop
+        valid = await password_hasher.verify(password, user.hashed_password)
+    except HashingUnavailable:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    return user if valid and user.is_active else None
+
 @router.post("/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    # Add your authentication logic here
-    user = authenticate_user(form_data.username, form_data.password)
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    session: AsyncSession = Depends(get_async_session)
+):
+    user = await authenticate_user(session, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -24,10 +47,29 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-@router.post("/register", response_model=User)
-async def register(user: UserCreate):
-    # Add your registration logic here
-    pass
+@router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
+async def register(
+    user_in: UserCreate,
+    session: AsyncSession = Depends(get_async_session)
+):
+    taken = (await session.exec(select(UserModel).where(
+        (UserModel.username == user_in.username) | (UserModel.email == user_in.email)
+    ))).first()
+    if taken:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A user with this username or email already exists"
+        )
+    
+    # Self-registered accounts are always active, plain users
+    user = UserModel.model_validate(
+        user_in.model_dump(exclude={"password", "is_active", "is_superuser"}),
+        update={"hashed_password": await password_hasher.hash(user_in.password)},
+    )
+    session.add(user)
+    await session.commit()
+    await session.refresh(user)
+    return user
 
 @router.post("/logout")
 async def logout():
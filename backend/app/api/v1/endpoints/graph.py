@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Any, List, Optional
+from datetime import date
+
+from ....core.database import get_async_session
+from ....core.security import get_current_user
+from ....models.user import User
+from ....schemas.graph import EntityGraphResponse, EntityNeighbour
+from ....services.entity_graph import entity_subgraph, top_neighbours
+
+router = APIRouter()
+
+@router.get("/graph/entities", response_model=EntityGraphResponse)
+async def get_entity_graph(
+    *,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    entity: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=5000)
+) -> Any:
+    """
+    Entity co-occurrence subgraph of the news published in a time window.
+
+    Returns the `limit` strongest links, optionally only those of `entity`.
+    """
+    return await session.run_sync(entity_subgraph, start_date, end_date, limit, entity)
+
+@router.get("/graph/entities/{entity}/neighbours", response_model=List[EntityNeighbour])
+async def get_entity_neighbours(
+    *,
+    entity: str,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    k: int = Query(10, ge=1, le=500)
+) -> Any:
+    """
+    Entities most often mentioned together with `entity`.
+    """
+    return await session.run_sync(top_neighbours, entity, k, start_date, end_date)
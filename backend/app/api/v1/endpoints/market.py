@@ -1,8 +1,13 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request
+from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
 
+from ....core.response_cache import cache_tags
+from ....core.serialization import SERIES_RESPONSES, columns_from_rows, series_response
+from ....services.correlation import correlation_columns
+from .news import DEMO_NEWS_EVENTS
+
 router = APIRouter()
 
 class MarketData(BaseModel):
@@ -47,19 +52,60 @@ DEMO_MARKET_DATA = [
     {"date": "2024-06-05", "open": 3520, "close": 3600, "high": 3620, "low": 3510, "volume": 800}
 ]
 
-@router.get("/market/data", response_model=List[MarketData])
-async def get_market_data():
+# Validated once here instead of through the response model on every request
+MARKET_FIELDS = list(MarketData.model_fields)
+_MARKET_ROWS = [MarketData(**data).model_dump() for data in DEMO_MARKET_DATA]
+_MARKET_COLUMNS = columns_from_rows(_MARKET_ROWS, MARKET_FIELDS)
+
+class EventCorrelation(BaseModel):
+    date: str
+    title: str
+    relation: str
+    bar_date: Optional[str] = None
+    price_change: Optional[float] = None
+    abnormal_return: Optional[float] = None
+    volume_spike: Optional[float] = None
+
+# The demo timeline never changes, so it is correlated once at startup
+_EVENT_CORRELATIONS = correlation_columns(
+    columns_from_rows(DEMO_NEWS_EVENTS, ["date", "title", "relation"]),
+    [event["date"] for event in DEMO_NEWS_EVENTS],
+    _MARKET_COLUMNS["date"],
+    _MARKET_COLUMNS["open"],
+    _MARKET_COLUMNS["close"],
+    _MARKET_COLUMNS["volume"],
+)
+
+@router.get(
+    "/market/data", response_model=List[MarketData], responses=SERIES_RESPONSES,
+    dependencies=[Depends(cache_tags("market"))],
+)
+async def get_market_data(request: Request):
     """
     Get all market data points (Demo data)
     """
-    return DEMO_MARKET_DATA
+    return series_response(request, _MARKET_COLUMNS)
+
+@router.get(
+    "/market/correlation", response_model=List[EventCorrelation], responses=SERIES_RESPONSES,
+    dependencies=[Depends(cache_tags("market"))],
+)
+async def get_event_correlations(request: Request):
+    """
+    News events matched to the bar of their day, with price change, abnormal
+    return and volume spike (Demo data)
+    """
+    return series_response(request, _EVENT_CORRELATIONS)
 
-@router.get("/market/data/{date}", response_model=List[MarketData])
-async def get_market_data_by_date(date: str):
+@router.get(
+    "/market/data/{date}", response_model=List[MarketData], responses=SERIES_RESPONSES,
+    dependencies=[Depends(cache_tags("market"))],
+)
+async def get_market_data_by_date(date: str, request: Request):
     """
     Get market data for a specific date (Demo data)
     """
-    matching_data = [data for data in DEMO_MARKET_DATA if data["date"] == date]
+    matching_data = [data for data in _MARKET_ROWS if data["date"] == date]
     if not matching_data:
         raise HTTPException(status_code=404, detail="Market data not found for this date")
-    return matching_data 
\ No newline at end of file
+    return series_response(request, columns_from_rows(matching_data, MARKET_FIELDS))
\ No newline at end of file
@@ -1,14 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlmodel import Session, select
-from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
 from datetime import date, datetime
 from pydantic import BaseModel
+import json
 
-from ....core.database import get_session
+from ....core.config import settings
+from ....core.database import get_async_session, read_connection, stream_rows, write_queue
+from ....core.response_cache import add_cache_tags, cache_tags, response_cache
+from ....core.pagination import apply_keyset, decode_cursor, set_next_cursor
+from ....core.serialization import export_response
 from ....core.security import get_current_user
 from ....models.user import User
-from ....models.news import NewsItem, NewsEvent
-from ....schemas.news import NewsCreate, NewsResponse, NewsUpdate
+from ....models.analysis import Analysis
+from ....models.asset import Asset
+from ....models.news import AssetMention, NewsItem
+from ....schemas.news import AnalysisProgress, NewsCreate, NewsIngestResponse, NewsResponse, NewsUpdate, NewsWithRelations
+from ....services.analysis_worker import analysis_worker, enqueue_analysis, queue_counts
+from ....services.ingestion import content_hash, ingest_news, url_hash
+from ....services.search import get_search_backend
 
 router = APIRouter()
 
@@ -33,193 +46,434 @@ DEMO_NEWS_EVENTS = [
     {"date": "2024-06-05", "title": "A国宣布正式发行数字法币", "content": "第一阶段覆盖大额机构交易...", "entities": [], "relation": "成果落地"}
 ]
 
-@router.get("/", response_model=List[NewsResponse])
-def get_news_items(
+# Related rows that reads can ask for with `include`
+NEWS_INCLUDES = ("analysis", "assets", "annotations")
+
+def parse_include(include: Optional[str]) -> Set[str]:
+    includes = {name.strip() for name in (include or "").split(",") if name.strip()}
+    unknown = includes - set(NEWS_INCLUDES)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown include: {', '.join(sorted(unknown))}. Supported: {', '.join(NEWS_INCLUDES)}"
+        )
+    # Annotations are returned inside the analysis
+    if "annotations" in includes:
+        includes.add("analysis")
+    return includes
+
+def _include_options(includes: Set[str]) -> List[Any]:
+    """
+    Loader options that fetch the included relationships of a whole page
+    with one extra query each, instead of one per news item.
+    """
+    options = []
+    if "analysis" in includes:
+        loader = selectinload(NewsItem.analysis)
+        if "annotations" in includes:
+            loader = loader.selectinload(Analysis.annotations)
+        options.append(loader)
+    if "assets" in includes:
+        options.append(selectinload(NewsItem.asset_mentions).joinedload(AssetMention.asset))
+    return options
+
+def _include_tags(request: Request, includes: Set[str]) -> None:
+    # Cached pages with related rows must also go when those rows change
+    if "analysis" in includes:
+        add_cache_tags(request, "analysis")
+    if "assets" in includes:
+        add_cache_tags(request, "assets")
+
+def _news_payload(news_item: NewsItem, includes: Set[str]) -> Dict[str, Any]:
+    payload = news_item.model_dump()
+    if "analysis" in includes:
+        analysis = news_item.analysis
+        payload["analysis"] = analysis.model_dump() if analysis is not None else None
+        if analysis is not None and "annotations" in includes:
+            payload["analysis"]["annotations"] = [annotation.model_dump() for annotation in analysis.annotations]
+    if "assets" in includes:
+        payload["assets"] = [
+            {**mention.asset.model_dump(), "mention_count": mention.mention_count}
+            for mention in news_item.asset_mentions
+        ]
+    return payload
+
+def _filter_news(
+    query,
+    start_date: Optional[date],
+    end_date: Optional[date],
+    asset_symbol: Optional[str],
+    sentiment: Optional[float],
+    collapse_duplicates: bool = False,
+):
+    """
+    The filters shared by the news list and export endpoints.
+    """
+    if collapse_duplicates:
+        # Only the first item of each near-duplicate cluster
+        query = query.filter(NewsItem.cluster_id.is_(None))
+    if start_date:
+        query = query.filter(NewsItem.published_at >= start_date)
+    if end_date:
+        query = query.filter(NewsItem.published_at <= end_date)
+    if asset_symbol:
+        query = query.filter(NewsItem.asset_mentions.any(AssetMention.asset.has(Asset.symbol == asset_symbol)))
+    if sentiment is not None:
+        query = query.filter(NewsItem.analysis.has(Analysis.sentiment_score == sentiment))
+    return query
+
+@router.get(
+    "/", response_model=List[NewsWithRelations], response_model_exclude_unset=True,
+    dependencies=[Depends(cache_tags("news"))],
+)
+async def get_news_items(
     *,
-    session: Session = Depends(get_session),
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
+    response: Response,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     keyword: Optional[str] = None,
     asset_symbol: Optional[str] = None,
-    sentiment: Optional[float] = None
+    sentiment: Optional[float] = None,
+    collapse_duplicates: bool = False,
+    include: Optional[str] = None
 ) -> Any:
     """
     Retrieve news items with optional filtering.
+
+    Newest first, or best match first when searching by keyword. Pass the
+    X-Next-Cursor header of a page as `cursor` to fetch the next one.
+    `include` is a comma separated list of related rows to embed:
+    analysis, assets (mentioned assets) and annotations. With
+    `collapse_duplicates`, near-duplicates of an earlier story are left out.
     """
-    query = select(NewsItem)
-    
-    # Apply filters if provided
-    if start_date:
-        query = query.filter(NewsItem.published_date >= start_date)
-    if end_date:
-        query = query.filter(NewsItem.published_date <= end_date)
+    includes = parse_include(include)
     if keyword:
-        query = query.filter(NewsItem.headline.contains(keyword) | NewsItem.content.contains(keyword))
-    if asset_symbol:
-        # This assumes you have a relationship between news and assets
-        # You might need to adjust this based on your actual model structure
-        query = query.filter(NewsItem.assets.any(symbol=asset_symbol))
-    if sentiment is not None:
-        # This assumes you have a sentiment field in your news model
-        # You might need to adjust this based on your actual model structure
-        query = query.filter(NewsItem.sentiment == sentiment)
+        # Full-text index lookup, best BM25 matches first
+        hits = get_search_backend().search(keyword).subquery()
+        query = select(NewsItem, hits.c.score).join(hits, hits.c.news_id == NewsItem.id)
+        cursor_kind, sort_columns, descending = "news-search", (hits.c.score, NewsItem.id), False
+    else:
+        query = select(NewsItem)
+        cursor_kind, sort_columns, descending = "news", (NewsItem.published_at, NewsItem.id), True
+    
+    query = _filter_news(query, start_date, end_date, asset_symbol, sentiment, collapse_duplicates)
     
     # Apply pagination
-    query = query.offset(skip).limit(limit)
+    cursor_values = decode_cursor(cursor, cursor_kind) if cursor else None
+    query = apply_keyset(query, sort_columns, cursor_values, descending)
+    query = query.offset(skip).limit(limit).options(*_include_options(includes))
     
-    news_items = session.exec(query).all()
-    return news_items
+    rows = (await session.exec(query)).all()
+    if keyword:
+        news_items = [news_item for news_item, _ in rows]
+        keys = [(score, news_item.id) for news_item, score in rows]
+    else:
+        news_items = rows
+        keys = [(news_item.published_at, news_item.id) for news_item in rows]
+    set_next_cursor(response, cursor_kind, keys, limit)
+    _include_tags(request, includes)
+    return [_news_payload(news_item, includes) for news_item in news_items]
 
-@router.get("/{news_id}", response_model=NewsResponse)
-def get_news_item(
+@router.get(
+    "/{news_id}", response_model=NewsWithRelations, response_model_exclude_unset=True,
+    dependencies=[Depends(cache_tags("news:{news_id}"))],
+)
+async def get_news_item(
     *,
     news_id: int,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+    include: Optional[str] = None
 ) -> Any:
     """
-    Get a specific news item by id.
+    Get a specific news item by id, with the related rows named in
+    `include` (see get_news_items).
     """
-    news_item = session.get(NewsItem, news_id)
+    includes = parse_include(include)
+    news_item = await session.get(NewsItem, news_id, options=_include_options(includes))
     if not news_item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="News item not found"
         )
     
-    return news_item
+    _include_tags(request, includes)
+    return _news_payload(news_item, includes)
 
 @router.post("/", response_model=NewsResponse, status_code=status.HTTP_201_CREATED)
-def create_news_item(
+async def create_news_item(
     *,
     news_in: NewsCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Create new news item.
     """
-    # Check if user has permission to create news items
-    if not current_user.is_admin and not current_user.can_create_news:
+    # Writing news is for superusers, the only permission User has
+    if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    # Create new news item
-    news_item = NewsItem.from_schema(news_in)
-    news_item.created_by_id = current_user.id
+    # Create new news item, with the dedup keys bulk ingestion matches on
+    news_item = NewsItem.model_validate(news_in.model_dump(exclude_none=True))
+    news_item.url_hash = url_hash(news_item.url)
+    news_item.content_hash = content_hash(news_item.title, news_item.content)
     
     session.add(news_item)
-    session.commit()
-    session.refresh(news_item)
+    await session.commit()
+    await session.refresh(news_item)
+    response_cache.invalidate("news")
     
     return news_item
 
+async def _read_news_batches(request: Request, batch_size: int) -> AsyncIterator[List[Any]]:
+    """
+    Split a bulk request body into batches. NDJSON bodies are consumed as
+    they stream in; anything else must be a JSON array.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        batch: List[Any] = []
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    batch.append(_parse_ndjson_line(line))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if buffer.strip():
+            batch.append(_parse_ndjson_line(buffer))
+        if batch:
+            yield batch
+        return
+
+    try:
+        items = await request.json()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Request body must be a JSON array or NDJSON"
+        )
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Request body must be a JSON array or NDJSON"
+        )
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+def _parse_ndjson_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        # Undecodable lines are kept so they are reported as invalid items
+        return line.decode("utf-8", errors="replace")
+
+@router.post("/bulk", response_model=NewsIngestResponse)
+async def bulk_ingest_news(
+    *,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    Ingest many news items in one request.
+
+    Accepts a JSON array or an NDJSON stream (`application/x-ndjson`).
+    Items are inserted and committed in batches, and duplicates by
+    normalized URL or content are skipped. Returns a status per item.
+    """
+    # Bulk ingestion is for superusers, the only permission User has
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    report = NewsIngestResponse()
+    offset = 0
+    async for batch in _read_news_batches(request, settings.INGEST_BATCH_SIZE):
+        # On the write queue, so batches of concurrent uploads and the
+        # analysis worker's writes share commits instead of the lock
+        batch_report = await write_queue.run_async(
+            lambda connection, batch=batch, offset=offset: ingest_news(connection, batch, offset)
+        )
+        report.created += batch_report.created
+        report.duplicates += batch_report.duplicates
+        report.near_duplicates += batch_report.near_duplicates
+        report.invalid += batch_report.invalid
+        report.results.extend(batch_report.results)
+        offset += len(batch)
+    
+    if report.created:
+        response_cache.invalidate("news")
+        if settings.ANALYZE_ON_INGEST:
+            analysis_worker.notify()
+    return report
+
 @router.put("/{news_id}", response_model=NewsResponse)
-def update_news_item(
+async def update_news_item(
     *,
     news_id: int,
     news_in: NewsUpdate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Update a news item.
     """
-    news_item = session.get(NewsItem, news_id)
+    news_item = await session.get(NewsItem, news_id)
     if not news_item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="News item not found"
         )
     
-    # Check if user has permission to update this news item
-    if not current_user.is_admin and news_item.created_by_id != current_user.id:
+    if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
     # Update news item attributes
-    news_data = news_in.dict(exclude_unset=True)
+    news_data = news_in.model_dump(exclude_unset=True)
     for key, value in news_data.items():
         setattr(news_item, key, value)
-    
-    news_item.updated_by_id = current_user.id
+    news_item.url_hash = url_hash(news_item.url)
+    news_item.content_hash = content_hash(news_item.title, news_item.content)
     
     session.add(news_item)
-    session.commit()
-    session.refresh(news_item)
+    await session.commit()
+    await session.refresh(news_item)
+    response_cache.invalidate("news", f"news:{news_id}")
     
     return news_item
 
 @router.delete("/{news_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_news_item(
+async def delete_news_item(
     *,
     news_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> None:
     """
     Delete a news item.
     """
-    news_item = session.get(NewsItem, news_id)
+    news_item = await session.get(NewsItem, news_id)
     if not news_item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="News item not found"
         )
     
-    # Check if user has permission to delete this news item
-    if not current_user.is_admin and news_item.created_by_id != current_user.id:
+    if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    session.delete(news_item)
-    session.commit()
+    await session.delete(news_item)
+    await session.commit()
+    response_cache.invalidate("news", f"news:{news_id}")
 
 @router.post("/{news_id}/reanalyze", response_model=NewsResponse)
-def reanalyze_news_item(
+async def reanalyze_news_item(
     *,
     news_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Trigger re-analysis of a news item.
+
+    The item is queued for the background analysis worker; its Analysis is
+    replaced once the worker gets to it.
     """
-    news_item = session.get(NewsItem, news_id)
+    news_item = await session.get(NewsItem, news_id)
     if not news_item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="News item not found"
         )
     
-    # Here you would trigger your AI pipeline to re-analyze the news item
-    # This is a placeholder for the actual implementation
-    
-    # For example, you might set a flag to indicate that re-analysis is needed
-    news_item.needs_reanalysis = True
-    session.add(news_item)
-    session.commit()
-    session.refresh(news_item)
+    await session.run_sync(lambda sync_session: enqueue_analysis(sync_session.connection(), [news_id]))
+    await session.commit()
+    analysis_worker.notify()
     
     return news_item
 
-@router.get("/news/events", response_model=List[NewsEvent])
+@router.get("/analysis/progress", response_model=AnalysisProgress)
+async def get_analysis_progress(
+    *,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    Analysis queue depth by job status and worker throughput.
+    """
+    counts = await session.run_sync(lambda sync_session: queue_counts(read_connection(sync_session)))
+    return AnalysisProgress(jobs=counts, worker=analysis_worker.stats())
+
+# Columns of exported news, in output order
+NEWS_EXPORT_FIELDS = list(NewsResponse.model_fields)
+
+@router.get("/news/export", response_class=StreamingResponse)
+async def export_news(
+    *,
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    keyword: Optional[str] = None,
+    asset_symbol: Optional[str] = None,
+    sentiment: Optional[float] = None,
+    collapse_duplicates: bool = False
+) -> Any:
+    """
+    Export all news items matching the filters of the news list as NDJSON
+    or CSV.
+
+    Rows are streamed from a server-side cursor in chunks, so memory use
+    does not depend on the result size. The body is gzip compressed when
+    the request accepts it.
+    """
+    columns = [getattr(NewsItem, field) for field in NEWS_EXPORT_FIELDS]
+    if keyword:
+        hits = get_search_backend().search(keyword).subquery()
+        query = select(*columns).join(hits, hits.c.news_id == NewsItem.id).order_by(hits.c.score, NewsItem.id)
+    else:
+        query = select(*columns).order_by(NewsItem.published_at.desc(), NewsItem.id.desc())
+    query = _filter_news(query, start_date, end_date, asset_symbol, sentiment, collapse_duplicates)
+    
+    # The body outlives this request's session; rows are read on a session
+    # of their own
+    await session.close()
+    return export_response(
+        request, stream_rows([query], settings.EXPORT_BATCH_SIZE), NEWS_EXPORT_FIELDS, format, "news"
+    )
+
+@router.get("/news/events", response_model=List[NewsEvent], dependencies=[Depends(cache_tags("news-events"))])
 async def get_news_events():
     """
     Get all news events with their details (Demo data)
     """
     return DEMO_NEWS_EVENTS
 
-@router.get("/news/events/{event_id}", response_model=NewsEvent)
+@router.get("/news/events/{event_id}", response_model=NewsEvent, dependencies=[Depends(cache_tags("news-events"))])
 async def get_news_event(event_id: int):
     """
     Get a specific news event by ID (Demo data)
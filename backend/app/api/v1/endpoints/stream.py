@@ -0,0 +1,177 @@
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from starlette.requests import HTTPConnection
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+
+from ....core.config import settings
+from ....core.database import get_async_session_factory
+from ....core.security import user_from_token
+from ....models.asset import Asset
+from ....services.stream import SLOW_CONSUMER, StreamEvent, Subscription, SubscriptionClosed, stream_bus
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Symbols and keywords accepted per subscription
+MAX_FILTERS = 50
+
+def _split(values: Optional[str]) -> List[str]:
+    """
+    Distinct non-empty entries of a comma separated query parameter.
+    """
+    entries = dict.fromkeys(value.strip() for value in (values or "").split(","))
+    entries.pop("", None)
+    return list(entries)[:MAX_FILTERS]
+
+def _bearer(connection: HTTPConnection, access_token: Optional[str]) -> Optional[str]:
+    # Browsers cannot set headers on EventSource or WebSocket requests, so
+    # the token may also come as a query parameter
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token
+    return access_token
+
+async def _resolve(token: Optional[str], symbols: List[str]) -> Dict[int, str]:
+    """
+    Authenticate the caller and map symbols to asset ids, with a session
+    held only for these lookups and not for the life of the stream.
+    """
+    async with get_async_session_factory()() as session:
+        await user_from_token(session, token)
+        if not symbols:
+            return {}
+        rows = await session.exec(
+            select(Asset.id, Asset.symbol).where(Asset.symbol.in_([symbol.upper() for symbol in symbols]))
+        )
+        return dict(rows.all())
+
+def _subscribed(subscription: Subscription, symbols: List[str]) -> StreamEvent:
+    known = set(subscription.symbols.values())
+    return StreamEvent("subscribed", {
+        "symbols": sorted(known),
+        "unknown_symbols": [symbol for symbol in symbols if symbol.upper() not in known],
+        "keywords": sorted(subscription.keywords),
+    })
+
+def _filters(message: object) -> Tuple[List[str], List[str]]:
+    if not isinstance(message, dict) or message.get("action") != "subscribe":
+        raise ValueError('Expected {"action": "subscribe", "symbols": [...], "keywords": [...]}')
+    symbols, keywords = message.get("symbols") or [], message.get("keywords") or []
+    if not all(isinstance(value, str) for value in [*symbols, *keywords]):
+        raise ValueError("Symbols and keywords must be strings")
+    return _split(",".join(symbols)), _split(",".join(keywords))
+
+@router.get("/stream/events")
+async def stream_events(
+    request: Request,
+    symbols: Optional[str] = None,
+    keywords: Optional[str] = None,
+    access_token: Optional[str] = None,
+) -> StreamingResponse:
+    """
+    Server-Sent Events stream of news items and price bars as they are
+    committed.
+
+    `symbols` and `keywords` are comma separated; price bars are sent for
+    the subscribed symbols, news items when they name a subscribed symbol
+    or contain a keyword. Without either every event is sent. A client
+    that falls behind gets a "lagged" event with the number of events it
+    missed, and is disconnected if it keeps lagging.
+    """
+    symbol_list, keyword_list = _split(symbols), _split(keywords)
+    assets = await _resolve(_bearer(request, access_token), symbol_list)
+    subscription = stream_bus.subscribe(assets, keyword_list)
+    if subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many stream subscribers, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    return StreamingResponse(
+        _sse_frames(subscription, _subscribed(subscription, symbol_list)),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _sse_frames(subscription: Subscription, subscribed: StreamEvent) -> AsyncIterator[bytes]:
+    # Starlette cancels this generator when the client goes away
+    try:
+        yield subscribed.sse
+        while True:
+            try:
+                event = await subscription.next(settings.STREAM_HEARTBEAT)
+            except SubscriptionClosed as e:
+                yield StreamEvent("closed", {"reason": str(e)}).sse
+                return
+            yield event.sse if event is not None else b": keep-alive\n\n"
+    finally:
+        stream_bus.unsubscribe(subscription)
+
+@router.websocket("/stream")
+async def stream_events_ws(
+    websocket: WebSocket,
+    symbols: Optional[str] = None,
+    keywords: Optional[str] = None,
+    access_token: Optional[str] = None,
+) -> None:
+    """
+    WebSocket stream of the same events as /stream/events. Clients can
+    replace their filters at any time by sending
+    {"action": "subscribe", "symbols": [...], "keywords": [...]}.
+    """
+    symbol_list, keyword_list = _split(symbols), _split(keywords)
+    token = _bearer(websocket, access_token)
+    try:
+        assets = await _resolve(token, symbol_list)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    subscription = stream_bus.subscribe(assets, keyword_list)
+    if subscription is None:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+
+    await websocket.accept()
+    receiver = asyncio.create_task(_receive_filters(websocket, subscription, token))
+    try:
+        await websocket.send_text(_subscribed(subscription, symbol_list).data)
+        while True:
+            try:
+                event = await subscription.next(settings.STREAM_HEARTBEAT)
+            except SubscriptionClosed as e:
+                if str(e) == SLOW_CONSUMER:
+                    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=SLOW_CONSUMER)
+                return
+            if event is not None:
+                await websocket.send_text(event.data)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        stream_bus.unsubscribe(subscription)
+
+async def _receive_filters(websocket: WebSocket, subscription: Subscription, token: Optional[str]) -> None:
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                symbols, keywords = _filters(json.loads(message))
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "data": {"detail": str(e)}})
+                continue
+            stream_bus.update(subscription, await _resolve(token, symbols), keywords)
+            await websocket.send_text(_subscribed(subscription, symbols).data)
+    except (WebSocketDisconnect, HTTPException):
+        pass
+    except Exception:
+        logger.exception("Stream subscription update failed")
+    finally:
+        # Wakes the sender, which then ends the connection
+        subscription.close("disconnected")
@@ -1,53 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
-from typing import Any, List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Any, List, Optional
 
-from ....core.database import get_session
-from ....core.security import get_current_user
+from ....core.database import get_async_session
+from ....core.hashing import password_hasher
+from ....core.pagination import apply_keyset, decode_cursor, set_next_cursor
+from ....core.security import get_current_user, invalidate_principal
 from ....models.user import User
 from ....schemas.user import UserCreate, UserResponse, UserUpdate
 
 router = APIRouter()
 
 @router.get("/", response_model=List[UserResponse])
-def get_users(
+async def get_users(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
+    response: Response,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100
 ) -> Any:
     """
     Retrieve users.
     """
-    # Check if current user has admin privileges
-    if not current_user.is_admin:
+    # Check if current user has superuser privileges
+    if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    users = session.exec(select(User).offset(skip).limit(limit)).all()
+    cursor_values = decode_cursor(cursor, "users") if cursor else None
+    query = apply_keyset(select(User), (User.id,), cursor_values)
+    users = (await session.exec(query.offset(skip).limit(limit))).all()
+    set_next_cursor(response, "users", [(user.id,) for user in users], limit)
     return users
 
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user(
+async def get_user(
     *,
     user_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Get a specific user by id.
     """
-    # Users can access their own data, admins can access any user's data
-    if not current_user.is_admin and current_user.id != user_id:
+    # Users can access their own data, superusers can access any user's data
+    if not current_user.is_superuser and current_user.id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -57,57 +65,68 @@ def get_user(
     return user
 
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def create_user(
+async def create_user(
     *,
     user_in: UserCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Create new user.
     """
-    # Only admins can create new users
-    if not current_user.is_admin:
+    # Only superusers can create new users
+    if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
     # Check if user with given email already exists
-    user = session.query(User).filter(User.email == user_in.email).first()
+    user = (await session.exec(select(User).where(User.email == user_in.email))).first()
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="A user with this email already exists"
         )
     
-    # Create new user
-    user = User.from_schema(user_in)
+    # Create new user; bcrypt runs in the hashing worker pool
+    user = User.model_validate(
+        user_in.model_dump(exclude={"password"}),
+        update={"hashed_password": await password_hasher.hash(user_in.password)},
+    )
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
     
     return user
 
 @router.put("/{user_id}", response_model=UserResponse)
-def update_user(
+async def update_user(
     *,
     user_id: int,
     user_in: UserUpdate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Update a user.
     """
-    # Users can update their own data, admins can update any user's data
-    if not current_user.is_admin and current_user.id != user_id:
+    # Users can update their own data, superusers can update any user's data
+    if not current_user.is_superuser and current_user.id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    user = session.get(User, user_id)
+    user_data = user_in.model_dump(exclude_unset=True)
+    # Only superusers grant roles or (de)activate accounts
+    if not current_user.is_superuser and {"is_active", "is_superuser"} & set(user_data):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -115,43 +134,48 @@ def update_user(
         )
     
     # Update user attributes
-    user_data = user_in.dict(exclude_unset=True)
+    previous_username = user.username
+    password = user_data.pop("password", None)
+    if password:
+        user.hashed_password = await password_hasher.hash(password)
     for key, value in user_data.items():
-        if key == "password" and value:
-            # Handle password update separately
-            user.set_password(value)
-        else:
-            setattr(user, key, value)
+        setattr(user, key, value)
     
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
+    
+    # Drop the cached principal so role, status and password changes apply at once
+    invalidate_principal(previous_username)
+    invalidate_principal(user.username)
     
     return user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(
+async def delete_user(
     *,
     user_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ) -> None:
     """
     Delete a user.
     """
-    # Only admins can delete users
-    if not current_user.is_admin:
+    # Only superusers can delete users
+    if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    session.delete(user)
-    session.commit() 
\ No newline at end of file
+    username = user.username
+    await session.delete(user)
+    await session.commit()
+    invalidate_principal(username) 
\ No newline at end of file
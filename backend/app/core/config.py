@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Financial News Analysis API"
@@ -7,10 +8,137 @@ class Settings(BaseSettings):
     
     # Database settings
     DATABASE_URL: str = "sqlite:///./test.db"  # Replace with your DB URL
+    ASYNC_DATABASE_URL: Optional[str] = None  # Derived from DATABASE_URL when not set
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a pooled connection is replaced
+    DB_ECHO: bool = False
     
+    # SQLite file databases: "wal" switches to WAL journaling with the
+    # pragmas below, gives each writer engine a single connection (BEGIN
+    # IMMEDIATE, so writers queue instead of failing with "database is
+    # locked") and reads on a pool of query_only connections, which WAL
+    # never blocks. The sync and the async engine each have their writer,
+    # so a process has up to two, which take turns on SQLite's lock.
+    # None keeps SQLite's defaults.
+    SQLITE_PROFILE: Optional[str] = "wal"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # In WAL mode, durable unless the OS crashes
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE: int = 64 * 1024  # KiB per connection
+    SQLITE_BUSY_TIMEOUT: float = 30.0  # Seconds to wait for the writers of other processes
+    # Write jobs queued while a transaction runs are committed together
+    # in the next one, up to this many
+    WRITE_QUEUE_MAX_BATCH: int = 64
+    
+    # Read replicas: GET and HEAD requests read from these, spread over
+    # the healthy ones by sessions in flight; writes and every other
+    # request use DATABASE_URL. A replica failing its health check is
+    # skipped until it passes again. SQLite files holding copies of the
+    # primary stand in for replicas in local testing.
+    DATABASE_REPLICA_URLS: list = []
+    REPLICA_HEALTH_INTERVAL: float = 5.0  # Seconds between health checks
+    # Read-your-writes: seconds a client's reads stay on the primary after
+    # a successful write, to cover replication lag; 0 turns it off
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+    
+    # Fast worker start: skip create_all while the schema fingerprint stored
+    # in the database matches the models (see core/schema.py), and load the
+    # API routers, services and background workers after the app starts
+    # accepting connections; API requests wait until they are loaded
+    FAST_START: bool = False
+    
+    # Full-text search backend ("fts5", "like"); defaults to the best one for the database
+    SEARCH_BACKEND: Optional[str] = None
+    
+    # Price history: resolution of raw AssetPrice bars and intervals kept as rollups
+    RAW_PRICE_INTERVAL: str = "1m"
+    PRICE_ROLLUP_INTERVALS: list = ["1h", "1d"]
+    # Raw bar storage: "table" (asset_prices only) or "partitioned" (a table
+    # per month, see services/price_store.py)
+    PRICE_STORAGE: str = "table"
+    # Seconds before the cached partition list is read again, to pick up
+    # partitions created by other processes, e.g. a migration
+    PRICE_PARTITION_CATALOG_TTL: float = 30.0
+    
+    # Hot bar cache: the newest raw bars of recently read assets in memory,
+    # so recent price ranges are served without the database. Assets least
+    # recently read are evicted past the byte cap.
+    BAR_CACHE_ENABLED: bool = True
+    BAR_CACHE_BARS: int = 7200  # Bars per asset, five days of 1m bars
+    BAR_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    BAR_CACHE_WARM_ASSETS: int = 20  # Assets with the newest bars, loaded at startup
+    BAR_CACHE_TTL: float = 300.0  # Backstop for bars written by other processes
+    
+    # Bulk news ingestion: rows per executemany/commit
+    INGEST_BATCH_SIZE: int = 2000
+    
+    # Streaming exports: rows fetched from the cursor and encoded per chunk
+    EXPORT_BATCH_SIZE: int = 5000
+    
+    # Background analysis: analyzer name, news per analyzer call, batches in
+    # flight, attempts before a job is marked failed and idle poll interval
+    ANALYZER: str = "local"
+    ANALYSIS_BATCH_SIZE: int = 64
+    ANALYSIS_CONCURRENCY: int = 2
+    ANALYSIS_MAX_ATTEMPTS: int = 3
+    ANALYSIS_RETRY_DELAY: float = 30.0  # Seconds, doubled on every failed attempt
+    ANALYSIS_POLL_INTERVAL: float = 5.0
+    ANALYZE_ON_INGEST: bool = True
+    
+    # Asset mentions extracted from news as it is written: symbols shorter
+    # than the minimum only match as cashtags ($X); asset changes made by
+    # other processes are picked up after the reload interval (seconds)
+    MENTION_EXTRACTION: bool = True
+    MENTION_MIN_SYMBOL_LENGTH: int = 2
+    MENTION_RELOAD_INTERVAL: float = 300.0
+    
+    # Near-duplicate news: items whose estimated Jaccard similarity to an
+    # earlier one reaches the threshold join its cluster instead of being
+    # analyzed. Signatures hash character shingles with NUM_PERM
+    # permutations, split into BANDS LSH bands; changing those three needs
+    # rebuild_near_duplicate_index. Bands of fewer rows find lower thresholds.
+    NEAR_DUPLICATE_DETECTION: bool = True
+    NEAR_DUPLICATE_THRESHOLD: float = 0.8
+    NEAR_DUPLICATE_SHINGLE_SIZE: int = 5  # Characters
+    NEAR_DUPLICATE_NUM_PERM: int = 128
+    NEAR_DUPLICATE_BANDS: int = 16
+
+    # Per-asset sentiment: intervals kept as rollups
+    SENTIMENT_ROLLUP_INTERVALS: list = ["1h", "1d"]
+    
+    # Event/market correlation: bars in the abnormal return and volume baselines
+    CORRELATION_WINDOW: int = 20
+    
+    # HTTP response cache for read endpoints
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_TTL: float = 300.0  # Backstop for writes made by other processes
+    
+    # Live news/price streaming: events buffered per subscriber, events a
+    # subscriber may lose in a row before it is disconnected, subscribers per
+    # process and idle seconds between SSE keep-alives
+    STREAM_QUEUE_SIZE: int = 256
+    STREAM_MAX_DROPPED: int = 1024
+    STREAM_MAX_SUBSCRIBERS: int = 10000
+    STREAM_HEARTBEAT: float = 15.0
+
+    # Request and SQL metrics at /api/metrics: share of requests whose
+    # latency, size and SQL work are recorded, and the slow query threshold
+    METRICS_ENABLED: bool = True
+    METRICS_SAMPLE_RATE: float = 1.0
+    SLOW_QUERY_MS: float = 200.0
+    SLOW_QUERY_MAX_STATEMENTS: int = 100  # Distinct slow statements tracked
+
     # JWT settings
     SECRET_KEY: str = "your-secret-key-here"  # Change in production
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PRINCIPAL_CACHE_SIZE: int = 4096  # Resolved users kept by get_current_user
+    PRINCIPAL_CACHE_TTL: float = 60.0  # Seconds before a cached user is reloaded
+    
+    # Password hashing worker pool
+    PASSWORD_HASH_WORKERS: int = 2  # bcrypt worker processes
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 8  # Hashing jobs queued or running at once
+    PASSWORD_HASH_QUEUE_TIMEOUT: float = 2.0  # Seconds to wait for a slot before answering 503
     
     # CORS settings
     CORS_ORIGINS: list = ["*"]  # Replace with specific origins in production
@@ -1,26 +1,600 @@
-from sqlalchemy import create_engine
+from concurrent.futures import Future
+from sqlalchemy import create_engine, event, literal, select
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
 from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.sql import Executable
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
 from .config import settings
+import asyncio
+import hashlib
 import logging
+import os
+import queue
+import threading
+import time
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Async drivers used when ASYNC_DATABASE_URL is not configured explicitly
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def get_async_database_url(url: str) -> str:
+    """
+    The async URL of the primary database: ASYNC_DATABASE_URL, or `url`
+    on the matching async driver.
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    return async_driver_url(url)
+
+def async_driver_url(url: str) -> str:
+    """
+    Map a sync database URL onto the matching async driver.
+    """
+    scheme, _, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    return f"{ASYNC_DRIVERS.get(dialect, scheme)}://{rest}"
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.split("://", 1)[1] in ("", "/"))
+
+def is_sqlite_profile(url: str) -> bool:
+    """
+    Whether the SQLITE_PROFILE engine setup applies to `url`.
+    """
+    return settings.SQLITE_PROFILE == "wal" and url.startswith("sqlite") and not _is_memory_sqlite(url)
+
+def engine_options(url: str, read_only: bool = False) -> Dict[str, Any]:
+    """
+    Pool options shared by the sync and async engines. Under the SQLite
+    profile a writer engine has a single connection, and `read_only`
+    selects the options of the read pool. The sync and async engines are
+    separate pools, so a process has one writer connection per engine.
+    """
+    if _is_memory_sqlite(url):
+        # A single shared connection, otherwise every checkout sees an empty database
+        return {
+            "echo": settings.DB_ECHO,
+            "poolclass": StaticPool,
+            "connect_args": {"check_same_thread": False},
+        }
+    options = {
+        "echo": settings.DB_ECHO,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if is_sqlite_profile(url) and not read_only:
+        # SQLite takes one writer at a time; more connections only wait on its lock
+        options.update(pool_size=1, max_overflow=0)
+    return options
+
+def configure_sqlite(engine: Engine, read_only: bool = False) -> None:
+    """
+    Apply the SQLite profile to an engine: WAL and the configured pragmas
+    on every new connection, and transactions that take the write lock up
+    front (BEGIN IMMEDIATE) on writers, or are pinned read-only on readers.
+    Taking the lock at BEGIN means a busy writer makes others wait out
+    busy_timeout, where a deferred transaction upgrading to write fails
+    straight away with "database is locked". That is also how the writers
+    of the sync and async engines of one process take turns.
+    """
+    pragmas = [
+        "journal_mode = WAL",
+        f"synchronous = {settings.SQLITE_SYNCHRONOUS}",
+        f"mmap_size = {settings.SQLITE_MMAP_SIZE}",
+        f"cache_size = -{settings.SQLITE_CACHE_SIZE}",
+        f"busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT * 1000)}",
+        "temp_store = MEMORY",
+    ]
+    if read_only:
+        pragmas.append("query_only = ON")
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        # The driver's own BEGIN is turned off; the begin hook below emits it
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        # Readers still need BEGIN so a transaction reads one snapshot. It
+        # goes straight to the driver, like the BEGIN it would have sent,
+        # so statement metrics are unchanged.
+        cursor = connection.connection.cursor()
+        cursor.execute("BEGIN" if read_only else "BEGIN IMMEDIATE")
+        cursor.close()
+
 # Create SQLAlchemy engine
 try:
-    engine = create_engine(settings.DATABASE_URL)
+    engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
     logger.info(f"Database connection established: {settings.DATABASE_URL}")
 except Exception as e:
     logger.error(f"Database connection failed: {str(e)}")
     raise
 
+# Connections for reads, which under the SQLite profile never wait for the
+# writer; the engine itself otherwise
+read_engine = engine
+if is_sqlite_profile(settings.DATABASE_URL):
+    configure_sqlite(engine)
+    read_engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL, read_only=True))
+    configure_sqlite(read_engine, read_only=True)
+    logger.info("SQLite WAL profile: a writer connection per engine and a read pool")
+
+# Session.info key of the engine a ReadWriteSession reads from
+READ_BIND_KEY = "read_bind"
+
+class ReadWriteSession(Session):
+    """
+    Session that runs SELECTs on the read engine in `info[READ_BIND_KEY]`
+    until its transaction writes; from then on everything goes to the
+    writer, so the transaction reads its own writes. Statements the
+    session cannot classify, e.g. text or `connection()`, go to the writer;
+    Core reads take their connection from `read_connection`.
+    """
+
+    _writing = False
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        read_bind = self.info.get(READ_BIND_KEY)
+        if (
+            read_bind is not None
+            and not self._writing
+            and not self._flushing
+            and getattr(clause, "is_select", False)
+            and getattr(clause, "_for_update_arg", None) is None
+        ):
+            return read_bind
+        self._writing = True
+        return super().get_bind(mapper, clause=clause, **kw)
+
+@event.listens_for(ReadWriteSession, "after_transaction_end")
+def _reset_writing(session, transaction):
+    if transaction.parent is None:
+        session._writing = False
+
+# Stands in for the statements of Core reads when choosing their bind
+_READ_CLAUSE = select(literal(1))
+
+def read_connection(session: Session) -> Connection:
+    """
+    Connection of `session` for Core reads: the read engine's, as for the
+    session's own SELECTs, unless the transaction has written. Plain
+    `session.connection()` would mark the session as writing.
+    """
+    return session.connection(bind_arguments={"clause": _READ_CLAUSE})
+
+def session_options(read_bind: Optional[Engine]) -> Dict[str, Any]:
+    """
+    Session arguments that route reads to `read_bind`, if there is one.
+    """
+    if read_bind is None:
+        return {}
+    return {"info": {READ_BIND_KEY: read_bind}}
+
+class WriteQueue:
+    """
+    Runs write jobs, functions of a Connection, one transaction at a time
+    on a single writer thread. Jobs queued while a transaction runs are
+    committed together in the next one (group commit), so a burst of
+    small writes costs one commit and never contends for the lock.
+
+    If a job of a group raises, the group is rolled back and each of its
+    jobs is run again in a transaction of its own, so only the failing one
+    fails; jobs must therefore leave no side effects outside the
+    transaction until it returns. Disabled, a job runs in its caller's
+    thread in a transaction of its own.
+
+    Only writes submitted here are grouped. ORM sessions commit on their
+    engine's writer connection, the async engine's included, and contend
+    with the queue for SQLite's lock through BEGIN IMMEDIATE and
+    busy_timeout, like the writers of another process.
+    """
+
+    def __init__(self, engine: Engine, enabled: bool = True, max_batch: int = 64):
+        self.engine = engine
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Optional[Tuple[Callable[[Connection], Any], Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.transactions = 0
+        self.largest_group = 0
+        self.regrouped = 0
+
+    def _run_alone(self, job: Callable[[Connection], Any]) -> Any:
+        with self.engine.begin() as connection:
+            return job(connection)
+
+    def submit(self, job: Callable[[Connection], Any]) -> Future:
+        future: Future = Future()
+        if not self.enabled:
+            try:
+                future.set_result(self._run_alone(job))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="write-queue", daemon=True)
+                self._thread.start()
+            self._queue.put((job, future))
+        return future
+
+    def run(self, job: Callable[[Connection], Any]) -> Any:
+        """
+        Run a job and return its result once it is committed.
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Write jobs cannot queue further write jobs")
+        return self.submit(job).result()
+
+    async def run_async(self, job: Callable[[Connection], Any]) -> Any:
+        if not self.enabled:
+            return await asyncio.to_thread(self._run_alone, job)
+        return await asyncio.wrap_future(self.submit(job))
+
+    def _loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            group = [item]
+            while len(group) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._commit(group)
+                    return
+                group.append(item)
+            self._commit(group)
+
+    def _commit(self, group: List[Tuple[Callable[[Connection], Any], Future]]) -> None:
+        try:
+            with self.engine.begin() as connection:
+                results = [job(connection) for job, _ in group]
+        except BaseException as e:
+            if len(group) == 1:
+                group[0][1].set_exception(e)
+                self.transactions += 1
+                return
+            self.regrouped += 1
+            for item in group:
+                self._commit([item])
+            return
+        self.jobs += len(group)
+        self.transactions += 1
+        self.largest_group = max(self.largest_group, len(group))
+        for (_, future), result in zip(group, results):
+            future.set_result(result)
+
+    def close(self) -> None:
+        """
+        Commit the queued jobs and stop the writer thread. A later job
+        starts it again.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "jobs": self.jobs,
+            "transactions": self.transactions,
+            "jobs_per_transaction": round(self.jobs / self.transactions, 2) if self.transactions else None,
+            "largest_group": self.largest_group,
+            "regrouped": self.regrouped,
+        }
+
+write_queue = WriteQueue(
+    engine, enabled=is_sqlite_profile(settings.DATABASE_URL), max_batch=settings.WRITE_QUEUE_MAX_BATCH,
+)
+
 # Create session factory
 SessionLocal = Session(bind=engine)
 
-# Dependency to get DB session
-def get_session():
-    db = Session(engine)
+# The async engine is created on first use so that scripts using only the
+# sync path do not need an async driver installed. Under the SQLite profile
+# it has a writer connection of its own besides the sync engine's; the two
+# take turns on the database lock, they are not one writer.
+_async_engine: Optional[AsyncEngine] = None
+_async_read_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine, _async_read_engine, _async_session_factory
+    if _async_engine is None:
+        url = get_async_database_url(settings.DATABASE_URL)
+        try:
+            _async_engine = create_async_engine(url, **engine_options(url))
+            if is_sqlite_profile(url):
+                configure_sqlite(_async_engine.sync_engine)
+                _async_read_engine = create_async_engine(url, **engine_options(url, read_only=True))
+                configure_sqlite(_async_read_engine.sync_engine, read_only=True)
+            logger.info(f"Async database engine created: {url}")
+        except Exception as e:
+            logger.error(f"Async database engine creation failed: {str(e)}")
+            raise
+        read_bind = _async_read_engine.sync_engine if _async_read_engine is not None else None
+        _async_session_factory = async_sessionmaker(
+            _async_engine, class_=AsyncSession, expire_on_commit=False,
+            sync_session_class=ReadWriteSession, **session_options(read_bind),
+        )
+    return _async_engine
+
+def get_async_read_engine() -> AsyncEngine:
+    """
+    The engine async sessions read from: the read pool under the SQLite
+    profile, otherwise the async engine itself.
+    """
+    return _async_read_engine or get_async_engine()
+
+def get_async_session_factory() -> async_sessionmaker:
+    get_async_engine()
+    return _async_session_factory
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_read_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
+    if _async_read_engine is not None:
+        await _async_read_engine.dispose()
+        _async_read_engine = None
+    await replica_set.dispose_async()
+
+# Requests that only read, and may be served by a replica
+SAFE_METHODS = ("GET", "HEAD")
+
+def client_key(headers: Headers, client: Optional[Tuple[str, int]]) -> str:
+    """
+    Who a request comes from, for read-your-writes: its credentials, or
+    its address when it has none. Only a digest is kept.
+    """
+    identity = headers.get("authorization") or (client[0] if client else "")
+    return hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()
+
+class Replica:
+    """
+    A read replica: its sync and async read engines and its health.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.in_flight = 0
+        self.sessions = 0
+        self.failed_checks = 0
+        self.engine = create_engine(url, **engine_options(url, read_only=True))
+        self._configure(self.engine)
+        self._async_engine: Optional[AsyncEngine] = None
+
+    def _configure(self, replica_engine: Engine) -> None:
+        if is_sqlite_profile(str(replica_engine.url)):
+            configure_sqlite(replica_engine, read_only=True)
+
+        @event.listens_for(replica_engine, "handle_error")
+        def _mark_down(context):
+            # Skipped from now on; the health check brings it back
+            if context.is_disconnect:
+                self.healthy = False
+
+    def async_engine(self) -> AsyncEngine:
+        if self._async_engine is None:
+            url = async_driver_url(self.url)
+            self._async_engine = create_async_engine(url, **engine_options(url, read_only=True))
+            self._configure(self._async_engine.sync_engine)
+        return self._async_engine
+
+    def check(self) -> bool:
+        """
+        Run a trivial query on the replica. A SQLite file that does not
+        exist fails rather than being created empty.
+        """
+        url = make_url(self.url)
+        try:
+            if url.get_backend_name() == "sqlite" and url.database and not os.path.exists(url.database):
+                raise FileNotFoundError(url.database)
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql("SELECT 1")
+        except Exception as e:
+            if self.healthy:
+                logger.warning(f"Read replica {url.render_as_string()} is down: {e}")
+            self.healthy = False
+            self.failed_checks += 1
+            return False
+        if not self.healthy:
+            logger.info(f"Read replica {url.render_as_string()} is back")
+        self.healthy = True
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": make_url(self.url).render_as_string(),
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "sessions": self.sessions,
+            "failed_checks": self.failed_checks,
+        }
+
+class ReplicaSet:
+    """
+    Read replicas of the primary database.
+
+    `route` picks the replica that serves the reads of a request: none for
+    requests that may write, or for a client pinned to the primary for
+    `pin_seconds` after its last write (read-your-writes); otherwise the
+    healthy replica with the fewest sessions in flight, in turn among
+    equals. With every replica down, reads go back to the primary.
+    """
+
+    def __init__(self, urls: Sequence[str], health_interval: float = 5.0, pin_seconds: float = 5.0):
+        self.replicas = [Replica(url) for url in urls]
+        self.health_interval = health_interval
+        self.pin_seconds = pin_seconds
+        self._pins: Dict[str, float] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self.primary_reads = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def pin(self, client: str) -> None:
+        if not self.replicas or self.pin_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._pins) > 10000:
+                self._pins = {key: until for key, until in self._pins.items() if until > now}
+            self._pins[client] = now + self.pin_seconds
+
+    def is_pinned(self, client: str) -> bool:
+        until = self._pins.get(client)
+        return until is not None and until > time.monotonic()
+
+    def choose(self) -> Optional[Replica]:
+        with self._lock:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                return None
+            self._next = (self._next + 1) % len(healthy)
+            rotated = healthy[self._next:] + healthy[:self._next]
+            replica = min(rotated, key=lambda replica: replica.in_flight)
+            replica.in_flight += 1
+            replica.sessions += 1
+            return replica
+
+    def route(self, request: Optional[Request]) -> Optional[Replica]:
+        # Sessions opened outside a request (scripts, jobs) use the primary
+        if not self.replicas or request is None or request.method not in SAFE_METHODS:
+            return None
+        replica = None
+        if not self.is_pinned(client_key(request.headers, request.client)):
+            replica = self.choose()
+        if replica is None:
+            self.primary_reads += 1
+        return replica
+
+    def release(self, replica: Optional[Replica]) -> None:
+        if replica is not None:
+            with self._lock:
+                replica.in_flight -= 1
+
+    def check(self) -> int:
+        """
+        Health-check every replica. Returns the number healthy.
+        """
+        return sum(replica.check() for replica in self.replicas)
+
+    async def run_health_checks(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await asyncio.to_thread(self.check)
+
+    async def dispose_async(self) -> None:
+        for replica in self.replicas:
+            if replica._async_engine is not None:
+                await replica._async_engine.dispose()
+                replica._async_engine = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "replicas": [replica.stats() for replica in self.replicas],
+            "primary_reads": self.primary_reads,
+            "pinned_clients": sum(1 for until in list(self._pins.values()) if until > time.monotonic()),
+        }
+
+replica_set = ReplicaSet(
+    settings.DATABASE_REPLICA_URLS,
+    health_interval=settings.REPLICA_HEALTH_INTERVAL,
+    pin_seconds=settings.READ_YOUR_WRITES_SECONDS,
+)
+
+class ReadYourWritesMiddleware:
+    """
+    Pins a client's reads to the primary once a request of it that may
+    have written (any method but GET and HEAD) succeeds. Pins are kept per
+    process.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_and_pin(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                replica_set.pin(client_key(Headers(scope=scope), scope.get("client")))
+            await send(message)
+
+        await self.app(scope, receive, send_and_pin)
+
+# Dependency to get DB session. `request` is injected by FastAPI; scripts
+# and jobs call it without one and get the primary. Annotated as Request,
+# not Optional[Request], which FastAPI would not inject.
+def get_session(request: Request = None):
+    replica = replica_set.route(request)
+    if replica is not None:
+        read_bind = replica.engine
+    else:
+        read_bind = read_engine if read_engine is not engine else None
+    db = ReadWriteSession(engine, **session_options(read_bind))
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+        replica_set.release(replica)
+
+# Dependency to get an async DB session for `async def` handlers; like
+# get_session, without a request it reads from the primary
+async def get_async_session(request: Request = None):
+    replica = replica_set.route(request)
+    options = session_options(replica.async_engine().sync_engine) if replica is not None else {}
+    try:
+        async with get_async_session_factory()(**options) as session:
+            yield session
+    finally:
+        replica_set.release(replica)
+
+async def stream_rows(statements: Sequence[Executable], batch_size: int) -> AsyncIterator[Sequence[Any]]:
+    """
+    Run statements one after another on a session of their own and yield
+    their rows in batches of `batch_size` from a server-side cursor, so
+    results of any size stream in constant memory. Meant for response
+    bodies that outlive the request's session.
+    """
+    async with get_async_session_factory()() as session:
+        for statement in statements:
+            result = await session.stream(statement.execution_options(yield_per=batch_size))
+            async for batch in result.partitions():
+                yield batch
@@ -0,0 +1,90 @@
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+from typing import Any, Callable, Optional
+import asyncio
+import logging
+import multiprocessing
+
+from .config import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Module level so they can be pickled into the worker processes
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+class HashingUnavailable(Exception):
+    """
+    Raised when a hashing job could not start within the queueing timeout.
+    """
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded process pool so logins never block the event loop.
+
+    At most `max_concurrency` jobs are queued or running at once; callers
+    waiting longer than `queue_timeout` for a slot get HashingUnavailable,
+    so a login storm sheds load instead of piling up.
+    """
+
+    def __init__(self, workers: int = 2, max_concurrency: int = 8, queue_timeout: float = 2.0):
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HashingUnavailable("Password hashing is saturated")
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, plain_password, hashed_password)
+
+    def warm_up(self) -> None:
+        """
+        Start the worker processes ahead of the first login.
+        """
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_hash, "warm-up")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._semaphore = None
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY,
+    queue_timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,326 @@
+from bisect import bisect_left
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import contextvars
+import logging
+import random
+import re
+import threading
+import time
+
+from .config import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Histogram:
+    """
+    Prometheus style histogram with fixed buckets, one series per label set.
+    """
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Labels, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+# Literals and bound parameters of the supported dialects, and the lists
+# they form, so statements that differ only in values are grouped
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|(?<![:\w]):\w+|\$\d+|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_statement(statement: str, max_length: int = 300) -> str:
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("?, ...", statement)
+    return _WHITESPACE.sub(" ", statement).strip()[:max_length]
+
+class RequestTrace:
+    """
+    SQL work done on behalf of one sampled request.
+    """
+
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+# Set for the duration of a sampled request; SQL run in threads started by
+# the request (run_sync, to_thread) sees it through the copied context
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("request_trace", default=None)
+
+class Metrics:
+    """
+    Request and SQL metrics of this process, rendered in the Prometheus
+    text format.
+
+    Request counts, in-flight requests and statement totals are always
+    kept. Latency, response size and per-request SQL histograms are only
+    recorded for a `sample_rate` share of requests. Statements slower than
+    `slow_query_seconds` are grouped by their normalized text, up to
+    `max_slow_statements` distinct statements.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, slow_query_seconds: float = 0.2, max_slow_statements: int = 100):
+        self.sample_rate = sample_rate
+        self.slow_query_seconds = slow_query_seconds
+        self.max_slow_statements = max_slow_statements
+        self.latency = Histogram("http_request_duration_seconds", "Request latency by route.", LATENCY_BUCKETS)
+        self.response_size = Histogram("http_response_size_bytes", "Response body size by route.", SIZE_BUCKETS)
+        self.request_statements = Histogram(
+            "http_request_sql_statements", "SQL statements executed per request by route.", STATEMENT_BUCKETS
+        )
+        self.request_db_time = Histogram(
+            "http_request_db_seconds", "Time spent in SQL statements per request by route.", LATENCY_BUCKETS
+        )
+        self._requests: Dict[Labels, int] = {}
+        self.in_flight = 0
+        self.statements = 0
+        self.statement_seconds = 0.0
+        # normalized statement -> [count, total seconds, max seconds]
+        self._slow: Dict[str, List[float]] = {}
+        self.slow_dropped = 0
+        self._lock = threading.Lock()
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record_request(
+        self,
+        method: str,
+        route: str,
+        status: int,
+        seconds: Optional[float] = None,
+        size: Optional[int] = None,
+        trace: Optional[RequestTrace] = None,
+    ) -> None:
+        key = (("method", method), ("route", route), ("status", str(status)))
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+        if seconds is None:
+            return
+        labels = (("method", method), ("route", route))
+        self.latency.observe(labels, seconds)
+        self.response_size.observe(labels, size or 0)
+        if trace is not None:
+            self.request_statements.observe(labels, trace.statements)
+            self.request_db_time.observe(labels, trace.db_seconds)
+
+    def record_statement(self, statement: str, seconds: float) -> None:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.statements += 1
+            trace.db_seconds += seconds
+        with self._lock:
+            self.statements += 1
+            self.statement_seconds += seconds
+        if seconds < self.slow_query_seconds:
+            return
+        normalized = normalize_statement(statement)
+        with self._lock:
+            entry = self._slow.get(normalized)
+            if entry is None:
+                if len(self._slow) >= self.max_slow_statements:
+                    self.slow_dropped += 1
+                    return
+                entry = self._slow[normalized] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = sorted(self._slow.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {"statement": statement, "count": int(count), "total_seconds": total, "max_seconds": longest}
+            for statement, (count, total, longest) in entries
+        ]
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_total Requests by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        with self._lock:
+            requests = sorted(self._requests.items())
+        lines.extend(f"http_requests_total{_format_labels(labels)} {count}" for labels, count in requests)
+        lines += [
+            "# HELP http_requests_in_flight Requests being processed.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_metrics_sample_rate Share of requests recorded in the histograms.",
+            "# TYPE http_metrics_sample_rate gauge",
+            f"http_metrics_sample_rate {self.sample_rate}",
+        ]
+        for histogram in (self.latency, self.response_size, self.request_statements, self.request_db_time):
+            lines.extend(histogram.render())
+        lines += [
+            "# HELP db_statements_total SQL statements executed, in and outside requests.",
+            "# TYPE db_statements_total counter",
+            f"db_statements_total {self.statements}",
+            "# HELP db_statement_seconds_total Time spent in SQL statements.",
+            "# TYPE db_statement_seconds_total counter",
+            f"db_statement_seconds_total {self.statement_seconds}",
+            "# HELP db_slow_queries_total Statements slower than the slow query threshold, by normalized statement.",
+            "# TYPE db_slow_queries_total counter",
+        ]
+        slow = self.slow_queries()
+        for entry in slow:
+            lines.append(f"db_slow_queries_total{_format_labels((('statement', entry['statement']),))} {entry['count']}")
+        lines += [
+            "# HELP db_slow_query_seconds_total Time spent in slow statements, by normalized statement.",
+            "# TYPE db_slow_query_seconds_total counter",
+        ]
+        for entry in slow:
+            lines.append(f"db_slow_query_seconds_total{_format_labels((('statement', entry['statement']),))} {entry['total_seconds']}")
+        lines += [
+            "# HELP db_slow_query_max_seconds Slowest execution of each slow statement.",
+            "# TYPE db_slow_query_max_seconds gauge",
+        ]
+        for entry in slow:
+            lines.append(f"db_slow_query_max_seconds{_format_labels((('statement', entry['statement']),))} {entry['max_seconds']}")
+        lines += [
+            "# HELP db_slow_queries_untracked_total Slow statements not tracked because the statement table was full.",
+            "# TYPE db_slow_queries_untracked_total counter",
+            f"db_slow_queries_untracked_total {self.slow_dropped}",
+        ]
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics(
+    sample_rate=settings.METRICS_SAMPLE_RATE,
+    slow_query_seconds=settings.SLOW_QUERY_MS / 1000,
+    max_slow_statements=settings.SLOW_QUERY_MAX_STATEMENTS,
+)
+
+# Templates of recently routed paths, for responses served by middleware
+# (cache hits) that never reach the router
+_MAX_ROUTED_PATHS = 10000
+_routed_paths: Dict[str, str] = {}
+
+def route_template(scope: Scope) -> str:
+    """
+    Path template of the route that handled the request, e.g.
+    "/api/v1/{news_id}", so raw ids never become label values.
+    """
+    path = scope["path"]
+    template = getattr(scope.get("route"), "path", None)
+    if not template:
+        return _routed_paths.get(path, "<unmatched>")
+    regex = getattr(scope["route"], "path_regex", None)
+    if regex is not None and not regex.match(path):
+        # Routes of included routers may carry their path without the prefix
+        start = path.find("/", 1)
+        while start != -1:
+            if regex.match(path[start:]):
+                template = path[:start] + template
+                break
+            start = path.find("/", start + 1)
+    if len(_routed_paths) < _MAX_ROUTED_PATHS:
+        _routed_paths[path] = template
+    return template
+
+class MetricsMiddleware:
+    """
+    Records request counts, latency, response size and the SQL work of
+    each sampled request into `metrics`.
+    """
+
+    def __init__(self, app: ASGIApp, registry: Metrics = metrics):
+        self.app = app
+        self.metrics = registry
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sampled = self.metrics.sampled()
+        trace = RequestTrace() if sampled else None
+        token = _current_trace.set(trace)
+        status = 500
+        size = 0
+
+        async def measure(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        self.metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, measure)
+        finally:
+            self.metrics.in_flight -= 1
+            _current_trace.reset(token)
+            self.metrics.record_request(
+                scope["method"],
+                route_template(scope),
+                status,
+                time.perf_counter() - started if sampled else None,
+                size,
+                trace,
+            )
+
+def _statement_started(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+def _statement_finished(connection, cursor, statement, parameters, context, executemany):
+    started = connection.info.get("metrics_started")
+    if started:
+        metrics.record_statement(statement, time.perf_counter() - started.pop())
+
+# Every engine, including the async engine's sync core, reports its
+# statements
+if settings.METRICS_ENABLED:
+    event.listen(Engine, "before_cursor_execute", _statement_started)
+    event.listen(Engine, "after_cursor_execute", _statement_finished)
@@ -0,0 +1,66 @@
+from fastapi import HTTPException, Response, status
+from sqlalchemy import literal, tuple_
+from typing import Any, List, Sequence
+import base64
+import datetime
+import json
+
+# Opaque keyset cursors. The body of list endpoints stays a plain list and
+# the cursor for the following page is sent in this header.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.datetime.fromisoformat(value["dt"])
+    return value
+
+def encode_cursor(kind: str, values: Sequence[Any]) -> str:
+    payload = json.dumps({"k": kind, "v": [_encode_value(v) for v in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, kind: str) -> List[Any]:
+    """
+    Decode a cursor produced by `encode_cursor` for the same listing.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["k"] != kind:
+            raise ValueError("cursor belongs to another listing")
+        return [_decode_value(v) for v in payload["v"]]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def apply_keyset(query, columns: Sequence[Any], values: Sequence[Any], descending: bool = False):
+    """
+    Restrict `query` to rows strictly after the cursor position and order it
+    by the keyset columns, so each page is an index range scan.
+    """
+    if values is not None:
+        if len(values) != len(columns):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid pagination cursor"
+            )
+        bounds = [literal(value, column.type) for column, value in zip(columns, values)]
+        if len(columns) == 1:
+            key, bound = columns[0], bounds[0]
+        else:
+            key, bound = tuple_(*columns), tuple_(*bounds)
+        query = query.where(key < bound if descending else key > bound)
+    return query.order_by(*(column.desc() if descending else column.asc() for column in columns))
+
+def set_next_cursor(response: Response, kind: str, keys: Sequence[Sequence[Any]], limit: int) -> None:
+    """
+    Advertise the next page when the current one came back full.
+    """
+    if limit and len(keys) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(kind, keys[-1])
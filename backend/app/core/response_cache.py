@@ -0,0 +1,283 @@
+from collections import OrderedDict
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode
+import hashlib
+import logging
+import threading
+import time
+
+from .config import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Set on the ASGI scope by the `cache_tags` dependency of cacheable routes
+SCOPE_KEY = "response_cache_tags"
+
+# Tags made stale by a transaction wait under this key of the connection's
+# info until it commits
+_PENDING_KEY = "response_cache_pending"
+
+# Headers that are recomputed when a cached body is served
+_SKIPPED_HEADERS = {b"content-length", b"etag", b"date", b"server"}
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+class CachedResponse:
+    __slots__ = ("status", "headers", "body", "etag", "tags", "expires_at")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, etag: str, tags: Set[str], expires_at: float):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.tags = tags
+        self.expires_at = expires_at
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers)
+
+class ResponseCache:
+    """
+    LRU cache of response bodies bounded by a byte budget.
+
+    Entries carry tags naming the rows they were built from, so a write can
+    drop exactly the affected entries with `invalidate`. Entries also
+    expire after `ttl` seconds as a backstop for writes made outside this
+    process.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2 ** 20, ttl: float = 300.0, name: str = "response"):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._by_tag: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key: Hashable, entry: CachedResponse) -> None:
+        # Single responses larger than a quarter of the budget would just
+        # flush everything else
+        if entry.size > self.max_bytes // 4:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = entry
+            self.bytes += entry.size
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._data.pop(key)
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def invalidate(self, *tags: str) -> int:
+        """
+        Drop every entry carrying one of `tags`. Returns the number dropped.
+        """
+        dropped = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    if key in self._data:
+                        self._remove(key)
+                        dropped += 1
+            self.invalidations += dropped
+        return dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+            self._by_tag.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+response_cache = ResponseCache(
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    ttl=settings.RESPONSE_CACHE_TTL,
+)
+
+def invalidate_on_commit(connection: Connection, *tags: str) -> None:
+    """
+    Drop the entries carrying `tags` once the connection's transaction
+    commits. Dropped earlier, a concurrent read could cache the rows the
+    transaction replaces again, for the full TTL.
+    """
+    connection.info.setdefault(_PENDING_KEY, set()).update(tags)
+
+@event.listens_for(Engine, "begin")
+@event.listens_for(Engine, "rollback")
+def _discard_pending(connection):
+    connection.info.pop(_PENDING_KEY, None)
+
+@event.listens_for(Engine, "commit")
+def _invalidate_pending(connection):
+    pending = connection.info.pop(_PENDING_KEY, None)
+    if pending:
+        response_cache.invalidate(*pending)
+
+def cache_tags(*templates: str) -> Callable[[Request], None]:
+    """
+    Route dependency that makes successful GET responses cacheable under
+    the given tags. Templates are formatted with the path parameters, e.g.
+    "asset:{asset_id}".
+    """
+    def dependency(request: Request) -> None:
+        request.scope[SCOPE_KEY] = {template.format(**request.path_params) for template in templates}
+    return dependency
+
+def add_cache_tags(request: Request, *tags: str) -> None:
+    """
+    Extra tags for a cacheable response whose content depends on the
+    request, e.g. on optional related rows it asked for.
+    """
+    if request.scope.get(SCOPE_KEY) is not None:
+        request.scope[SCOPE_KEY].update(tags)
+
+def cache_key(scope: Scope) -> Hashable:
+    """
+    Route plus normalized query parameters. The representation (Accept) and
+    the caller's credentials are part of the key, so negotiated formats and
+    authenticated responses are never served to the wrong client.
+    """
+    headers = Headers(scope=scope)
+    query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+    credentials = headers.get("authorization")
+    return (
+        scope["path"],
+        query,
+        headers.get("accept", ""),
+        hashlib.blake2b(credentials.encode(), digest_size=16).hexdigest() if credentials else None,
+    )
+
+class ResponseCacheMiddleware:
+    """
+    Serves repeated GETs of cacheable routes from `response_cache` and
+    answers `If-None-Match` with 304 when the strong ETag still matches.
+    """
+
+    def __init__(self, app: ASGIApp, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        key = cache_key(scope)
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        entry = self.cache.get(key)
+        if entry is not None:
+            await self._send_cached(entry, if_none_match, send)
+            return
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def capture(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # The route dependency has run by now; anything not cacheable
+                # streams through untouched
+                if message["status"] != 200 or scope.get(SCOPE_KEY) is None:
+                    await send(message)
+                    return
+                # Held back until the body is known and the ETag can be set
+                start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            # Hits skip get_current_user, so authenticated entries live no
+            # longer than a cached principal would
+            ttl = self.cache.ttl if key[3] is None else min(self.cache.ttl, settings.PRINCIPAL_CACHE_TTL)
+            entry = CachedResponse(
+                status=start["status"],
+                headers=[(name, value) for name, value in start.get("headers", []) if name.lower() not in _SKIPPED_HEADERS],
+                body=body,
+                etag=make_etag(body),
+                tags=scope[SCOPE_KEY],
+                expires_at=time.monotonic() + ttl,
+            )
+            self.cache.set(key, entry)
+            await self._send_cached(entry, if_none_match, send)
+
+        await self.app(scope, receive, capture)
+
+    async def _send_cached(self, entry: CachedResponse, if_none_match: Optional[str], send: Send) -> None:
+        headers = MutableHeaders(raw=list(entry.headers))
+        headers["etag"] = entry.etag
+        if etag_matches(if_none_match, entry.etag):
+            self.cache.not_modified += 1
+            del headers["content-type"]
+            await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers["content-length"] = str(len(entry.body))
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": entry.body})
@@ -0,0 +1,80 @@
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+from sqlalchemy.engine import Connection, Dialect, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex, CreateTable
+from typing import Callable, Iterable, Optional
+import datetime
+import hashlib
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Kept out of the models' metadata, whose fingerprint it records
+_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    _metadata,
+    Column("id", Integer, primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def schema_fingerprint(metadata: MetaData, dialect: Dialect, extra: Iterable[str] = ()) -> str:
+    """
+    Hash of the DDL `create_all` emits for `metadata` on `dialect`, so any
+    change of a table, column or index gives a new fingerprint. `extra`
+    names schema objects created outside the metadata, e.g. the search
+    backend's index.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for table in metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    for value in extra:
+        digest.update(value.encode())
+    return digest.hexdigest()
+
+def stored_fingerprint(engine: Engine) -> Optional[str]:
+    """
+    The fingerprint recorded by the last `ensure_schema`, or None for a
+    database it has not set up yet.
+    """
+    try:
+        with engine.connect() as connection:
+            return connection.execute(select(schema_version.c.fingerprint).where(schema_version.c.id == 1)).scalar()
+    except DBAPIError:
+        # No schema_version table
+        return None
+
+def ensure_schema(
+    engine: Engine,
+    metadata: MetaData,
+    setup: Optional[Callable[[Connection], None]] = None,
+    extra: Iterable[str] = (),
+) -> bool:
+    """
+    Create the tables of `metadata` and run `setup` in one transaction, unless
+    the database records the same schema fingerprint; then a single query
+    replaces the catalog reads of `create_all`. Returns whether DDL ran.
+
+    Like `create_all`, this only adds what is missing: a changed column of
+    an existing table still needs a migration.
+    """
+    fingerprint = schema_fingerprint(metadata, engine.dialect, extra)
+    if stored_fingerprint(engine) == fingerprint:
+        logger.info(f"Database schema {fingerprint} is current")
+        return False
+    with engine.begin() as connection:
+        metadata.create_all(connection)
+        if setup is not None:
+            setup(connection)
+        _metadata.create_all(connection)
+        connection.execute(schema_version.delete())
+        connection.execute(schema_version.insert().values(
+            id=1, fingerprint=fingerprint, applied_at=datetime.datetime.utcnow(),
+        ))
+    logger.info(f"Database schema {fingerprint} applied")
+    return True
@@ -1,16 +1,29 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .cache import TTLCache
 from .config import settings
-from ..core.database import get_session
+from .hashing import pwd_context
+from ..core.database import get_async_session
 from ..models.user import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
+
+# Resolved users keyed by token subject (username), so authenticated requests
+# skip the user lookup. Writers must call `invalidate_principal` after commit.
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+    name="principal",
+)
+
+def invalidate_principal(username: Optional[str]) -> None:
+    if username:
+        principal_cache.invalidate(username)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -22,6 +35,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
+# Blocking helpers for scripts; request handlers use core.hashing.password_hasher
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -30,13 +44,22 @@ def get_password_hash(password: str) -> str:
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ) -> User:
+    return await user_from_token(session, token)
+
+async def user_from_token(session: AsyncSession, token: Optional[str]) -> User:
+    """
+    Resolve a bearer token to its user, for callers that cannot use the
+    `get_current_user` dependency, e.g. long-lived streaming connections.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if not token:
+        raise credentials_exception
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
         username: str = payload.get("sub")
@@ -45,7 +68,21 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = session.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
-    return user 
\ No newline at end of file
+    cached = principal_cache.get(username)
+    if cached is not None:
+        # Copy so that request handlers never share one instance
+        user = cached.model_copy()
+    else:
+        result = await session.exec(select(User).where(User.username == username))
+        user = result.first()
+        if user is None:
+            raise credentials_exception
+        principal_cache.set(username, User.model_validate(user.model_dump()))
+    # Deactivation takes effect at once: the users endpoints drop the cached principal
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Inactive user",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
\ No newline at end of file
@@ -0,0 +1,176 @@
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, Iterable, List, Mapping, Sequence
+import csv
+import datetime
+import io
+import logging
+import zlib
+
+import orjson
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # Arrow output is optional
+    pyarrow = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPE = "application/json"
+# Arrays-of-columns JSON: {"field": [v0, v1, ...], ...}
+COLUMNS_MEDIA_TYPE = "application/vnd.newsmonitor.columns+json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+SERIES_MEDIA_TYPES = (JSON_MEDIA_TYPE, COLUMNS_MEDIA_TYPE, ARROW_MEDIA_TYPE)
+
+# Bulk export formats, selected with the `format` query parameter
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Documents the alternative representations in OpenAPI
+SERIES_RESPONSES: Dict[int, Dict[str, Any]] = {
+    200: {
+        "content": {
+            COLUMNS_MEDIA_TYPE: {"schema": {"type": "object", "additionalProperties": {"type": "array"}}},
+            ARROW_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+        }
+    }
+}
+
+def _accepted(accept: str) -> List[str]:
+    """
+    Media types from an Accept header, most preferred first.
+    """
+    ranked = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type and quality > 0:
+            ranked.append((-quality, position, media_type.lower()))
+    return [media_type for _, _, media_type in sorted(ranked)]
+
+def negotiate_series(request: Request) -> str:
+    """
+    Pick the representation of a series response from the Accept header.
+    Row JSON is the default, including for `*/*` and missing headers.
+    """
+    accept = request.headers.get("accept")
+    if not accept:
+        return JSON_MEDIA_TYPE
+    for media_type in _accepted(accept):
+        if media_type in SERIES_MEDIA_TYPES:
+            return media_type
+        if media_type in ("*/*", "application/*"):
+            return JSON_MEDIA_TYPE
+    raise HTTPException(
+        status_code=status.HTTP_406_NOT_ACCEPTABLE,
+        detail=f"Supported media types: {', '.join(SERIES_MEDIA_TYPES)}"
+    )
+
+def columns_from_rows(rows: Iterable[Any], fields: Sequence[str]) -> Dict[str, List[Any]]:
+    """
+    Transpose dicts or attribute objects into one list per field.
+    """
+    rows = list(rows)
+    if rows and isinstance(rows[0], Mapping):
+        return {field: [row[field] for row in rows] for field in fields}
+    return {field: [getattr(row, field) for row in rows] for field in fields}
+
+def _arrow_stream(columns: Dict[str, List[Any]]) -> bytes:
+    if pyarrow is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Arrow output is not available on this server"
+        )
+    table = pyarrow.table(columns)
+    sink = io.BytesIO()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def series_response(request: Request, columns: Dict[str, List[Any]]) -> Response:
+    """
+    Serialize a column-oriented series in the representation the client
+    asked for: row JSON (the default), columnar JSON or an Arrow IPC stream.
+    """
+    media_type = negotiate_series(request)
+    if media_type == COLUMNS_MEDIA_TYPE:
+        body = orjson.dumps(columns, option=orjson.OPT_SERIALIZE_NUMPY)
+    elif media_type == ARROW_MEDIA_TYPE:
+        body = _arrow_stream(columns)
+    else:
+        fields = list(columns)
+        body = orjson.dumps(
+            [dict(zip(fields, values)) for values in zip(*columns.values())],
+            option=orjson.OPT_SERIALIZE_NUMPY,
+        )
+    response = Response(content=body, media_type=media_type)
+    response.headers["Vary"] = "Accept"
+    return response
+
+def accepts_gzip(request: Request) -> bool:
+    return "gzip" in _accepted(request.headers.get("accept-encoding", ""))
+
+def _csv_value(value: Any) -> Any:
+    # Same timestamp format as the JSON representations
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+
+async def _encode_batches(batches: AsyncIterator[Sequence[Sequence[Any]]], fields: Sequence[str], format: str) -> AsyncIterator[bytes]:
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(fields)
+        async for batch in batches:
+            writer.writerows([_csv_value(value) for value in row] for row in batch)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+        return
+    async for batch in batches:
+        yield b"".join(
+            orjson.dumps(dict(zip(fields, row)), option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY)
+            for row in batch
+        )
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def export_response(
+    request: Request,
+    batches: AsyncIterator[Sequence[Sequence[Any]]],
+    fields: Sequence[str],
+    format: str,
+    filename: str,
+) -> StreamingResponse:
+    """
+    Stream row batches (tuples in `fields` order) as NDJSON or CSV, one
+    chunk per batch, gzip compressed on the fly when the client accepts it.
+    Nothing but the current batch is held in memory.
+    """
+    chunks = _encode_batches(batches, fields, format)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}.{format}"',
+        "Vary": "Accept-Encoding",
+    }
+    if accepts_gzip(request):
+        chunks = _gzip(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=EXPORT_MEDIA_TYPES[format], headers=headers)
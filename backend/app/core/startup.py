@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+import logging
+import time
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class StartupTimings:
+    """
+    Wall time of each startup phase, in the order they ran, and the time
+    from the start of the app import until it accepted requests.
+    """
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases: Dict[str, float] = {}
+        self.ready_seconds: Optional[float] = None
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases[name] = round(seconds, 4)
+        logger.info(f"Startup phase {name} took {seconds * 1000:.1f} ms")
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def ready(self) -> None:
+        self.ready_seconds = round(time.perf_counter() - self.started, 4)
+        logger.info(f"Accepting requests {self.ready_seconds * 1000:.1f} ms after the app import started")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"phases": dict(self.phases), "ready_seconds": self.ready_seconds}
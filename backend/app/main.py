@@ -1,29 +1,162 @@
-from fastapi import FastAPI
+import time
+# Startup timings start here, so they include the imports below
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import SQLModel
-from .core.database import engine
+from .core.config import settings
+from .core.database import ReadYourWritesMiddleware, engine, dispose_async_engine, read_engine, replica_set, write_queue
+from .core.metrics import PROMETHEUS_MEDIA_TYPE, MetricsMiddleware, metrics
+from .core.pagination import NEXT_CURSOR_HEADER
+from .core.response_cache import ResponseCacheMiddleware, response_cache
+from .core.schema import ensure_schema
+from .core.startup import StartupTimings
 import logging
 from contextlib import asynccontextmanager
 import asyncio
 # Import all models to ensure they are registered with SQLModel
-from .models import user, news, asset, analysis
-from .api.v1.endpoints import news, market
+from .models import user, news, asset, analysis, graph
+from .services.search import get_search_backend
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+startup_timings = StartupTimings(_import_started)
+
+
+def _setup_search_index():
+    with engine.begin() as connection:
+        get_search_backend(connection.dialect.name).setup(connection)
+
+def _create_schema():
+    if settings.FAST_START:
+        search_backend = get_search_backend(engine.dialect.name)
+        ensure_schema(engine, SQLModel.metadata, search_backend.setup, extra=[search_backend.name])
+        return
+    logger.info("Creating database tables...")
+    SQLModel.metadata.create_all(engine)
+    logger.info("Database tables created successfully")
+    _setup_search_index()
+
+def _warm_bar_cache():
+    from .services.bar_cache import bar_cache
+    with read_engine.connect() as connection:
+        loaded = bar_cache.warm(connection, settings.BAR_CACHE_WARM_ASSETS)
+    logger.info(f"Loaded the recent bars of {loaded} assets into the bar cache")
+
+def _api_routers():
+    """
+    Import the API routers, and with them the services and their ORM sync
+    events. This is most of the app's import time, which FAST_START moves
+    past startup.
+    """
+    from .api.v1.endpoints import news, market, graph, stream, assets, users, auth
+    from .services import entity_graph  # Registers the graph sync events
+    from .services import sentiment  # Registers the sentiment rollup sync events
+    from .services import mentions  # Registers the mention extraction events
+    from .services import near_duplicates  # Registers the near-duplicate index events
+    # (router, path under API_V1_STR, tag)
+    return [
+        (news.router, "", "news"), (market.router, "", "market"), (graph.router, "", "graph"),
+        (stream.router, "", "stream"), (assets.router, "/assets", "assets"),
+        (users.router, "/users", "users"), (auth.router, "/auth", "auth"),
+    ]
+
+def include_api_routers(app: FastAPI, routers=None):
+    for router, path, tag in routers or _api_routers():
+        app.include_router(router, prefix=settings.API_V1_STR + path, tags=[tag])
+    # Rebuilt with the new routes if it was served before they were mounted
+    app.openapi_schema = None
+    app.state.api_routers = True
+
+async def _start_services(app: FastAPI):
+    """
+    Everything startup does after the schema is in place: mount the API,
+    warm the caches and start the background workers.
+    """
+    try:
+        if not getattr(app.state, "api_routers", False):
+            with startup_timings.phase("routers"):
+                # Imported off the event loop, mounted on it
+                include_api_routers(app, await asyncio.to_thread(_api_routers))
+    finally:
+        # Held requests get a 404 rather than waiting forever if that failed
+        api_ready = getattr(app.state, "api_ready", None)
+        if api_ready is not None:
+            api_ready.set()
+    if replica_set:
+        with startup_timings.phase("replicas"):
+            healthy = await asyncio.to_thread(replica_set.check)
+        logger.info(f"{healthy} of {len(replica_set.replicas)} read replicas healthy")
+        app.state.replica_checks = asyncio.create_task(replica_set.run_health_checks())
+    if settings.BAR_CACHE_ENABLED:
+        with startup_timings.phase("bar_cache"):
+            await asyncio.to_thread(_warm_bar_cache)
+    from .core.hashing import password_hasher
+    with startup_timings.phase("password_hasher"):
+        password_hasher.warm_up()
+    app.state.password_hasher = password_hasher
+    from .services.analysis_worker import analysis_worker
+    with startup_timings.phase("analysis_worker"):
+        await analysis_worker.start()
+    app.state.analysis_worker = analysis_worker
+
+def _log_startup_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Deferred startup failed", exc_info=task.exception())
 
 # Create tables
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    logger.info("Creating database tables...")
-    await asyncio.to_thread(SQLModel.metadata.create_all, engine)
-    logger.info("Database tables created successfully")
+    with startup_timings.phase("schema"):
+        await asyncio.to_thread(_create_schema)
+    if settings.FAST_START:
+        # Accept connections now; API requests wait for the routers
+        app.state.api_ready = asyncio.Event()
+        app.state.services_task = asyncio.create_task(_start_services(app))
+        app.state.services_task.add_done_callback(_log_startup_failure)
+    else:
+        await _start_services(app)
+    startup_timings.ready()
     yield  # Shutdown logic (optional) goes after yield
+    for name in ("services_task", "replica_checks"):
+        task = getattr(app.state, name, None)
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    analysis_worker = getattr(app.state, "analysis_worker", None)
+    if analysis_worker is not None:
+        await analysis_worker.stop()
+    password_hasher = getattr(app.state, "password_hasher", None)
+    if password_hasher is not None:
+        password_hasher.shutdown()
+    await asyncio.to_thread(write_queue.close)
+    await dispose_async_engine()
+
+class DeferredApiMiddleware:
+    """
+    Holds API requests that arrive before FAST_START has mounted the
+    routers, instead of answering them 404.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(settings.API_V1_STR):
+            api_ready = getattr(scope["app"].state, "api_ready", None)
+            if api_ready is not None and not api_ready.is_set():
+                await api_ready.wait()
+        await self.app(scope, receive, send)
 
 app = FastAPI(title="Financial News Analysis API", lifespan=lifespan)
 
 
+# Cached GETs of read endpoints, with ETag / If-None-Match revalidation.
+# Added first so it runs inside CORS and caches no per-origin headers.
+app.add_middleware(ResponseCacheMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -31,17 +164,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
-# Include routers
-app.include_router(news.router, prefix="/api/v1", tags=["news"])
-app.include_router(market.router, prefix="/api/v1", tags=["market"])
+if settings.FAST_START:
+    app.add_middleware(DeferredApiMiddleware)
+
+# Clients read from the primary for a while after they write
+if replica_set:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# Outermost, so latency includes cache hits and every other middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Include routers; FAST_START mounts them once the app has started
+if not settings.FAST_START:
+    include_api_routers(app)
 
 # Health check endpoint
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok"}
 
+# Cache statistics, for sizing the in-process caches
+@app.get("/api/cache/stats")
+async def cache_stats():
+    from .core.security import principal_cache
+    from .services.bar_cache import bar_cache
+    return {"principal": principal_cache.stats(), "response": response_cache.stats(), "bars": bar_cache.stats()}
+
+# Live stream subscribers and delivery counters of this process
+@app.get("/api/stream/stats")
+async def stream_stats():
+    from .services.stream import stream_bus
+    return stream_bus.stats()
+
+# Group commits of the database write queue and read replica health
+@app.get("/api/database/stats")
+async def database_stats():
+    return {"write_queue": write_queue.stats(), "replicas": replica_set.stats()}
+
+# Time spent in each startup phase of this process
+@app.get("/api/startup/stats")
+async def startup_stats():
+    return startup_timings.stats()
+
+# Request latency, response size and SQL metrics, in Prometheus text format
+@app.get("/api/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
 # Version endpoint
 @app.get("/api/version")
 async def version():
@@ -50,7 +223,9 @@ async def version():
         "environment": "development"
     }
 
+startup_timings.record("imports", time.perf_counter() - _import_started)
+
 # This code will only run if this file is executed directly
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
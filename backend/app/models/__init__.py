@@ -1,4 +1,5 @@
 from .user import User
-from .news import NewsItem, AssetMention
-from .asset import Asset, AssetPrice, AssetType
-from .analysis import Analysis, Annotation 
\ No newline at end of file
+from .news import NewsItem, AssetMention, NewsLshBucket, NewsSignature
+from .asset import Asset, AssetPrice, AssetPriceRollup, AssetSentimentRollup, AssetType
+from .analysis import Analysis, AnalysisJob, Annotation, NewsSentiment
+from .graph import EntityEdge, NewsEntities
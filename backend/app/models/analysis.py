@@ -1,9 +1,10 @@
 from sqlmodel import Field, SQLModel, Relationship, JSON
+from sqlalchemy import Column, Index
 from typing import Optional, List, Dict, Any, TYPE_CHECKING
 import datetime
 
 if TYPE_CHECKING:
-    from .news import News
+    from .news import NewsItem
     from .user import User
 
 class Analysis(SQLModel, table=True):
@@ -13,15 +14,15 @@ class Analysis(SQLModel, table=True):
     news_id: int = Field(foreign_key="news.id", unique=True)
     sentiment_score: float  # Range from -1.0 (negative) to 1.0 (positive)
     confidence: float  # Range from 0.0 to 1.0
-    entities: Optional[str] = Field(default=None, sa_column=JSON)  # Extracted entities (people, organizations, etc.)
-    keywords: Optional[str] = Field(default=None, sa_column=JSON)  # Key terms extracted from the article
+    entities: Optional[List[Any]] = Field(default=None, sa_column=Column(JSON))  # Extracted entities (people, organizations, etc.)
+    keywords: Optional[List[Any]] = Field(default=None, sa_column=Column(JSON))  # Key terms extracted from the article
     summary: Optional[str] = None  # AI-generated summary
     model_version: str = Field(max_length=50)  # Version of the AI model used
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
     updated_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, sa_column_kwargs={"onupdate": datetime.datetime.utcnow})
     
     # Relationships
-    news: "News" = Relationship(back_populates="analysis")
+    news: "NewsItem" = Relationship(back_populates="analysis")
     annotations: List["Annotation"] = Relationship(back_populates="analysis", sa_relationship_kwargs={"cascade": "all, delete-orphan"})
 
 class Annotation(SQLModel, table=True):
@@ -36,4 +37,37 @@ class Annotation(SQLModel, table=True):
     
     # Relationships
     analysis: Analysis = Relationship(back_populates="annotations")
-    user: Optional["User"] = Relationship() 
\ No newline at end of file
+    user: Optional["User"] = Relationship()
+
+class AnalysisJob(SQLModel, table=True):
+    """
+    Queue entry for the background analysis worker, one per news item.
+    """
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (
+        # Claim order: oldest pending job that is due
+        Index("ix_analysis_jobs_status_available_at", "status", "available_at"),
+    )
+
+    news_id: int = Field(foreign_key="news.id", primary_key=True)
+    status: str = Field(default="pending", max_length=20)  # pending, running, done or failed
+    attempts: int = 0
+    last_error: Optional[str] = None
+    requested_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+    available_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)  # Retry backoff
+    claimed_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+
+class NewsSentiment(SQLModel, table=True):
+    """
+    Sentiment and asset mentions a news item last contributed to the
+    sentiment rollups, so a change only applies the difference. Not a
+    foreign key: the row of a deleted news item is removed after the flush
+    that deleted it.
+    """
+    __tablename__ = "news_sentiment"
+
+    news_id: int = Field(primary_key=True)
+    published_at: datetime.datetime
+    sentiment: float  # Analyst override if any, else the analysis score
+    mentions: List[Any] = Field(default_factory=list, sa_column=Column(JSON))  # [asset_id, mention_count] pairs
@@ -1,4 +1,5 @@
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import JSON, Column, Index, UniqueConstraint
 from typing import Optional, List, TYPE_CHECKING
 import datetime
 import enum
@@ -24,6 +25,8 @@ class Asset(SQLModel, table=True):
     asset_type: AssetType = Field(default=AssetType.STOCK)
     sector: Optional[str] = Field(default=None, max_length=100)
     region: Optional[str] = Field(default=None, max_length=100)
+    # Other names the asset goes by in the news, e.g. "Alphabet", "GOOG"
+    aliases: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
     updated_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, sa_column_kwargs={"onupdate": datetime.datetime.utcnow})
     
@@ -33,6 +36,15 @@ class Asset(SQLModel, table=True):
 
 class AssetPrice(SQLModel, table=True):
     __tablename__ = "asset_prices"
+    __table_args__ = (
+        # Range reads filter on asset_id and timestamp and sort by timestamp.
+        # The OHLCV columns are part of the key so those reads never visit
+        # the table (INCLUDE is not portable).
+        Index(
+            "ix_asset_prices_asset_id_timestamp",
+            "asset_id", "timestamp", "open_price", "high_price", "low_price", "close_price", "volume",
+        ),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
     asset_id: int = Field(foreign_key="assets.id")
@@ -44,4 +56,46 @@ class AssetPrice(SQLModel, table=True):
     volume: Optional[float] = None
     
     # Relationships
-    asset: Asset = Relationship(back_populates="price_history") 
\ No newline at end of file
+    asset: Asset = Relationship(back_populates="price_history")
+
+class AssetPriceRollup(SQLModel, table=True):
+    """
+    Pre-aggregated OHLCV bars for the common intervals, kept up to date as
+    raw AssetPrice bars arrive.
+    """
+    __tablename__ = "asset_price_rollups"
+    __table_args__ = (
+        UniqueConstraint("asset_id", "interval", "bucket_start", name="uq_asset_price_rollups_bucket"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    asset_id: int = Field(foreign_key="assets.id")
+    interval: str = Field(max_length=10)  # e.g. 1h, 1d
+    bucket_start: datetime.datetime
+    open_price: float
+    high_price: float
+    low_price: float
+    close_price: float
+    volume: float = 0.0
+    bar_count: int = 0
+    # Source bars that set open and close, needed to merge late bars
+    first_timestamp: datetime.datetime
+    last_timestamp: datetime.datetime
+
+class AssetSentimentRollup(SQLModel, table=True):
+    """
+    Mention-weighted sentiment of the news mentioning an asset, per time
+    bucket, kept up to date as analyses, annotations and mentions change.
+    """
+    __tablename__ = "asset_sentiment_rollups"
+    __table_args__ = (
+        UniqueConstraint("asset_id", "interval", "bucket_start", name="uq_asset_sentiment_rollups_bucket"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    asset_id: int = Field(foreign_key="assets.id")
+    interval: str = Field(max_length=10)  # e.g. 1h, 1d
+    bucket_start: datetime.datetime
+    mentions: int = 0  # Sum of mention counts, the weight of sentiment_sum
+    sentiment_sum: float = 0.0  # Sum of sentiment * mention count
+    news_count: int = 0
@@ -0,0 +1,35 @@
+from sqlmodel import Field, SQLModel
+from sqlalchemy import JSON, Column, Index, UniqueConstraint
+from typing import List, Optional
+import datetime
+
+class EntityEdge(SQLModel, table=True):
+    """
+    Number of news items that mention both entities, per publication day.
+    `source` sorts before `target`, so each pair is stored once.
+    """
+    __tablename__ = "entity_edges"
+    __table_args__ = (
+        UniqueConstraint("source", "target", "day", name="uq_entity_edges_pair_day"),
+        # Neighbour lookups from either end of the edge
+        Index("ix_entity_edges_source_day", "source", "day"),
+        Index("ix_entity_edges_target_day", "target", "day"),
+        Index("ix_entity_edges_day", "day"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    source: str = Field(max_length=255)
+    target: str = Field(max_length=255)
+    day: datetime.date
+    weight: int = 0
+
+class NewsEntities(SQLModel, table=True):
+    """
+    Entities a news item last contributed to the graph, so a re-analysis
+    only applies the difference.
+    """
+    __tablename__ = "news_entities"
+
+    news_id: int = Field(foreign_key="news.id", primary_key=True)
+    day: datetime.date
+    entities: List[str] = Field(default_factory=list, sa_column=Column(JSON))
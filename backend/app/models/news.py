@@ -1,6 +1,6 @@
 from sqlmodel import Field, SQLModel, Relationship
 from typing import Optional, List, TYPE_CHECKING
-from sqlalchemy import ForeignKey, Column, Integer
+from sqlalchemy import BigInteger, ForeignKey, Column, Index, Integer, LargeBinary
 import datetime
 
 if TYPE_CHECKING:
@@ -9,6 +9,10 @@ if TYPE_CHECKING:
 
 class NewsItem(SQLModel, table=True):
     __tablename__ = "news"
+    __table_args__ = (
+        # Keyset pagination of the timeline: ORDER BY published_at DESC, id DESC
+        Index("ix_news_published_at_id", "published_at", "id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
     title: str = Field(max_length=255, index=True)
@@ -16,6 +20,12 @@ class NewsItem(SQLModel, table=True):
     summary: Optional[str] = None
     source: str = Field(max_length=255)
     url: Optional[str] = Field(default=None, max_length=512)
+    # Dedup keys: hash of the normalized url and of the normalized title + content
+    url_hash: Optional[str] = Field(default=None, max_length=32, index=True)
+    content_hash: Optional[str] = Field(default=None, max_length=32, index=True)
+    # First item of the near-duplicate cluster this item belongs to; None
+    # for that first item and for items without near-duplicates
+    cluster_id: Optional[int] = Field(default=None, index=True)
     published_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
     updated_at: datetime.datetime = Field(
@@ -29,6 +39,10 @@ class NewsItem(SQLModel, table=True):
 
 class AssetMention(SQLModel, table=True):
     __tablename__ = "asset_mentions"
+    __table_args__ = (
+        # News of one asset, for the event/market correlation join
+        Index("ix_asset_mentions_asset_id_news_id", "asset_id", "news_id"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
     news_id: int = Field(
@@ -41,4 +55,28 @@ class AssetMention(SQLModel, table=True):
     
     # Relationships
     news: NewsItem = Relationship(back_populates="asset_mentions")
-    asset: "Asset" = Relationship(back_populates="news_mentions")
\ No newline at end of file
+    asset: "Asset" = Relationship(back_populates="news_mentions")
+
+class NewsSignature(SQLModel, table=True):
+    """
+    MinHash signature of a news item, for near-duplicate detection (see
+    services/near_duplicates.py). Not a foreign key: the row of a deleted
+    news item is removed by the delete event.
+    """
+    __tablename__ = "news_signatures"
+
+    news_id: int = Field(primary_key=True)
+    signature: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # uint32 per permutation
+
+class NewsLshBucket(SQLModel, table=True):
+    """
+    LSH band buckets of the signatures: items sharing a bucket are
+    near-duplicate candidates.
+    """
+    __tablename__ = "news_lsh_buckets"
+    __table_args__ = (
+        Index("ix_news_lsh_buckets_news_id", "news_id"),
+    )
+
+    bucket: int = Field(sa_column=Column(BigInteger, primary_key=True, autoincrement=False))  # Hash of band and band values
+    news_id: int = Field(primary_key=True)
@@ -0,0 +1,56 @@
+from sqlmodel import SQLModel
+from typing import List, Optional
+import datetime
+
+from ..models.asset import AssetType
+
+class AssetBase(SQLModel):
+    symbol: str
+    name: str
+    description: Optional[str] = None
+    asset_type: AssetType = AssetType.STOCK
+    sector: Optional[str] = None
+    region: Optional[str] = None
+    aliases: Optional[List[str]] = None  # Also matched as mentions in news
+
+class AssetCreate(AssetBase):
+    pass
+
+class AssetUpdate(SQLModel):
+    symbol: Optional[str] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+    asset_type: Optional[AssetType] = None
+    sector: Optional[str] = None
+    region: Optional[str] = None
+    aliases: Optional[List[str]] = None
+
+class AssetResponse(AssetBase):
+    id: int
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+class AssetPriceResponse(SQLModel):
+    id: Optional[int] = None  # Not set for resampled bars
+    asset_id: int
+    timestamp: datetime.datetime
+    open_price: float
+    high_price: float
+    low_price: float
+    close_price: float
+    volume: Optional[float] = None
+
+class EventCorrelationResponse(SQLModel):
+    news_id: int
+    title: str
+    published_at: datetime.datetime
+    bar_date: Optional[datetime.date] = None  # Not set when there is no bar that day
+    price_change: Optional[float] = None  # Close over open, percent
+    abnormal_return: Optional[float] = None  # Return over the trailing mean, percent
+    volume_spike: Optional[float] = None  # Volume over the trailing mean
+
+class AssetSentimentResponse(SQLModel):
+    bucket_start: datetime.datetime
+    sentiment: Optional[float] = None  # Mention-weighted mean, analyst overrides applied
+    mentions: int  # Sum of mention counts in the bucket
+    news_count: int
@@ -0,0 +1,20 @@
+from sqlmodel import SQLModel
+from typing import List
+
+class EntityNeighbour(SQLModel):
+    entity: str
+    weight: int  # News items mentioning both entities
+
+class EntityNode(SQLModel):
+    id: str
+    name: str
+    weight: int  # Sum of the node's link strengths in the subgraph
+
+class EntityLink(SQLModel):
+    source: str
+    target: str
+    strength: int
+
+class EntityGraphResponse(SQLModel):
+    nodes: List[EntityNode] = []
+    links: List[EntityLink] = []
@@ -0,0 +1,78 @@
+from sqlmodel import SQLModel
+from typing import Any, Dict, List, Optional
+import datetime
+
+from ..models.asset import AssetType
+
+class NewsBase(SQLModel):
+    title: str
+    content: str
+    summary: Optional[str] = None
+    source: str
+    url: Optional[str] = None
+
+class NewsCreate(NewsBase):
+    published_at: Optional[datetime.datetime] = None
+
+class NewsUpdate(SQLModel):
+    title: Optional[str] = None
+    content: Optional[str] = None
+    summary: Optional[str] = None
+    source: Optional[str] = None
+    url: Optional[str] = None
+    published_at: Optional[datetime.datetime] = None
+
+class NewsResponse(NewsBase):
+    id: int
+    cluster_id: Optional[int] = None  # First item of its near-duplicate cluster
+    published_at: datetime.datetime
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+class AnnotationResponse(SQLModel):
+    id: int
+    user_id: Optional[int] = None
+    text: str
+    override_sentiment: Optional[float] = None
+    created_at: datetime.datetime
+
+class NewsAnalysisResponse(SQLModel):
+    sentiment_score: float
+    confidence: float
+    entities: Optional[List[Any]] = None
+    keywords: Optional[List[Any]] = None
+    summary: Optional[str] = None
+    model_version: str
+    updated_at: datetime.datetime
+    annotations: Optional[List[AnnotationResponse]] = None  # With include=annotations
+
+class MentionedAsset(SQLModel):
+    id: int
+    symbol: str
+    name: str
+    asset_type: AssetType
+    mention_count: int
+
+class NewsWithRelations(NewsResponse):
+    # Present only when requested through the `include` parameter
+    analysis: Optional[NewsAnalysisResponse] = None
+    assets: Optional[List[MentionedAsset]] = None
+
+class NewsIngestResult(SQLModel):
+    index: int  # Position of the item in the request
+    status: str  # created, duplicate or invalid
+    id: Optional[int] = None
+    duplicate_of: Optional[int] = None  # Existing news id when status is duplicate
+    cluster_id: Optional[int] = None  # Set when a created item is a near-duplicate
+    errors: Optional[List[Any]] = None
+
+class NewsIngestResponse(SQLModel):
+    created: int = 0
+    duplicates: int = 0
+    near_duplicates: int = 0  # Created, but linked to an earlier story
+    invalid: int = 0
+    results: List[NewsIngestResult] = []
+
+class AnalysisProgress(SQLModel):
+    jobs: Dict[str, int]  # Queued news items by status: pending, running, done, failed
+    worker: Dict[str, Any]  # Batches, analyzed, retried and failed counts of this process
@@ -11,8 +11,18 @@ class UserBase(SQLModel):
 class UserCreate(UserBase):
     password: str
 
+class UserUpdate(SQLModel):
+    email: Optional[EmailStr] = None
+    username: Optional[str] = None
+    password: Optional[str] = None
+    is_active: Optional[bool] = None
+    is_superuser: Optional[bool] = None
+
 class UserRead(UserBase):
     id: int
 
+# The users endpoints answer with the same fields
+UserResponse = UserRead
+
 class UserInDB(UserRead):
-    hashed_password: str 
\ No newline at end of file
+    hashed_password: str
@@ -0,0 +1,308 @@
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.engine import Connection
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import datetime
+import logging
+import time
+
+from ..core.config import settings
+from ..core.database import write_queue
+from ..core.response_cache import response_cache
+from ..models.analysis import Analysis, AnalysisJob
+from ..models.news import NewsItem
+from .analyzers import get_analyzer
+from .entity_graph import update_entity_graph
+from .search import Document
+from .sentiment import update_sentiment_rollups
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# SQLite caps bound parameters per statement; stay well below it for IN lists
+_LOOKUP_CHUNK = 500
+
+JOB_STATUSES = ("pending", "running", "done", "failed")
+
+def enqueue_analysis(connection: Connection, news_ids: Iterable[int]) -> int:
+    """
+    Queue news items for (re-)analysis. Items already queued are reset to
+    pending with a fresh attempt budget. The caller owns the transaction.
+    """
+    news_ids = sorted(set(news_ids))
+    jobs = AnalysisJob.__table__
+    now = datetime.datetime.utcnow()
+    existing = set()
+    for i in range(0, len(news_ids), _LOOKUP_CHUNK):
+        chunk = news_ids[i:i + _LOOKUP_CHUNK]
+        existing.update(connection.execute(select(jobs.c.news_id).where(jobs.c.news_id.in_(chunk))).scalars())
+    inserts = [
+        {"news_id": news_id, "status": "pending", "attempts": 0, "requested_at": now, "available_at": now}
+        for news_id in news_ids if news_id not in existing
+    ]
+    if inserts:
+        connection.execute(jobs.insert(), inserts)
+    requeued = sorted(existing)
+    for i in range(0, len(requeued), _LOOKUP_CHUNK):
+        connection.execute(
+            update(jobs)
+            .where(jobs.c.news_id.in_(requeued[i:i + _LOOKUP_CHUNK]))
+            .values(
+                status="pending", attempts=0, last_error=None, requested_at=now,
+                available_at=now, claimed_at=None, finished_at=None,
+            )
+        )
+    return len(news_ids)
+
+def queue_counts(connection: Connection) -> Dict[str, int]:
+    jobs = AnalysisJob.__table__
+    counts = dict.fromkeys(JOB_STATUSES, 0)
+    for status, count in connection.execute(select(jobs.c.status, func.count()).group_by(jobs.c.status)):
+        counts[status] = count
+    return counts
+
+def store_analyses(connection: Connection, results: List[Tuple[int, datetime.datetime, Dict[str, Any]]], model_version: str) -> None:
+    """
+    Insert or replace the Analysis rows of a batch and apply their entities
+    and sentiment to the entity graph and the sentiment rollups.
+    """
+    analyses = Analysis.__table__
+    now = datetime.datetime.utcnow()
+    news_ids = [news_id for news_id, _, _ in results]
+    existing = dict(
+        connection.execute(select(analyses.c.news_id, analyses.c.id).where(analyses.c.news_id.in_(news_ids))).all()
+    )
+    inserts, updates = [], []
+    for news_id, _, fields in results:
+        row = {**fields, "model_version": model_version, "updated_at": now}
+        if news_id in existing:
+            updates.append({**row, "analysis_id": existing[news_id]})
+        else:
+            inserts.append({**row, "news_id": news_id, "created_at": now})
+    if inserts:
+        connection.execute(analyses.insert(), inserts)
+    if updates:
+        connection.execute(
+            analyses.update().where(analyses.c.id == bindparam("analysis_id")),
+            updates,
+        )
+    # Core writes bypass the ORM events that keep the graph and the
+    # sentiment rollups in sync
+    update_entity_graph(connection, [(news_id, published_at, fields["entities"]) for news_id, published_at, fields in results])
+    update_sentiment_rollups(connection, news_ids)
+
+class AnalysisWorker:
+    """
+    Background pipeline that analyses queued news items.
+
+    `concurrency` loops each claim up to `batch_size` due jobs, run the
+    analyzer once for the whole batch in a thread and write the results in
+    bulk. A failed batch is retried with exponential backoff until
+    `max_attempts`, after which its jobs are marked failed. Workers sleep
+    until `notify` is called or `poll_interval` passes.
+    """
+
+    def __init__(
+        self,
+        analyzer: Optional[str] = None,
+        batch_size: int = 64,
+        concurrency: int = 2,
+        max_attempts: int = 3,
+        retry_delay: float = 30.0,
+        poll_interval: float = 5.0,
+    ):
+        self.analyzer_name = analyzer
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self.batches = 0
+        self.analyzed = 0
+        self.retried = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._wake = asyncio.Event()
+        # Jobs claimed by a previous process that never finished
+        recovered = await asyncio.to_thread(self._release_claims)
+        if recovered:
+            logger.info(f"Requeued {recovered} interrupted analysis jobs")
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """
+        Wake idle workers after new jobs were committed.
+        """
+        if self._wake is not None:
+            self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "batches": self.batches,
+            "analyzed": self.analyzed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "items_per_second": round(self.analyzed / self.busy_seconds, 2) if self.busy_seconds else None,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await asyncio.to_thread(self.run_once)
+            except Exception:
+                logger.exception("Analysis worker iteration failed")
+                processed = 0
+            if processed:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def run_once(self) -> int:
+        """
+        Claim and process one batch. Returns the number of jobs claimed.
+        """
+        claimed_at, batch = self._claim()
+        if not batch:
+            return 0
+        started = time.monotonic()
+        documents = [document for document, _ in batch]
+        try:
+            analyzer = get_analyzer(self.analyzer_name)
+            fields = analyzer.analyze_batch(documents)
+            if len(fields) != len(documents):
+                raise ValueError(f"Analyzer returned {len(fields)} results for {len(documents)} items")
+            results = [
+                (document[0], published_at, result)
+                for (document, published_at), result in zip(batch, fields)
+            ]
+
+            def write_results(connection: Connection) -> None:
+                store_analyses(connection, results, analyzer.model_version)
+                self._finish(connection, [document[0] for document in documents], claimed_at)
+
+            write_queue.run(write_results)
+            response_cache.invalidate("analysis")
+            self.analyzed += len(documents)
+        except Exception as e:
+            logger.exception(f"Analysis batch of {len(documents)} items failed")
+            self._retry([document[0] for document in documents], claimed_at, repr(e))
+        finally:
+            self.batches += 1
+            self.busy_seconds += time.monotonic() - started
+        return len(batch)
+
+    def _claim(self) -> Tuple[datetime.datetime, List[Tuple[Document, datetime.datetime]]]:
+        jobs = AnalysisJob.__table__
+        news = NewsItem.__table__
+        now = datetime.datetime.utcnow()
+        due = (
+            select(jobs.c.news_id)
+            .where(jobs.c.status == "pending", jobs.c.available_at <= now)
+            .order_by(jobs.c.available_at)
+            .limit(self.batch_size)
+        )
+
+        def claim(connection: Connection) -> List[Any]:
+            # The status check is repeated on the update so two workers never
+            # claim the same job
+            news_ids = connection.execute(
+                update(jobs)
+                .where(jobs.c.news_id.in_(due.scalar_subquery()), jobs.c.status == "pending")
+                .values(status="running", claimed_at=now)
+                .returning(jobs.c.news_id)
+            ).scalars().all()
+            if not news_ids:
+                return []
+            rows = connection.execute(
+                select(news.c.id, news.c.title, news.c.content, news.c.summary, news.c.published_at)
+                .where(news.c.id.in_(news_ids))
+                .order_by(news.c.id)
+            ).all()
+            # Jobs whose news item is gone have nothing to analyse
+            missing = set(news_ids) - {row.id for row in rows}
+            if missing:
+                connection.execute(jobs.delete().where(jobs.c.news_id.in_(missing)))
+            return rows
+
+        rows = write_queue.run(claim)
+        return now, [((row.id, row.title, row.content, row.summary), row.published_at) for row in rows]
+
+    def _finish(self, connection: Connection, news_ids: List[int], claimed_at: datetime.datetime) -> None:
+        jobs = AnalysisJob.__table__
+        # Jobs re-queued while this batch ran keep their pending status
+        connection.execute(
+            update(jobs)
+            .where(jobs.c.news_id.in_(news_ids), jobs.c.status == "running", jobs.c.claimed_at == claimed_at)
+            .values(status="done", last_error=None, finished_at=datetime.datetime.utcnow())
+        )
+
+    def _retry(self, news_ids: List[int], claimed_at: datetime.datetime, error: str) -> None:
+        jobs = AnalysisJob.__table__
+        now = datetime.datetime.utcnow()
+
+        def reschedule(connection: Connection) -> List[Dict[str, Any]]:
+            rows = connection.execute(
+                select(jobs.c.news_id, jobs.c.attempts).where(
+                    jobs.c.news_id.in_(news_ids), jobs.c.status == "running", jobs.c.claimed_at == claimed_at
+                )
+            ).all()
+            updates = []
+            for news_id, attempts in rows:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    status, available_at = "failed", now
+                else:
+                    status = "pending"
+                    available_at = now + datetime.timedelta(seconds=self.retry_delay * 2 ** (attempts - 1))
+                updates.append({
+                    "job_id": news_id, "status": status, "attempts": attempts,
+                    "available_at": available_at, "last_error": error[:1000],
+                    "finished_at": now if status == "failed" else None,
+                })
+            if updates:
+                connection.execute(update(jobs).where(jobs.c.news_id == bindparam("job_id")), updates)
+            return updates
+
+        # Counted once committed, as the write queue may run a job twice
+        for job in write_queue.run(reschedule):
+            if job["status"] == "failed":
+                self.failed += 1
+            else:
+                self.retried += 1
+
+    def _release_claims(self) -> int:
+        jobs = AnalysisJob.__table__
+        return write_queue.run(
+            lambda connection: connection.execute(
+                update(jobs).where(jobs.c.status == "running").values(status="pending", claimed_at=None)
+            ).rowcount
+        )
+
+analysis_worker = AnalysisWorker(
+    analyzer=settings.ANALYZER,
+    batch_size=settings.ANALYSIS_BATCH_SIZE,
+    concurrency=settings.ANALYSIS_CONCURRENCY,
+    max_attempts=settings.ANALYSIS_MAX_ATTEMPTS,
+    retry_delay=settings.ANALYSIS_RETRY_DELAY,
+    poll_interval=settings.ANALYSIS_POLL_INTERVAL,
+)
@@ -0,0 +1,125 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional, Type
+import logging
+import re
+
+from ..core.config import settings
+from .search import Document
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class Analyzer:
+    """
+    Produces Analysis fields for news items.
+
+    `analyze_batch` receives a whole batch so that model backed analyzers
+    can make one call per batch. It returns one dict per document, in order,
+    with sentiment_score, confidence, entities, keywords and summary.
+    """
+
+    model_version = "base"
+
+    def analyze_batch(self, documents: List[Document]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+_LATIN_WORD = re.compile(r"[A-Za-z][A-Za-z'-]+")
+# Runs of capitalized words and acronyms, e.g. "JP Morgan", "IMF"
+_ENTITY = re.compile(r"\b[A-Z][A-Za-z&-]*(?:[ \t]+[A-Z][A-Za-z&-]*)*")
+_ARTICLES = ("The ", "A ", "An ")
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s*")
+
+_STOPWORDS = frozenset(
+    "the and for with that this from are was were has have had will would "
+    "its into over after about than their they been said says more also".split()
+)
+_POSITIVE = frozenset(
+    "gain gains growth grow rise rises rally surge beat beats record profit "
+    "upgrade strong support approve approved success successful breakthrough".split()
+) | {"上涨", "增长", "成功", "支持", "突破", "利好", "盈利", "里程碑"}
+_NEGATIVE = frozenset(
+    "loss losses fall falls drop drops decline plunge miss misses weak "
+    "downgrade risk risks warn warns warning fraud lawsuit crisis vulnerability".split()
+) | {"下跌", "风险", "警告", "漏洞", "质疑", "危机", "亏损", "攻击"}
+
+class LocalAnalyzer(Analyzer):
+    """
+    Deterministic lexicon based analyzer with no external dependencies.
+
+    Good enough for development and tests; swap in a model backed analyzer
+    through the ANALYZER setting for real scores.
+    """
+
+    model_version = "local-1"
+
+    def __init__(self, max_entities: int = 10, max_keywords: int = 8, summary_length: int = 200):
+        self.max_entities = max_entities
+        self.max_keywords = max_keywords
+        self.summary_length = summary_length
+
+    def analyze_batch(self, documents: List[Document]) -> List[Dict[str, Any]]:
+        return [self._analyze(title or "", content or "", summary) for _, title, content, summary in documents]
+
+    def _analyze(self, title: str, content: str, summary: Any) -> Dict[str, Any]:
+        text = f"{title}\n{content}"
+        words = [word.lower() for word in _LATIN_WORD.findall(text)]
+        cjk_runs = _CJK_RUN.findall(text)
+
+        positive = sum(word in _POSITIVE for word in words)
+        negative = sum(word in _NEGATIVE for word in words)
+        for run in cjk_runs:
+            positive += sum(run.count(term) for term in _POSITIVE if not term.isascii())
+            negative += sum(run.count(term) for term in _NEGATIVE if not term.isascii())
+        hits = positive + negative
+
+        entities = Counter(self._entities(text))
+        keywords = Counter(word for word in words if len(word) > 3 and word not in _STOPWORDS)
+        for run in cjk_runs:
+            keywords.update(run[i:i + 2] for i in range(len(run) - 1))
+
+        if not summary:
+            sentences = [sentence for sentence in _SENTENCE_END.split(content.strip()) if sentence]
+            summary = (sentences[0] if sentences else title)[:self.summary_length]
+        # CJK bigrams seen once are mostly noise
+        return {
+            "sentiment_score": round((positive - negative) / hits, 4) if hits else 0.0,
+            "confidence": round(min(1.0, hits / 5), 4),
+            "entities": [name for name, _ in entities.most_common(self.max_entities)],
+            "keywords": [word for word, count in keywords.most_common(self.max_keywords) if count > 1 or len(word) > 2],
+            "summary": summary,
+        }
+
+    @staticmethod
+    def _entities(text: str) -> List[str]:
+        names = []
+        for match in _ENTITY.finditer(text):
+            name = match.group()
+            for article in _ARTICLES:
+                if name.startswith(article):
+                    name = name[len(article):]
+            # A lone capitalized word opening a sentence is just capitalized
+            before = match.start() - 1
+            while before >= 0 and text[before] in " \t":
+                before -= 1
+            sentence_start = before < 0 or text[before] in ".!?:\n。！？"
+            if " " not in name and not name.isupper() and sentence_start:
+                continue
+            if len(name) > 1:
+                names.append(name)
+        return names
+
+ANALYZERS: Dict[str, Type[Analyzer]] = {
+    "local": LocalAnalyzer,
+}
+
+_analyzers: Dict[str, Analyzer] = {}
+
+def get_analyzer(name: Optional[str] = None) -> Analyzer:
+    """
+    Resolve an analyzer by name, defaulting to the ANALYZER setting.
+    """
+    name = name or settings.ANALYZER
+    if name not in _analyzers:
+        _analyzers[name] = ANALYZERS[name]()
+    return _analyzers[name]
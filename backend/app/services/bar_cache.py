@@ -0,0 +1,434 @@
+from collections import OrderedDict
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import datetime
+import logging
+import threading
+import time
+
+import numpy as np
+
+from ..core.config import settings
+from ..models.asset import AssetPrice, AssetPriceRollup
+from .price_store import BAR_FIELDS, OHLCV_FIELDS, is_partitioned, price_store
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Bars committed in a transaction wait under this key of the connection's
+# info until it commits
+_PENDING_KEY = "bar_cache_pending"
+
+# Assets whose bars were rewritten or deleted in a transaction, likewise
+_REWRITTEN_KEY = "bar_cache_rewritten"
+
+# Smallest ring allocated, so assets with few bars do not regrow every write
+_MIN_CAPACITY = 256
+
+def _naive_utc(timestamp: datetime.datetime) -> datetime.datetime:
+    # Naive timestamps are UTC, as in the models
+    if timestamp.tzinfo:
+        return timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def _datetime64(timestamp: datetime.datetime) -> np.datetime64:
+    return np.datetime64(_naive_utc(timestamp), "us")
+
+class BarRing:
+    """
+    The newest bars of one asset, as one array per field used as a ring
+    buffer: appending past the capacity overwrites the oldest bar. Arrays
+    start small and double up to `max_bars`.
+
+    `complete` means the ring holds every stored bar of the asset, so a
+    range starting before its oldest bar is still fully answered.
+    """
+
+    def __init__(self, max_bars: int, capacity: int):
+        self.max_bars = max_bars
+        self.ids = np.zeros(capacity, dtype=np.int64)  # 0 for bars without a surrogate id
+        self.timestamps = np.zeros(capacity, dtype="datetime64[us]")
+        self.columns = {field: np.zeros(capacity) for field in OHLCV_FIELDS}  # NaN volume for None
+        self.start = 0
+        self.count = 0
+        self.complete = False
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Any], max_bars: int) -> "BarRing":
+        """
+        A ring of the newest stored bars, given as (id, timestamp, *OHLCV)
+        rows in timestamp order.
+        """
+        ring = cls(max_bars, min(max_bars, max(_MIN_CAPACITY, len(rows))))
+        ring.complete = len(rows) < max_bars
+        if rows:
+            ids, timestamps, *values = zip(*rows)
+            ring.append(
+                np.array([bar_id or 0 for bar_id in ids], dtype=np.int64),
+                np.array([_naive_utc(timestamp) for timestamp in timestamps], dtype="datetime64[us]"),
+                {field: np.array(column, dtype=float) for field, column in zip(OHLCV_FIELDS, values)},
+            )
+        return ring
+
+    @property
+    def capacity(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.timestamps.nbytes + sum(column.nbytes for column in self.columns.values())
+
+    def _ordered(self, array: np.ndarray) -> np.ndarray:
+        end = self.start + self.count
+        if end <= self.capacity:
+            return array[self.start:end]
+        return np.concatenate((array[self.start:], array[:end - self.capacity]))
+
+    def _resize(self, capacity: int) -> None:
+        self.ids = np.resize(self._ordered(self.ids), capacity)
+        self.timestamps = np.resize(self._ordered(self.timestamps), capacity)
+        self.columns = {field: np.resize(self._ordered(column), capacity) for field, column in self.columns.items()}
+        self.start = 0
+
+    def append(self, ids: np.ndarray, timestamps: np.ndarray, columns: Dict[str, np.ndarray]) -> None:
+        """
+        Add bars newer than every bar held, in timestamp order.
+        """
+        if self.count + len(timestamps) > self.capacity and self.capacity < self.max_bars:
+            self._resize(min(self.max_bars, max(2 * self.capacity, self.count + len(timestamps))))
+        if len(timestamps) > self.capacity:
+            keep = slice(len(timestamps) - self.capacity, None)
+            ids, timestamps = ids[keep], timestamps[keep]
+            columns = {field: column[keep] for field, column in columns.items()}
+            self.complete = False
+        positions = (self.start + self.count + np.arange(len(timestamps))) % self.capacity
+        self.ids[positions] = ids
+        self.timestamps[positions] = timestamps
+        for field, column in columns.items():
+            self.columns[field][positions] = column
+        overflow = self.count + len(timestamps) - self.capacity
+        if overflow > 0:
+            self.start = (self.start + overflow) % self.capacity
+            self.count = self.capacity
+            self.complete = False
+        else:
+            self.count += len(timestamps)
+
+    def merge(self, bars: Sequence[Tuple[int, datetime.datetime, Tuple[float, ...]]]) -> bool:
+        """
+        Apply committed bars, given as (id, timestamp, OHLCV) in timestamp
+        order. New bars are appended, rewrites of a held bar (same
+        timestamp, no new id) replace it and bars older than the ring are
+        left to the database. Returns False when a bar lands inside the
+        window as a new row, which the ring cannot take in place.
+        """
+        timestamps = np.array([_naive_utc(timestamp) for _, timestamp, _ in bars], dtype="datetime64[us]")
+        first_new = 0
+        if self.count:
+            newest = self.timestamps[(self.start + self.count - 1) % self.capacity]
+            first_new = int(np.searchsorted(timestamps, newest, side="right"))
+        if len(timestamps) > first_new and np.any(np.diff(timestamps[first_new:]) <= np.timedelta64(0, "us")):
+            return False
+
+        held = self._ordered(self.timestamps)
+        for (bar_id, _, values), timestamp in zip(bars[:first_new], timestamps[:first_new]):
+            if not self.count or timestamp < held[0]:
+                self.complete = False
+                continue
+            index = int(np.searchsorted(held, timestamp))
+            if index == self.count or held[index] != timestamp or bar_id:
+                return False
+            position = (self.start + index) % self.capacity
+            for field, value in zip(OHLCV_FIELDS, values):
+                self.columns[field][position] = np.nan if value is None else value
+
+        if first_new < len(bars):
+            fresh = bars[first_new:]
+            self.append(
+                np.array([bar_id or 0 for bar_id, _, _ in fresh], dtype=np.int64),
+                timestamps[first_new:],
+                {
+                    field: np.array([values[i] for _, _, values in fresh], dtype=float)
+                    for i, field in enumerate(OHLCV_FIELDS)
+                },
+            )
+        return True
+
+    def window(self, start: Optional[datetime.datetime], end: Optional[datetime.datetime]) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Copies of the bars in [start, end], or None when bars before the
+        ring's oldest one may belong to the range.
+        """
+        timestamps = self._ordered(self.timestamps)
+        if start is None:
+            first = 0
+            if not self.complete:
+                return None
+        else:
+            start = _datetime64(start)
+            if not self.complete and (not self.count or start < timestamps[0]):
+                return None
+            first = int(np.searchsorted(timestamps, start, side="left"))
+        last = self.count if end is None else int(np.searchsorted(timestamps, _datetime64(end), side="right"))
+        last = max(first, last)
+        return {
+            "id": self._ordered(self.ids)[first:last].copy(),
+            "timestamp": timestamps[first:last].copy(),
+            **{field: self._ordered(column)[first:last].copy() for field, column in self.columns.items()},
+        }
+
+class HotBarCache:
+    """
+    The newest `bars_per_asset` raw bars of recently read assets, so price
+    reads of recent ranges are answered from memory.
+
+    An asset is loaded on its first read and kept current by the bars
+    committed in this process; assets least recently read are evicted to
+    stay within `max_bytes`. Rings are reloaded after `ttl` seconds as a
+    backstop for bars written by other processes.
+    """
+
+    def __init__(self, bars_per_asset: int = 7200, max_bytes: int = 64 * 2 ** 20, ttl: float = 300.0):
+        self.bars_per_asset = bars_per_asset
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._rings: "OrderedDict[int, BarRing]" = OrderedDict()
+        # Bumped on every commit with bars of the asset, so a load that read
+        # the database before the commit is not installed after it
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _load_rows(self, connection: Connection, asset_id: int) -> List[Any]:
+        if is_partitioned():
+            rows = price_store.latest(connection, asset_id, self.bars_per_asset, ("timestamp",) + OHLCV_FIELDS)
+            return [(None, *row) for row in rows]
+        prices = AssetPrice.__table__
+        rows = connection.execute(
+            select(prices.c.id, prices.c.timestamp, *(prices.c[field] for field in OHLCV_FIELDS))
+            .where(prices.c.asset_id == asset_id)
+            .order_by(prices.c.timestamp.desc(), prices.c.id.desc())
+            .limit(self.bars_per_asset)
+        ).all()
+        return rows[::-1]
+
+    def load(self, connection: Connection, asset_id: int) -> BarRing:
+        """
+        Read the newest bars of an asset into a ring and keep it, unless
+        bars of the asset were committed meanwhile.
+        """
+        version = self._versions.get(asset_id, 0)
+        ring = BarRing.from_rows(self._load_rows(connection, asset_id), self.bars_per_asset)
+        with self._lock:
+            self.loads += 1
+            if self._versions.get(asset_id, 0) == version and ring.nbytes <= self.max_bytes:
+                self._discard(asset_id)
+                self._rings[asset_id] = ring
+                self.bytes += ring.nbytes
+                self._evict()
+        return ring
+
+    def _discard(self, asset_id: int) -> None:
+        ring = self._rings.pop(asset_id, None)
+        if ring is not None:
+            self.bytes -= ring.nbytes
+
+    def _evict(self) -> None:
+        while self.bytes > self.max_bytes and len(self._rings) > 1:
+            self._discard(next(iter(self._rings)))
+            self.evictions += 1
+
+    def read(
+        self,
+        connection: Connection,
+        asset_id: int,
+        start: Optional[datetime.datetime],
+        end: Optional[datetime.datetime],
+        load: bool = True,
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Raw bars of an asset in [start, end] as arrays of ids, timestamps
+        (datetime64[us]) and OHLCV, or None when the range reaches past the
+        bars held and must be read from the database. An asset that is not
+        held is loaded first if `load` is set.
+        """
+        with self._lock:
+            ring = self._rings.get(asset_id)
+            if ring is not None and time.monotonic() - ring.loaded_at <= self.ttl:
+                self._rings.move_to_end(asset_id)
+                bars = ring.window(start, end)
+                if bars is not None:
+                    self.hits += 1
+                    return bars
+                self.misses += 1
+                return None
+        if not load or start is None:
+            # Only a ring holding every bar of the asset answers an open
+            # range, which rarely pays for the load
+            with self._lock:
+                self.misses += 1
+            return None
+        # Not loaded or stale; loading costs about one range read
+        bars = self.load(connection, asset_id).window(start, end)
+        with self._lock:
+            if bars is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return bars
+
+    def apply(self, bars: Dict[int, List[Tuple[int, datetime.datetime, Tuple[float, ...]]]]) -> None:
+        """
+        Apply committed bars: asset_id -> (id, timestamp, OHLCV) tuples.
+        """
+        with self._lock:
+            for asset_id, asset_bars in bars.items():
+                self._versions[asset_id] = self._versions.get(asset_id, 0) + 1
+                ring = self._rings.get(asset_id)
+                if ring is None:
+                    continue
+                asset_bars.sort(key=lambda bar: _naive_utc(bar[1]))
+                before = ring.nbytes
+                if ring.merge(asset_bars):
+                    self.bytes += ring.nbytes - before
+                else:
+                    self.bytes -= before
+                    del self._rings[asset_id]
+                    self.invalidations += 1
+            self._evict()
+
+    def invalidate(self, asset_ids: Iterable[int]) -> None:
+        """
+        Drop the rings of assets whose committed bars were rewritten or
+        deleted, which rings cannot apply in place.
+        """
+        with self._lock:
+            for asset_id in asset_ids:
+                self._versions[asset_id] = self._versions.get(asset_id, 0) + 1
+                if asset_id in self._rings:
+                    self._discard(asset_id)
+                    self.invalidations += 1
+
+    def warm(self, connection: Connection, assets: int) -> int:
+        """
+        Load the `assets` assets with the most recent bars, by the finest
+        price rollup. Returns the number loaded.
+        """
+        intervals = settings.PRICE_ROLLUP_INTERVALS
+        if not assets or not intervals:
+            return 0
+        rollups = AssetPriceRollup.__table__
+        asset_ids = connection.execute(
+            select(rollups.c.asset_id)
+            .where(rollups.c.interval == intervals[0])
+            .group_by(rollups.c.asset_id)
+            .order_by(func.max(rollups.c.bucket_start).desc())
+            .limit(assets)
+        ).scalars().all()
+        for asset_id in reversed(asset_ids):
+            self.load(connection, asset_id)
+        return len(asset_ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._rings)
+            self._rings.clear()
+            self.bytes = 0
+
+    def asset_bytes(self) -> Dict[int, int]:
+        """
+        Memory held per cached asset, largest first.
+        """
+        with self._lock:
+            sizes = {asset_id: ring.nbytes for asset_id, ring in self._rings.items()}
+        return dict(sorted(sizes.items(), key=lambda item: item[1], reverse=True))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        with self._lock:
+            bars = sum(ring.count for ring in self._rings.values())
+        return {
+            "assets": len(self._rings),
+            "bars": bars,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "bars_per_asset": self.bars_per_asset,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "largest": dict(list(self.asset_bytes().items())[:10]),
+        }
+
+bar_cache = HotBarCache(
+    bars_per_asset=settings.BAR_CACHE_BARS,
+    max_bytes=settings.BAR_CACHE_MAX_BYTES,
+    ttl=settings.BAR_CACHE_TTL,
+)
+
+def stage_bars(connection: Connection, bars: Iterable[Any]) -> None:
+    """
+    Hold newly stored raw bars (AssetPrice rows or objects with the same
+    attributes) until the connection's transaction commits, then add them
+    to the cached assets. Core writes of new bars call this themselves.
+    """
+    if not settings.BAR_CACHE_ENABLED:
+        return
+    pending = connection.info.setdefault(_PENDING_KEY, {})
+    for bar in bars:
+        pending.setdefault(bar.asset_id, []).append(
+            (getattr(bar, "id", None), bar.timestamp, tuple(getattr(bar, field) for field in OHLCV_FIELDS))
+        )
+
+def stage_rewrites(connection: Connection, asset_ids: Iterable[int]) -> None:
+    """
+    Drop the cached bars of assets once the connection's transaction
+    commits, for updates and deletes of stored bars. Core writes of that
+    kind call this themselves.
+    """
+    if not settings.BAR_CACHE_ENABLED:
+        return
+    connection.info.setdefault(_REWRITTEN_KEY, set()).update(asset_ids)
+
+@event.listens_for(Engine, "begin")
+@event.listens_for(Engine, "rollback")
+def _discard_pending(connection):
+    connection.info.pop(_PENDING_KEY, None)
+    connection.info.pop(_REWRITTEN_KEY, None)
+
+@event.listens_for(Engine, "commit")
+def _apply_pending(connection):
+    pending = connection.info.pop(_PENDING_KEY, None)
+    if pending:
+        bar_cache.apply(pending)
+    rewritten = connection.info.pop(_REWRITTEN_KEY, None)
+    if rewritten:
+        bar_cache.invalidate(rewritten)
+
+# Bars added through the ORM; ids are assigned by now
+@event.listens_for(Session, "after_flush")
+def _stage_new_bars(session, flush_context):
+    bars = [obj for obj in session.new if isinstance(obj, AssetPrice)]
+    if bars:
+        stage_bars(session.connection(), bars)
+
+# Before the row goes, while its attributes can still be loaded
+@event.listens_for(AssetPrice, "before_delete")
+def _stage_deleted_bar(mapper, connection, target):
+    stage_rewrites(connection, [target.asset_id])
+
+@event.listens_for(AssetPrice, "after_update")
+def _stage_updated_bar(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if any(getattr(attrs, field).history.has_changes() for field in BAR_FIELDS):
+        stage_rewrites(connection, [target.asset_id, *attrs.asset_id.history.deleted])
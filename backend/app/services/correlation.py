@@ -0,0 +1,168 @@
+from sqlalchemy.orm import Session
+from sqlmodel import select
+from typing import Any, Dict, List, Optional, Sequence
+import datetime
+import logging
+
+import numpy as np
+
+from ..core.config import settings
+from ..models.news import AssetMention, NewsItem
+from .resampling import load_price_columns, to_epoch
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CORRELATION_FIELDS = ("bar_date", "price_change", "abnormal_return", "volume_spike")
+
+def to_days(values: Sequence[Any]) -> np.ndarray:
+    """
+    Day numbers since the epoch for ISO date strings, dates or datetimes.
+    """
+    if len(values) and isinstance(values[0], datetime.datetime):
+        return to_epoch(values) // 86400
+    return np.array(values, dtype="datetime64[D]").astype(np.int64)
+
+def _trailing_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Mean of the `window` values before each position, NaN without history.
+    Missing (NaN) values are left out of the mean rather than spoiling
+    every later one.
+    """
+    sums = np.concatenate(([0.0], np.nancumsum(values)))
+    present = np.concatenate(([0], np.cumsum(~np.isnan(values))))
+    positions = np.arange(len(values))
+    starts = np.maximum(positions - window, 0)
+    counts = present[positions] - present[starts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, (sums[positions] - sums[starts]) / counts, np.nan)
+
+def correlate(
+    event_days: np.ndarray,
+    bar_days: np.ndarray,
+    open_prices: np.ndarray,
+    close_prices: np.ndarray,
+    volumes: np.ndarray,
+    window: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Match events to the bar of the same day and measure the market reaction.
+
+    `bar_days` must be sorted ascending, so every event is found with one
+    binary search instead of a scan over the bars. For matched events:
+
+    - price_change: close over open of the bar, in percent
+    - abnormal_return: close-to-close return minus the mean return of the
+      preceding `window` bars, in percent
+    - volume_spike: volume over the mean volume of the preceding `window` bars
+
+    Unmatched events get index -1 and NaN metrics.
+    """
+    window = window or settings.CORRELATION_WINDOW
+    if not len(bar_days):
+        missing = np.full(len(event_days), np.nan)
+        return {
+            "index": np.full(len(event_days), -1),
+            "price_change": missing,
+            "abnormal_return": missing,
+            "volume_spike": missing,
+        }
+    positions = np.minimum(np.searchsorted(bar_days, event_days), len(bar_days) - 1)
+    matched = bar_days[positions] == event_days
+    index = np.where(matched, positions, -1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change = (close_prices - open_prices) / open_prices * 100
+        returns = np.full(len(close_prices), np.nan)
+        returns[1:] = (close_prices[1:] / close_prices[:-1] - 1) * 100
+        # The first bar has no return, so baselines start from the second
+        expected = np.full(len(close_prices), np.nan)
+        expected[1:] = _trailing_mean(returns[1:], window)
+        abnormal = returns - expected
+        spike = volumes / _trailing_mean(volumes, window)
+
+    def pick(values: np.ndarray) -> np.ndarray:
+        return np.where(matched, values[positions], np.nan)
+
+    return {
+        "index": index,
+        "price_change": pick(change),
+        "abnormal_return": pick(abnormal),
+        "volume_spike": pick(spike),
+    }
+
+def _rounded(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(value) else value for value in np.round(values, 4).tolist()]
+
+def correlation_columns(
+    events: Dict[str, List[Any]],
+    event_dates: Sequence[Any],
+    bar_dates: Sequence[Any],
+    open_prices: Sequence[float],
+    close_prices: Sequence[float],
+    volumes: Sequence[Optional[float]],
+    window: Optional[int] = None,
+) -> Dict[str, List[Any]]:
+    """
+    Event columns extended with the CORRELATION_FIELDS, one value per event.
+    """
+    bar_days = to_days(bar_dates)
+    result = correlate(
+        to_days(event_dates),
+        bar_days,
+        np.asarray(open_prices, dtype=float),
+        np.asarray(close_prices, dtype=float),
+        np.array([np.nan if volume is None else volume for volume in volumes], dtype=float),
+        window,
+    )
+    dates = bar_days.astype("datetime64[D]").tolist()
+    return {
+        **events,
+        "bar_date": [dates[i] if i >= 0 else None for i in result["index"].tolist()],
+        "price_change": _rounded(result["price_change"]),
+        "abnormal_return": _rounded(result["abnormal_return"]),
+        "volume_spike": _rounded(result["volume_spike"]),
+    }
+
+def load_asset_correlations(
+    session: Session,
+    asset_id: int,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    window: Optional[int] = None,
+) -> Dict[str, List[Any]]:
+    """
+    News mentioning an asset joined to its daily bars.
+
+    Daily bars come from the 1d rollup. Bars are loaded from a little before
+    `start` so the first events in range still have a baseline.
+    """
+    window = window or settings.CORRELATION_WINDOW
+    query = (
+        select(NewsItem.id, NewsItem.title, NewsItem.published_at)
+        .join(AssetMention, AssetMention.news_id == NewsItem.id)
+        .where(AssetMention.asset_id == asset_id)
+    )
+    if start:
+        query = query.where(NewsItem.published_at >= start)
+    if end:
+        query = query.where(NewsItem.published_at <= end)
+    news = session.execute(query.order_by(NewsItem.published_at, NewsItem.id)).all()
+
+    # Calendar days, with room for weekends and holidays
+    bars_start = start - datetime.timedelta(days=window * 2) if start else None
+    bars = load_price_columns(session, asset_id, "1d", bars_start, end)
+    published = [row.published_at for row in news]
+    return correlation_columns(
+        {
+            "news_id": [row.id for row in news],
+            "title": [row.title for row in news],
+            "published_at": published,
+        },
+        published,
+        bars["timestamp"],
+        bars["open_price"],
+        bars["close_price"],
+        bars["volume"],
+        window,
+    )
@@ -0,0 +1,237 @@
+from collections import Counter
+from itertools import combinations
+from sqlalchemy import bindparam, event, func, inspect, select, union_all
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import datetime
+import json
+import logging
+
+from ..models.analysis import Analysis
+from ..models.graph import EntityEdge, NewsEntities
+from ..models.news import NewsItem
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# (news_id, published_at, entities)
+EntityChange = Tuple[int, datetime.datetime, Any]
+EdgeKey = Tuple[str, str, datetime.date]
+
+# SQLite caps bound parameters per statement; stay well below it for IN lists
+_LOOKUP_CHUNK = 500
+
+def normalize_entities(raw: Any) -> List[str]:
+    """
+    Distinct entity names, sorted, from the stored analysis value: a JSON
+    string or a list of names or of {"name"|"text": ...} objects.
+    """
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            raw = [raw]
+    names = set()
+    for entity in raw or []:
+        if isinstance(entity, dict):
+            entity = entity.get("name") or entity.get("text")
+        if isinstance(entity, str) and entity.strip():
+            names.add(entity.strip()[:255])
+    return sorted(names)
+
+def _edges(entities: List[str], day: datetime.date) -> List[EdgeKey]:
+    # `entities` is sorted, so every pair comes out as (source < target)
+    return [(source, target, day) for source, target in combinations(entities, 2)]
+
+def _day(value: Any) -> datetime.date:
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+def update_entity_graph(connection: Connection, changes: Iterable[EntityChange]) -> int:
+    """
+    Apply new entity lists of news items to the edge table.
+
+    Only the difference to what each item contributed before is written, so
+    re-analysing an article touches just the pairs that changed. An empty
+    list removes the item from the graph. Returns the number of edges
+    written. The caller owns the transaction.
+    """
+    latest = {news_id: (_day(published_at), normalize_entities(raw)) for news_id, published_at, raw in changes}
+    if not latest:
+        return 0
+    stored = NewsEntities.__table__
+    previous: Dict[int, Tuple[datetime.date, List[str]]] = {}
+    news_ids = sorted(latest)
+    for i in range(0, len(news_ids), _LOOKUP_CHUNK):
+        chunk = news_ids[i:i + _LOOKUP_CHUNK]
+        for row in connection.execute(select(stored).where(stored.c.news_id.in_(chunk))):
+            previous[row.news_id] = (row.day, list(row.entities or []))
+
+    delta: Counter = Counter()
+    for news_id, (day, entities) in latest.items():
+        if news_id in previous:
+            delta.subtract(_edges(previous[news_id][1], previous[news_id][0]))
+        delta.update(_edges(entities, day))
+    written = _apply_delta(connection, {key: weight for key, weight in delta.items() if weight})
+
+    if previous:
+        connection.execute(stored.delete().where(stored.c.news_id.in_(list(previous))))
+    rows = [
+        {"news_id": news_id, "day": day, "entities": entities}
+        for news_id, (day, entities) in latest.items() if entities
+    ]
+    if rows:
+        connection.execute(stored.insert(), rows)
+    return written
+
+def _apply_delta(connection: Connection, delta: Dict[EdgeKey, int]) -> int:
+    if not delta:
+        return 0
+    edges = EntityEdge.__table__
+    existing: Dict[EdgeKey, Tuple[int, int]] = {}
+    for day in {key[2] for key in delta}:
+        sources = sorted({key[0] for key in delta if key[2] == day})
+        for i in range(0, len(sources), _LOOKUP_CHUNK):
+            query = select(edges.c.id, edges.c.source, edges.c.target, edges.c.weight).where(
+                edges.c.day == day, edges.c.source.in_(sources[i:i + _LOOKUP_CHUNK])
+            )
+            for row in connection.execute(query):
+                existing[(row.source, row.target, day)] = (row.id, row.weight)
+
+    inserts, updates, deletes = [], [], []
+    for (source, target, day), change in delta.items():
+        current = existing.get((source, target, day))
+        if current is None:
+            if change > 0:
+                inserts.append({"source": source, "target": target, "day": day, "weight": change})
+        elif current[1] + change > 0:
+            updates.append({"edge_id": current[0], "weight": current[1] + change})
+        else:
+            deletes.append(current[0])
+    if inserts:
+        connection.execute(edges.insert(), inserts)
+    if updates:
+        connection.execute(
+            edges.update().where(edges.c.id == bindparam("edge_id")).values(weight=bindparam("weight")),
+            updates,
+        )
+    for i in range(0, len(deletes), _LOOKUP_CHUNK):
+        connection.execute(edges.delete().where(edges.c.id.in_(deletes[i:i + _LOOKUP_CHUNK])))
+    return len(inserts) + len(updates) + len(deletes)
+
+def _window(query, start: Optional[datetime.date], end: Optional[datetime.date]):
+    if start:
+        query = query.where(EntityEdge.day >= start)
+    if end:
+        query = query.where(EntityEdge.day <= end)
+    return query
+
+def top_neighbours(
+    session: Session,
+    entity: str,
+    k: int = 10,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Entities most often mentioned together with `entity`, heaviest first.
+    """
+    # One indexed lookup per edge direction instead of an OR over both columns
+    outgoing = _window(
+        select(EntityEdge.target.label("entity"), EntityEdge.weight).where(EntityEdge.source == entity), start, end
+    )
+    incoming = _window(
+        select(EntityEdge.source.label("entity"), EntityEdge.weight).where(EntityEdge.target == entity), start, end
+    )
+    edges = union_all(outgoing, incoming).subquery()
+    weight = func.sum(edges.c.weight).label("weight")
+    query = (
+        select(edges.c.entity, weight)
+        .group_by(edges.c.entity)
+        .order_by(weight.desc(), edges.c.entity)
+        .limit(k)
+    )
+    return [{"entity": row.entity, "weight": row.weight} for row in session.execute(query)]
+
+def entity_subgraph(
+    session: Session,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    limit: int = 200,
+    entity: Optional[str] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    The `limit` heaviest edges within a time window, optionally restricted to
+    the edges of one entity, in the nodes/links shape used by the frontend.
+    """
+    weight = func.sum(EntityEdge.weight).label("weight")
+    query = _window(select(EntityEdge.source, EntityEdge.target, weight), start, end)
+    if entity:
+        query = query.where((EntityEdge.source == entity) | (EntityEdge.target == entity))
+    query = (
+        query.group_by(EntityEdge.source, EntityEdge.target)
+        .order_by(weight.desc(), EntityEdge.source, EntityEdge.target)
+        .limit(limit)
+    )
+    links = [
+        {"source": row.source, "target": row.target, "strength": row.weight}
+        for row in session.execute(query)
+    ]
+    degree: Counter = Counter()
+    for link in links:
+        degree[link["source"]] += link["strength"]
+        degree[link["target"]] += link["strength"]
+    nodes = [{"id": name, "name": name, "weight": weight} for name, weight in degree.most_common()]
+    return {"nodes": nodes, "links": links}
+
+def rebuild_entity_graph(connection: Connection, batch_size: int = 5000) -> int:
+    """
+    Recompute the graph from all analyses, for backfills.
+    """
+    connection.execute(EntityEdge.__table__.delete())
+    connection.execute(NewsEntities.__table__.delete())
+    analyses = Analysis.__table__
+    news = NewsItem.__table__
+    query = (
+        select(analyses.c.news_id, news.c.published_at, analyses.c.entities)
+        .join(news, news.c.id == analyses.c.news_id)
+        .order_by(analyses.c.news_id)
+    )
+    written = 0
+    last_id = None
+    while True:
+        batch_query = query if last_id is None else query.where(analyses.c.news_id > last_id)
+        batch = connection.execute(batch_query.limit(batch_size)).all()
+        if not batch:
+            return written
+        written += update_entity_graph(connection, [tuple(row) for row in batch])
+        last_id = batch[-1].news_id
+
+# Keep the graph current for analyses written through the ORM. Core level
+# bulk writes must call `update_entity_graph` themselves.
+def _published_at(connection: Connection, news_id: int) -> Optional[datetime.datetime]:
+    news = NewsItem.__table__
+    return connection.execute(select(news.c.published_at).where(news.c.id == news_id)).scalar()
+
+@event.listens_for(Analysis, "after_insert")
+@event.listens_for(Analysis, "after_update")
+def _update_analysis_entities(mapper, connection, target):
+    if not inspect(target).attrs.entities.history.has_changes():
+        return
+    published_at = _published_at(connection, target.news_id)
+    if published_at is not None:
+        update_entity_graph(connection, [(target.news_id, published_at, target.entities)])
+
+@event.listens_for(Analysis, "after_delete")
+def _remove_analysis_entities(mapper, connection, target):
+    update_entity_graph(connection, [(target.news_id, datetime.date.min, [])])
+
+@event.listens_for(NewsItem, "after_update")
+def _move_news_entities(mapper, connection, target):
+    # The item's edges belong to the day it was published on
+    if not inspect(target).attrs.published_at.history.has_changes():
+        return
+    stored = NewsEntities.__table__
+    entities = connection.execute(select(stored.c.entities).where(stored.c.news_id == target.id)).scalar()
+    if entities:
+        update_entity_graph(connection, [(target.id, target.published_at, entities)])
@@ -0,0 +1,192 @@
+from pydantic import ValidationError
+from sqlalchemy import event, insert, select
+from sqlalchemy.engine import Connection
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import datetime
+import hashlib
+import logging
+import re
+import unicodedata
+
+from ..core.config import settings
+from ..models.news import NewsItem
+from ..schemas.news import NewsCreate, NewsIngestResponse, NewsIngestResult
+from .analysis_worker import enqueue_analysis
+from .mentions import news_text, write_mentions
+from .near_duplicates import near_duplicate_index, signature_text
+from .search import get_search_backend
+from .stream import stage_news
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Query parameters that only track the referrer and never change the article
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|spm|from|source|ref|share\w*|fbclid|gclid|wt\.mc_\w+)$", re.I)
+_DEFAULT_PORTS = {"http": "80", "https": "443"}
+_WHITESPACE = re.compile(r"\s+")
+
+# SQLite caps bound parameters per statement; stay well below it for IN lists
+_LOOKUP_CHUNK = 500
+
+def _digest(value: str) -> str:
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=16).hexdigest()
+
+def normalize_url(url: Optional[str]) -> Optional[str]:
+    """
+    Canonical form of an article URL: lower-case scheme and host, no default
+    port, fragment, tracking parameters or trailing slash, sorted query.
+    """
+    if not url or not url.strip():
+        return None
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "http").lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and str(parts.port) != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _TRACKING_PARAMS.match(key)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+def url_hash(url: Optional[str]) -> Optional[str]:
+    normalized = normalize_url(url)
+    return _digest(normalized) if normalized else None
+
+def content_hash(title: Optional[str], content: Optional[str]) -> str:
+    """
+    Hash of title and content after Unicode (NFKC), case and whitespace
+    normalization, so re-encoded copies of the same article collide.
+    """
+    text = f"{title or ''}\n{content or ''}"
+    if not unicodedata.is_normalized("NFKC", text):
+        text = unicodedata.normalize("NFKC", text)
+    text = text.lower()
+    return _digest(_WHITESPACE.sub(" ", text).strip())
+
+def _find_existing(connection: Connection, url_hashes: List[str], content_hashes: List[str]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    news = NewsItem.__table__
+    by_url: Dict[str, int] = {}
+    by_content: Dict[str, int] = {}
+    for column, hashes, found in (
+        (news.c.url_hash, url_hashes, by_url),
+        (news.c.content_hash, content_hashes, by_content),
+    ):
+        for i in range(0, len(hashes), _LOOKUP_CHUNK):
+            chunk = hashes[i:i + _LOOKUP_CHUNK]
+            for news_id, value in connection.execute(select(news.c.id, column).where(column.in_(chunk))):
+                found.setdefault(value, news_id)
+    return by_url, by_content
+
+def ingest_news(connection: Connection, items: Iterable[Any], offset: int = 0) -> NewsIngestResponse:
+    """
+    Validate, dedupe and insert a batch of news items with one multi-row
+    insert, then add them to the full-text index, link near-duplicates into
+    clusters, record the assets they mention, queue them for analysis and
+    stage them for stream subscribers.
+
+    Items that match an existing row, or an earlier item of the same batch,
+    by normalized URL or content hash are reported as duplicates and not
+    inserted. Near-duplicates (e.g. the same wire story with small edits)
+    are inserted with the cluster of the earlier item and not analyzed. `offset`
+    is added to the reported item positions when a stream is ingested in
+    several batches. The caller owns the transaction.
+    """
+    report = NewsIngestResponse()
+    results: List[Optional[NewsIngestResult]] = []
+    pending: List[Tuple[int, Dict[str, Any]]] = []
+    now = datetime.datetime.utcnow()
+
+    for position, raw in enumerate(items, start=offset):
+        try:
+            item = raw if isinstance(raw, NewsCreate) else NewsCreate.model_validate(raw)
+        except ValidationError as e:
+            results.append(NewsIngestResult(index=position, status="invalid", errors=e.errors(include_url=False)))
+            report.invalid += 1
+            continue
+        row = item.model_dump()
+        row["published_at"] = row["published_at"] or now
+        row["created_at"] = row["updated_at"] = now
+        row["url_hash"] = url_hash(row["url"])
+        row["content_hash"] = content_hash(row["title"], row["content"])
+        pending.append((len(results), row))
+        results.append(None)
+
+    by_url, by_content = _find_existing(
+        connection,
+        sorted({row["url_hash"] for _, row in pending if row["url_hash"]}),
+        sorted({row["content_hash"] for _, row in pending}),
+    )
+
+    # Rows of this batch claim their hashes as they are accepted so later
+    # copies within the same batch are caught as well
+    accepted: List[Tuple[int, Dict[str, Any]]] = []
+    owners: Dict[str, int] = {}
+    batch_duplicates: List[Tuple[int, int]] = []
+    for slot, row in pending:
+        keys = [key for key in (row["url_hash"], row["content_hash"]) if key]
+        existing = by_url.get(row["url_hash"]) or by_content.get(row["content_hash"])
+        if existing is not None:
+            results[slot] = NewsIngestResult(index=offset + slot, status="duplicate", duplicate_of=existing)
+            report.duplicates += 1
+            continue
+        owner = next((owners[key] for key in keys if key in owners), None)
+        if owner is not None:
+            batch_duplicates.append((slot, owner))
+            report.duplicates += 1
+            continue
+        for key in keys:
+            owners[key] = slot
+        accepted.append((slot, row))
+
+    ids_by_slot: Dict[int, int] = {}
+    if accepted:
+        news = NewsItem.__table__
+        # Accepted rows have distinct content hashes, which maps the returned
+        # ids back to items without forcing row-at-a-time ordered inserts
+        inserted = dict(
+            (content_key, news_id)
+            for news_id, content_key in connection.execute(
+                insert(news).returning(news.c.id, news.c.content_hash),
+                [row for _, row in accepted],
+            )
+        )
+        for slot, row in accepted:
+            ids_by_slot[slot] = inserted[row["content_hash"]]
+            results[slot] = NewsIngestResult(index=offset + slot, status="created", id=ids_by_slot[slot])
+        report.created += len(accepted)
+        get_search_backend(connection.dialect.name).index(
+            connection,
+            [(ids_by_slot[slot], row["title"], row["content"], row["summary"]) for slot, row in accepted],
+            replace=False,
+        )
+        clusters = near_duplicate_index.link(
+            connection,
+            [(ids_by_slot[slot], signature_text(row["title"], row["content"])) for slot, row in accepted],
+        )
+        for slot, _ in accepted:
+            results[slot].cluster_id = clusters.get(ids_by_slot[slot])
+        report.near_duplicates += len(clusters)
+        write_mentions(
+            connection,
+            [(ids_by_slot[slot], news_text(row["title"], row["summary"], row["content"])) for slot, row in accepted],
+        )
+        if settings.ANALYZE_ON_INGEST:
+            enqueue_analysis(connection, [news_id for news_id in ids_by_slot.values() if news_id not in clusters])
+        stage_news(connection, [{**row, "id": ids_by_slot[slot]} for slot, row in accepted])
+    for slot, owner in batch_duplicates:
+        results[slot] = NewsIngestResult(index=offset + slot, status="duplicate", duplicate_of=ids_by_slot[owner])
+
+    report.results = results
+    return report
+
+# Hashes for rows written through the ORM, e.g. create_news_item/update_news_item
+@event.listens_for(NewsItem, "before_insert")
+@event.listens_for(NewsItem, "before_update")
+def _set_dedup_hashes(mapper, connection, target):
+    target.url_hash = url_hash(target.url)
+    target.content_hash = content_hash(target.title, target.content)
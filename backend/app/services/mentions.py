@@ -0,0 +1,308 @@
+from collections import deque
+from sqlalchemy import event, inspect, select
+from sqlalchemy.engine import Connection, Engine
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+import re
+import threading
+import time
+
+from ..core.config import settings
+from ..models.asset import Asset
+from ..models.news import AssetMention, NewsItem
+from .sentiment import update_sentiment_rollups
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Asset changes written in a transaction wait under this key of the
+# connection's info until it commits
+_PENDING_KEY = "mention_assets_pending"
+
+# Text is split on whitespace after punctuation is turned into spaces, which
+# is several times faster than a tokenizing regex. "." and "-" stay inside
+# words (BRK.B, BTC-USD, 600519.SH, Coca-Cola) and "$" marks a cashtag.
+_SEPARATORS = str.maketrans(dict.fromkeys(
+    "!\"#%&'()*+,/:;<=>?@[\\]^_`{|}~\t\r"
+    "\u2018\u2019\u201c\u201d\u00ab\u00bb\u2026\u2013\u2014\u00b7"
+    "\u3001\u3002\u300a\u300b\u300c\u300d\u300e\u300f\u3010\u3011"
+    "\uff01\uff08\uff09\uff0c\uff1a\uff1b\uff1f",
+    " ",
+))
+# Kana and CJK ideographs are written without spaces, so every character is
+# a token of its own
+_CJK_CHAR = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+# SQLite caps bound parameters per statement; stay well below it for IN lists
+_LOOKUP_CHUNK = 500
+
+# (asset_id, lower-cased tokens, tokens as they must be written or None)
+Pattern = Tuple[int, Tuple[str, ...], Optional[Tuple[str, ...]]]
+
+def tokenize(text: str) -> List[str]:
+    text = text.translate(_SEPARATORS)
+    if not text.isascii():
+        text = _CJK_CHAR.sub(r" \g<0> ", text)
+    # A "." or "-" that ends a word is punctuation, not part of it
+    tokens = text.replace(". ", " ").replace(".\n", "\n").replace("- ", " ").split()
+    if tokens and tokens[-1][-1] in ".-":
+        tokens[-1] = tokens[-1].rstrip(".-")
+        if not tokens[-1]:
+            tokens.pop()
+    return tokens
+
+def asset_patterns(
+    asset_id: int,
+    symbol: str,
+    name: str,
+    aliases: Optional[Sequence[str]] = None,
+    min_symbol_length: int = 2,
+) -> List[Pattern]:
+    """
+    Token sequences that count as a mention of an asset.
+
+    Names and aliases match in any case. Symbols match when written in
+    capitals, or in any case as a cashtag ($aapl); symbols shorter than
+    `min_symbol_length` only as a cashtag, so "A" or "ON" in running text
+    are not taken for tickers.
+    """
+    patterns: List[Pattern] = []
+    symbol_tokens = tuple(tokenize((symbol or "").lstrip("$").upper()))
+    if symbol_tokens:
+        cashtag = ("$" + symbol_tokens[0],) + symbol_tokens[1:]
+        patterns.append((asset_id, tuple(token.lower() for token in cashtag), None))
+        if len(symbol.lstrip("$")) >= min_symbol_length:
+            patterns.append((asset_id, tuple(token.lower() for token in symbol_tokens), symbol_tokens))
+    for alias in [name, *(aliases or [])]:
+        tokens = tuple(token.lower() for token in tokenize(alias or ""))
+        if tokens and len("".join(tokens)) >= min_symbol_length:
+            patterns.append((asset_id, tokens, None))
+    return patterns
+
+class MentionAutomaton:
+    """
+    Aho–Corasick automaton over word tokens, compiled from the patterns of
+    every asset.
+
+    Text is split into word tokens and then walked once, so
+    the cost of a search depends on the length of the text, not on the
+    number of assets. Matching whole tokens means a pattern never matches
+    inside a longer word.
+    """
+
+    def __init__(self, patterns: Iterable[Pattern]):
+        self._goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[Tuple[int, int, Optional[Tuple[str, ...]]]]] = [[]]
+        for asset_id, tokens, exact in patterns:
+            state = 0
+            for token in tokens:
+                child = self._goto[state].get(token)
+                if child is None:
+                    child = self._goto[state][token] = len(self._goto)
+                    self._goto.append({})
+                    outputs.append([])
+                state = child
+            outputs[state].append((asset_id, len(tokens), exact))
+
+        # Failure links breadth first; every state also reports the matches
+        # of the suffixes it falls back to, longest first
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                if state:
+                    self._fail[child] = self._goto[fallback].get(token, 0)
+                outputs[child].extend(outputs[self._fail[child]])
+        self._outputs = [tuple(output) for output in outputs]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def count(self, text: str) -> Dict[int, int]:
+        """
+        Mentions per asset id in `text`. Overlapping matches of the same
+        asset, e.g. of "Apple" inside "Apple Inc", count once.
+        """
+        tokens = tokenize(text)
+        # One lower() for all tokens; NUL never occurs in or comes out of them
+        lowered = "\0".join(tokens).lower().split("\0")
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        counts: Dict[int, int] = {}
+        last_end: Dict[int, int] = {}
+        state = 0
+        for end, token in enumerate(lowered):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if not state or not outputs[state]:
+                continue
+            for asset_id, length, exact in outputs[state]:
+                start = end - length + 1
+                if exact is not None and tuple(tokens[start:end + 1]) != exact:
+                    continue
+                if last_end.get(asset_id, -1) >= start:
+                    continue
+                last_end[asset_id] = end
+                counts[asset_id] = counts.get(asset_id, 0) + 1
+        return counts
+
+class MentionExtractor:
+    """
+    Finds asset mentions in news text with an automaton of all assets.
+
+    Patterns are kept per asset and changed one asset at a time as assets
+    are created, updated or deleted; the automaton is recompiled from them
+    on the next extraction. Asset changes made by other processes are
+    picked up by a full reload every `reload_interval` seconds.
+    """
+
+    def __init__(self, min_symbol_length: int = 2, reload_interval: float = 300.0):
+        self.min_symbol_length = min_symbol_length
+        self.reload_interval = reload_interval
+        self._patterns: Dict[int, List[Pattern]] = {}
+        self._automaton: Optional[MentionAutomaton] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.compiles = 0
+        self.compile_seconds = 0.0
+        self.extracted = 0
+
+    def _asset_patterns(self, asset_id: int, symbol: str, name: str, aliases: Optional[Sequence[str]]) -> List[Pattern]:
+        return asset_patterns(asset_id, symbol, name, aliases, self.min_symbol_length)
+
+    def load(self, connection: Connection) -> None:
+        """
+        Replace the patterns with those of every asset in the database.
+        """
+        assets = Asset.__table__
+        patterns = {
+            row.id: self._asset_patterns(row.id, row.symbol, row.name, row.aliases)
+            for row in connection.execute(select(assets.c.id, assets.c.symbol, assets.c.name, assets.c.aliases))
+        }
+        with self._lock:
+            self._patterns = patterns
+            self._automaton = None
+            self._loaded_at = time.monotonic()
+
+    def apply(self, changes: Dict[int, Optional[Tuple[str, str, Optional[Sequence[str]]]]]) -> None:
+        """
+        Apply committed asset changes: asset_id -> (symbol, name, aliases),
+        or None for a deleted asset.
+        """
+        with self._lock:
+            if self._loaded_at is None:
+                # Nothing loaded yet; the first extraction reads every asset
+                return
+            for asset_id, asset in changes.items():
+                if asset is None:
+                    self._patterns.pop(asset_id, None)
+                else:
+                    self._patterns[asset_id] = self._asset_patterns(asset_id, *asset)
+            self._automaton = None
+
+    def automaton(self, connection: Connection) -> MentionAutomaton:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_interval:
+            self.load(connection)
+        with self._lock:
+            if self._automaton is None:
+                started = time.perf_counter()
+                self._automaton = MentionAutomaton(
+                    pattern for patterns in self._patterns.values() for pattern in patterns
+                )
+                self.compiles += 1
+                self.compile_seconds += time.perf_counter() - started
+            return self._automaton
+
+    def extract(self, connection: Connection, texts: Sequence[str]) -> List[Dict[int, int]]:
+        """
+        Mentions per asset id for each text.
+        """
+        automaton = self.automaton(connection)
+        self.extracted += len(texts)
+        return [automaton.count(text) for text in texts]
+
+    def stats(self) -> Dict[str, Any]:
+        automaton = self._automaton
+        return {
+            "assets": len(self._patterns),
+            "states": len(automaton) if automaton is not None else None,
+            "compiles": self.compiles,
+            "compile_seconds": round(self.compile_seconds, 3),
+            "extracted": self.extracted,
+        }
+
+mention_extractor = MentionExtractor(
+    min_symbol_length=settings.MENTION_MIN_SYMBOL_LENGTH,
+    reload_interval=settings.MENTION_RELOAD_INTERVAL,
+)
+
+def news_text(title: Optional[str], summary: Optional[str], content: Optional[str]) -> str:
+    return "\n".join(value for value in (title, summary, content) if value)
+
+def write_mentions(connection: Connection, news: Sequence[Tuple[int, str]], replace: bool = False) -> int:
+    """
+    Extract the asset mentions of news items, given as (news_id, text), and
+    insert their AssetMention rows in one statement. With `replace`, the
+    items' existing mentions are deleted first. Returns the number of rows
+    written. The caller owns the transaction.
+    """
+    if not news or not settings.MENTION_EXTRACTION:
+        return 0
+    found = mention_extractor.extract(connection, [text for _, text in news])
+    rows = [
+        {"news_id": news_id, "asset_id": asset_id, "mention_count": mention_count}
+        for (news_id, _), counts in zip(news, found)
+        for asset_id, mention_count in counts.items()
+    ]
+    mentions = AssetMention.__table__
+    news_ids = [news_id for news_id, _ in news]
+    if replace:
+        for i in range(0, len(news_ids), _LOOKUP_CHUNK):
+            connection.execute(mentions.delete().where(mentions.c.news_id.in_(news_ids[i:i + _LOOKUP_CHUNK])))
+    if rows:
+        connection.execute(mentions.insert(), rows)
+    if replace:
+        # New items have no analysis yet, so only replaced mentions can
+        # move the sentiment rollups
+        update_sentiment_rollups(connection, news_ids)
+    return len(rows)
+
+# Mentions of news items written through the ORM, e.g. create_news_item and
+# update_news_item. Bulk Core inserts must call `write_mentions` themselves.
+@event.listens_for(NewsItem, "after_insert")
+def _extract_new_news_item(mapper, connection, target):
+    write_mentions(connection, [(target.id, news_text(target.title, target.summary, target.content))])
+
+@event.listens_for(NewsItem, "after_update")
+def _reextract_news_item(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if any(attrs[field].history.has_changes() for field in ("title", "summary", "content")):
+        write_mentions(
+            connection, [(target.id, news_text(target.title, target.summary, target.content))], replace=True
+        )
+
+# Asset changes reach the extractor once committed
+@event.listens_for(Asset, "after_insert")
+@event.listens_for(Asset, "after_update")
+def _stage_asset(mapper, connection, target):
+    connection.info.setdefault(_PENDING_KEY, {})[target.id] = (target.symbol, target.name, target.aliases)
+
+@event.listens_for(Asset, "after_delete")
+def _stage_asset_removal(mapper, connection, target):
+    connection.info.setdefault(_PENDING_KEY, {})[target.id] = None
+
+@event.listens_for(Engine, "begin")
+@event.listens_for(Engine, "rollback")
+def _discard_pending(connection):
+    connection.info.pop(_PENDING_KEY, None)
+
+@event.listens_for(Engine, "commit")
+def _apply_pending(connection):
+    pending = connection.info.pop(_PENDING_KEY, None)
+    if pending:
+        mention_extractor.apply(pending)
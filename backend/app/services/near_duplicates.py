@@ -0,0 +1,285 @@
+from sqlalchemy import bindparam, event, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import hashlib
+import logging
+import re
+import unicodedata
+
+import numpy as np
+
+from ..core.config import settings
+from ..models.news import NewsItem, NewsLshBucket, NewsSignature
+from .analysis_worker import enqueue_analysis
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Permutations are drawn from a fixed seed: signatures are stored, so every
+# process must hash the same way
+_PERMUTATION_SEED = 20240507
+# Base of the polynomial hash of a shingle's code points
+_SHINGLE_BASE = np.uint64(0x100000001B3)
+# Shingles hashed per permutation step, bounding the temporary matrix
+_SHINGLE_BLOCK = 2048
+
+# SQLite caps bound parameters per statement; stay well below it for IN lists
+_LOOKUP_CHUNK = 500
+
+def signature_text(title: Optional[str], content: Optional[str]) -> str:
+    """
+    Title and content after Unicode (NFKC), case and whitespace
+    normalization, as in the exact content hash.
+    """
+    text = f"{title or ''}\n{content or ''}"
+    if not unicodedata.is_normalized("NFKC", text):
+        text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE.sub(" ", text.lower()).strip()
+
+class MinHasher:
+    """
+    MinHash signatures over character shingles. Characters rather than words
+    make it work for Chinese and other text written without spaces.
+
+    Each permutation is a multiply-shift hash of the 64-bit shingle hashes;
+    the fraction of equal signature values of two texts estimates the
+    Jaccard similarity of their shingle sets.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = _PERMUTATION_SEED):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # Odd multipliers keep each hash a bijection of the 64-bit space
+        self._a = (rng.integers(0, 2 ** 64 - 1, size=(num_perm, 1), dtype=np.uint64, endpoint=True) | np.uint64(1))
+        self._b = rng.integers(0, 2 ** 64 - 1, size=(num_perm, 1), dtype=np.uint64, endpoint=True)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """
+        Distinct 64-bit hashes of the text's character n-grams; a text
+        shorter than one shingle is a shingle of its own.
+        """
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+        count = len(codes) - self.shingle_size + 1
+        if count <= 0:
+            count, width = (1, len(codes)) if len(codes) else (0, 0)
+        else:
+            width = self.shingle_size
+        hashes = codes[:count].copy()
+        for offset in range(1, width):
+            hashes = hashes * _SHINGLE_BASE + codes[offset:offset + count]
+        return np.unique(hashes)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """
+        uint32 minimum of every permutation, or None for empty text.
+        """
+        shingles = self.shingles(text)
+        if not len(shingles):
+            return None
+        minimum = np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(shingles), _SHINGLE_BLOCK):
+            hashed = np.multiply(self._a, shingles[start:start + _SHINGLE_BLOCK])
+            hashed += self._b
+            np.minimum(minimum, hashed.min(axis=1), out=minimum)
+        # The high half of the minimum is the minimum of the high halves
+        return (minimum >> np.uint64(32)).astype(np.uint32)
+
+class NearDuplicateIndex:
+    """
+    Persistent LSH index of news signatures.
+
+    A signature is split into bands of `num_perm / bands` values, and each
+    band is hashed to a bucket in news_lsh_buckets. Items sharing a bucket
+    with an incoming one are candidates; the candidate whose signature
+    agrees most with it, at `threshold` or above, is its near-duplicate.
+    A lookup is one indexed query on the incoming items' buckets, whatever
+    the size of the corpus.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16, shingle_size: int = 5):
+        if num_perm % bands:
+            raise ValueError(f"{num_perm} permutations do not split into {bands} bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.linked = 0
+
+    def buckets(self, signature: np.ndarray) -> List[int]:
+        """
+        One signed 64-bit bucket key per band, which SQLite stores as is.
+        """
+        return [
+            int.from_bytes(
+                hashlib.blake2b(band.tobytes(), digest_size=8, salt=index.to_bytes(2, "little")).digest(),
+                "little", signed=True,
+            )
+            for index, band in enumerate(signature.reshape(self.bands, -1))
+        ]
+
+    def _sign(self, news: Iterable[Tuple[int, str]]) -> List[Tuple[int, np.ndarray, List[int]]]:
+        signed = []
+        for news_id, text in news:
+            signature = self.hasher.signature(text)
+            if signature is not None:
+                signed.append((news_id, signature, self.buckets(signature)))
+        return signed
+
+    def _candidates(self, connection: Connection, keys: List[int]) -> Tuple[Dict[int, List[int]], Dict[int, Tuple[np.ndarray, Optional[int]]]]:
+        """
+        News ids per bucket, and the signature and cluster of each of them.
+        """
+        buckets = NewsLshBucket.__table__
+        signatures = NewsSignature.__table__
+        news = NewsItem.__table__
+        by_bucket: Dict[int, List[int]] = {}
+        known: Dict[int, Tuple[np.ndarray, Optional[int]]] = {}
+        for i in range(0, len(keys), _LOOKUP_CHUNK):
+            rows = connection.execute(
+                select(buckets.c.bucket, buckets.c.news_id, signatures.c.signature, news.c.cluster_id)
+                .join(signatures, signatures.c.news_id == buckets.c.news_id)
+                .join(news, news.c.id == buckets.c.news_id)
+                .where(buckets.c.bucket.in_(keys[i:i + _LOOKUP_CHUNK]))
+            )
+            for bucket, news_id, signature, cluster_id in rows:
+                by_bucket.setdefault(bucket, []).append(news_id)
+                if news_id not in known:
+                    known[news_id] = (np.frombuffer(signature, dtype=np.uint32), cluster_id)
+        return by_bucket, known
+
+    def _write(self, connection: Connection, signed: List[Tuple[int, np.ndarray, List[int]]]) -> None:
+        if not signed:
+            return
+        connection.execute(
+            NewsSignature.__table__.insert(),
+            [{"news_id": news_id, "signature": signature.tobytes()} for news_id, signature, _ in signed],
+        )
+        connection.execute(
+            NewsLshBucket.__table__.insert(),
+            [{"bucket": key, "news_id": news_id} for news_id, _, keys in signed for key in set(keys)],
+        )
+
+    def link(self, connection: Connection, news: Sequence[Tuple[int, str]]) -> Dict[int, int]:
+        """
+        Index newly written news items, given as (news_id, signature_text),
+        and put each near-duplicate of an earlier item, indexed before or
+        earlier in `news`, in that item's cluster. Returns news_id ->
+        cluster_id for the near-duplicates. The caller owns the transaction.
+        """
+        if not news or not settings.NEAR_DUPLICATE_DETECTION:
+            return {}
+        signed = self._sign(news)
+        by_bucket, known = self._candidates(connection, sorted({key for _, _, keys in signed for key in keys}))
+
+        clusters: Dict[int, int] = {}
+        for news_id, signature, keys in signed:
+            candidates = sorted({candidate for key in keys for candidate in by_bucket.get(key, ())})
+            cluster_id = None
+            if candidates:
+                similarity = (np.stack([known[candidate][0] for candidate in candidates]) == signature).mean(axis=1)
+                # argmax takes the oldest of equally similar candidates
+                best = int(similarity.argmax())
+                if similarity[best] >= self.threshold:
+                    cluster_id = known[candidates[best]][1] or candidates[best]
+                    clusters[news_id] = cluster_id
+            known[news_id] = (signature, cluster_id)
+            for key in keys:
+                by_bucket.setdefault(key, []).append(news_id)
+
+        if clusters:
+            news_table = NewsItem.__table__
+            connection.execute(
+                news_table.update().where(news_table.c.id == bindparam("b_id")).values(cluster_id=bindparam("b_cluster_id")),
+                [{"b_id": news_id, "b_cluster_id": cluster_id} for news_id, cluster_id in clusters.items()],
+            )
+        self._write(connection, signed)
+        self.linked += len(clusters)
+        return clusters
+
+    def reindex(self, connection: Connection, news: Sequence[Tuple[int, str]]) -> None:
+        """
+        Replace the signatures of edited news items. Their clusters are
+        kept as they are.
+        """
+        self._delete(connection, [news_id for news_id, _ in news])
+        if settings.NEAR_DUPLICATE_DETECTION:
+            self._write(connection, self._sign(news))
+
+    def _delete(self, connection: Connection, news_ids: List[int]) -> None:
+        for table in (NewsSignature.__table__, NewsLshBucket.__table__):
+            for i in range(0, len(news_ids), _LOOKUP_CHUNK):
+                connection.execute(table.delete().where(table.c.news_id.in_(news_ids[i:i + _LOOKUP_CHUNK])))
+
+    def remove(self, connection: Connection, news_ids: List[int]) -> None:
+        """
+        Drop deleted news items from the index. The oldest remaining member
+        of a cluster whose first item was deleted takes its place, and is
+        queued for the analysis it was spared as a duplicate.
+        """
+        self._delete(connection, news_ids)
+        news = NewsItem.__table__
+        promoted = []
+        for news_id in news_ids:
+            first = connection.execute(
+                select(news.c.id).where(news.c.cluster_id == news_id).order_by(news.c.id).limit(1)
+            ).scalar()
+            if first is None:
+                continue
+            connection.execute(news.update().where(news.c.id == first).values(cluster_id=None))
+            connection.execute(news.update().where(news.c.cluster_id == news_id).values(cluster_id=first))
+            promoted.append(first)
+        if promoted and settings.ANALYZE_ON_INGEST:
+            enqueue_analysis(connection, promoted)
+
+    def rebuild(self, connection: Connection, batch_size: int = 1000) -> int:
+        """
+        Re-sign every news item, after a change of NEAR_DUPLICATE_NUM_PERM,
+        NEAR_DUPLICATE_BANDS or NEAR_DUPLICATE_SHINGLE_SIZE. Clusters are
+        kept as they are.
+        """
+        connection.execute(NewsSignature.__table__.delete())
+        connection.execute(NewsLshBucket.__table__.delete())
+        news = NewsItem.__table__
+        query = select(news.c.id, news.c.title, news.c.content).order_by(news.c.id)
+        written = 0
+        last_id = None
+        while True:
+            batch_query = query if last_id is None else query.where(news.c.id > last_id)
+            batch = connection.execute(batch_query.limit(batch_size)).all()
+            if not batch:
+                return written
+            signed = self._sign((row.id, signature_text(row.title, row.content)) for row in batch)
+            self._write(connection, signed)
+            written += len(signed)
+            last_id = batch[-1].id
+
+near_duplicate_index = NearDuplicateIndex(
+    threshold=settings.NEAR_DUPLICATE_THRESHOLD,
+    num_perm=settings.NEAR_DUPLICATE_NUM_PERM,
+    bands=settings.NEAR_DUPLICATE_BANDS,
+    shingle_size=settings.NEAR_DUPLICATE_SHINGLE_SIZE,
+)
+
+def rebuild_near_duplicate_index(connection: Connection, batch_size: int = 1000) -> int:
+    return near_duplicate_index.rebuild(connection, batch_size)
+
+# News items written through the ORM. Bulk Core inserts must call
+# `near_duplicate_index.link` themselves.
+@event.listens_for(NewsItem, "after_insert")
+def _link_new_news_item(mapper, connection, target):
+    clusters = near_duplicate_index.link(connection, [(target.id, signature_text(target.title, target.content))])
+    if target.id in clusters:
+        set_committed_value(target, "cluster_id", clusters[target.id])
+
+@event.listens_for(NewsItem, "after_update")
+def _reindex_news_item(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if attrs.title.history.has_changes() or attrs.content.history.has_changes():
+        near_duplicate_index.reindex(connection, [(target.id, signature_text(target.title, target.content))])
+
+@event.listens_for(NewsItem, "after_delete")
+def _remove_news_item(mapper, connection, target):
+    near_duplicate_index.remove(connection, [target.id])
@@ -0,0 +1,371 @@
+from sqlalchemy import (
+    Column, DateTime, Float, Index, Integer, MetaData, PrimaryKeyConstraint, Table, delete, event, func, inspect,
+    select, union_all,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import Select
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+import datetime
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+
+from ..core.config import settings
+from ..models.asset import AssetPrice
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+OHLCV_FIELDS = ("open_price", "high_price", "low_price", "close_price", "volume")
+BAR_FIELDS = ("asset_id", "timestamp") + OHLCV_FIELDS
+
+# Partitions created in a transaction wait under this key of the
+# connection's info until it commits
+_PENDING_KEY = "price_partitions_pending"
+
+PARTITION_PREFIX = "asset_prices_"
+_PARTITION_RE = re.compile(rf"^{PARTITION_PREFIX}(\d{{4}})(\d{{2}})$")
+
+Month = Tuple[int, int]
+
+def month_of(timestamp: datetime.datetime) -> Month:
+    return timestamp.year, timestamp.month
+
+def partition_name(month: Month) -> str:
+    return f"{PARTITION_PREFIX}{month[0]:04d}{month[1]:02d}"
+
+def next_month(month: Month) -> Month:
+    year, number = month
+    return (year + 1, 1) if number == 12 else (year, number + 1)
+
+def months_between(start: Month, end: Month) -> List[Month]:
+    months = []
+    month = start
+    while month <= end:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+def month_start(month: Month) -> datetime.datetime:
+    return datetime.datetime(month[0], month[1], 1)
+
+def is_partitioned() -> bool:
+    return settings.PRICE_STORAGE == "partitioned"
+
+class PartitionedPriceStore:
+    """
+    Raw price bars in one table per calendar month.
+
+    Each partition is keyed (and on SQLite clustered, WITHOUT ROWID) on
+    (asset_id, timestamp), so a range read for one asset is a single index
+    range in each month it spans, and months outside the range are never
+    opened. Partitions are created on first write.
+
+    `asset_prices` stays the write target of the ORM and the source for
+    `migrate`; reads merge in whatever it still holds, so existing data can
+    be moved over while the API keeps serving.
+    """
+
+    def __init__(self):
+        self._metadata = MetaData()
+        self._known: Optional[Set[str]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _table(self, name: str) -> Table:
+        if name in self._metadata.tables:
+            return self._metadata.tables[name]
+        return Table(
+            name,
+            self._metadata,
+            Column("asset_id", Integer, nullable=False),
+            Column("timestamp", DateTime, nullable=False),
+            Column("open_price", Float, nullable=False),
+            Column("high_price", Float, nullable=False),
+            Column("low_price", Float, nullable=False),
+            Column("close_price", Float, nullable=False),
+            Column("volume", Float),
+            PrimaryKeyConstraint("asset_id", "timestamp", name=f"pk_{name}"),
+            sqlite_with_rowid=False,
+        )
+
+    def partitions(self, connection: Connection, max_age: Optional[float] = None) -> Set[str]:
+        """
+        Names of the partitions that exist, plus those created in the
+        connection's open transaction. The catalog is read again once the
+        cached list is older than `max_age` seconds, by default
+        PRICE_PARTITION_CATALOG_TTL, since other processes create
+        partitions too.
+        """
+        pending = {name for store, name in connection.info.get(_PENDING_KEY, ()) if store is self}
+        if max_age is None:
+            max_age = settings.PRICE_PARTITION_CATALOG_TTL
+        with self._lock:
+            if self._known is None or time.monotonic() - self._loaded_at > max_age:
+                # Partitions this transaction created count once it commits
+                self._known = {
+                    name for name in inspect(connection).get_table_names() if _PARTITION_RE.match(name)
+                } - pending
+                self._loaded_at = time.monotonic()
+            known = set(self._known)
+        return known | pending
+
+    def _created(self, names: Iterable[str]) -> None:
+        with self._lock:
+            if self._known is not None:
+                self._known.update(names)
+
+    def forget(self) -> None:
+        """
+        Drop the cached partition list, e.g. after partitions were dropped.
+        """
+        with self._lock:
+            self._known = None
+
+    def ensure_partition(self, connection: Connection, month: Month) -> Table:
+        name = partition_name(month)
+        table = self._table(name)
+        if name not in self.partitions(connection):
+            table.create(connection, checkfirst=True)
+            if connection.dialect.name == "postgresql":
+                # The primary key only holds the key columns there
+                Index(
+                    f"ix_{name}_covering", table.c.asset_id, table.c.timestamp,
+                    postgresql_include=list(OHLCV_FIELDS),
+                ).create(connection, checkfirst=True)
+            # Known to other connections once committed; a rolled back
+            # CREATE TABLE has to run again
+            connection.info.setdefault(_PENDING_KEY, []).append((self, name))
+        return table
+
+    def _insert(self, connection: Connection, table: Table):
+        # Re-written bars replace the stored ones instead of failing the batch
+        if connection.dialect.name in ("sqlite", "postgresql"):
+            dialect_insert = sqlite.insert if connection.dialect.name == "sqlite" else postgresql.insert
+            statement = dialect_insert(table)
+            return statement.on_conflict_do_update(
+                index_elements=["asset_id", "timestamp"],
+                set_={field: statement.excluded[field] for field in OHLCV_FIELDS},
+            )
+        return table.insert()
+
+    def write(self, connection: Connection, bars: Iterable[Any], rollup: bool = True) -> int:
+        """
+        Store bars (AssetPrice rows or objects with the same attributes) in
+        their month partitions. `rollup` folds them into the rollup tables,
+        the hot bar cache and stream subscribers, which callers moving
+        already stored bars must turn off. The caller owns the transaction.
+        """
+        bars = list(bars)
+        by_month: Dict[Month, List[Dict[str, Any]]] = {}
+        for bar in bars:
+            row = {field: getattr(bar, field) for field in BAR_FIELDS}
+            by_month.setdefault(month_of(row["timestamp"]), []).append(row)
+        for month, rows in by_month.items():
+            table = self.ensure_partition(connection, month)
+            connection.execute(self._insert(connection, table), rows)
+        if rollup and bars:
+            from .bar_cache import stage_bars
+            from .resampling import update_rollups
+            from .stream import stage_prices
+            update_rollups(connection, bars)
+            stage_bars(connection, bars)
+            stage_prices(connection, bars)
+        return len(bars)
+
+    def _partition_query(
+        self,
+        table: Table,
+        fields: Sequence[str],
+        asset_id: Optional[int],
+        start: Optional[datetime.datetime],
+        end: Optional[datetime.datetime],
+    ):
+        query = select(*(table.c[field] for field in fields))
+        if asset_id is not None:
+            query = query.where(table.c.asset_id == asset_id)
+        if start:
+            query = query.where(table.c.timestamp >= start)
+        if end:
+            query = query.where(table.c.timestamp <= end)
+        return query.order_by(table.c.asset_id, table.c.timestamp)
+
+    def _months(
+        self,
+        connection: Connection,
+        start: Optional[datetime.datetime],
+        end: Optional[datetime.datetime],
+        max_age: Optional[float] = None,
+    ) -> List[Month]:
+        existing = sorted(
+            (int(match.group(1)), int(match.group(2)))
+            for match in map(_PARTITION_RE.match, self.partitions(connection, max_age))
+        )
+        first = month_of(start) if start else None
+        last = month_of(end) if end else None
+        months = [month for month in existing if (first is None or first <= month) and (last is None or month <= last)]
+        if not months and max_age is None:
+            # Another process may have moved the range into partitions this
+            # one has not seen yet, as `migrate` does
+            return self._months(connection, start, end, max_age=0)
+        return months
+
+    def read(
+        self,
+        connection: Connection,
+        asset_id: int,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        fields: Sequence[str] = BAR_FIELDS,
+    ) -> List[Any]:
+        """
+        Bars of one asset ordered by timestamp, from the partitions that
+        overlap [start, end] plus any not yet migrated `asset_prices` rows.
+        `fields` must include "timestamp".
+        """
+        fields = list(fields)
+        rows: List[Any] = []
+        # Months are visited in order, so the result is already sorted
+        for month in self._months(connection, start, end):
+            table = self._table(partition_name(month))
+            rows.extend(connection.execute(self._partition_query(table, fields, asset_id, start, end)))
+
+        legacy = AssetPrice.__table__
+        legacy_rows = connection.execute(
+            self._partition_query(legacy, fields, asset_id, start, end)
+        ).all()
+        if not legacy_rows:
+            return rows
+        position = fields.index("timestamp")
+        return list(heapq.merge(rows, legacy_rows, key=lambda row: row[position]))
+
+    def latest(
+        self,
+        connection: Connection,
+        asset_id: int,
+        count: int,
+        fields: Sequence[str] = BAR_FIELDS,
+    ) -> List[Any]:
+        """
+        The newest `count` bars of one asset ordered by timestamp, reading
+        partitions back from the latest month until enough are found.
+        `fields` must include "timestamp".
+        """
+        fields = list(fields)
+        position = fields.index("timestamp")
+        found: List[Any] = []
+        for month in reversed(self._months(connection, None, None)):
+            if len(found) >= count:
+                break
+            table = self._table(partition_name(month))
+            query = self._partition_query(table, fields, asset_id, None, None)
+            found.extend(connection.execute(
+                query.order_by(None).order_by(table.c.timestamp.desc()).limit(count - len(found))
+            ))
+
+        legacy = AssetPrice.__table__
+        legacy_rows = connection.execute(
+            self._partition_query(legacy, fields, asset_id, None, None)
+            .order_by(None).order_by(legacy.c.timestamp.desc()).limit(count)
+        ).all()
+        newest = heapq.merge(found, legacy_rows, key=lambda row: row[position], reverse=True)
+        return list(itertools.islice(newest, count))[::-1]
+
+    def range_queries(
+        self,
+        connection: Connection,
+        asset_id: int,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        fields: Sequence[str] = BAR_FIELDS,
+    ) -> List[Select]:
+        """
+        The rows `read` returns, as one ordered statement per month, for
+        callers that stream them instead of loading the whole range. Each
+        month's partition is combined with the not yet migrated
+        `asset_prices` rows of that month.
+        """
+        legacy = AssetPrice.__table__
+        bounds = [legacy.c.asset_id == asset_id]
+        if start:
+            bounds.append(legacy.c.timestamp >= start)
+        if end:
+            bounds.append(legacy.c.timestamp <= end)
+        first, last = connection.execute(
+            select(func.min(legacy.c.timestamp), func.max(legacy.c.timestamp)).where(*bounds)
+        ).one()
+        partitioned = set(self._months(connection, start, end))
+        legacy_months = set(months_between(month_of(first), month_of(last))) if first else set()
+
+        queries = []
+        for month in sorted(partitioned | legacy_months):
+            parts = []
+            if month in partitioned:
+                table = self._table(partition_name(month))
+                parts.append(self._partition_query(table, fields, asset_id, start, end).order_by(None))
+            if month in legacy_months:
+                parts.append(
+                    select(*(legacy.c[field] for field in fields)).where(
+                        *bounds,
+                        legacy.c.timestamp >= month_start(month),
+                        legacy.c.timestamp < month_start(next_month(month)),
+                    )
+                )
+            query = parts[0] if len(parts) == 1 else union_all(*parts).subquery().select()
+            queries.append(query.order_by(query.selected_columns.timestamp))
+        return queries
+
+    def iter_batches(
+        self,
+        connection: Connection,
+        asset_id: Optional[int] = None,
+        batch_size: int = 100000,
+    ) -> Iterator[List[Any]]:
+        """
+        All partitioned bars, optionally of one asset, in batches.
+        """
+        for month in self._months(connection, None, None):
+            table = self._table(partition_name(month))
+            query = self._partition_query(table, BAR_FIELDS, asset_id, None, None)
+            result = connection.execution_options(yield_per=batch_size).execute(query)
+            for batch in result.partitions(batch_size):
+                yield batch
+
+    def migrate(self, engine: Engine, batch_size: int = 50000) -> int:
+        """
+        Move bars from `asset_prices` into the partitions, one committed
+        batch at a time, so it can run (and be resumed) while the API is
+        serving. Rollups already cover these bars and are left alone.
+        Returns the number of bars moved.
+        """
+        prices = AssetPrice.__table__
+        moved = 0
+        while True:
+            with engine.begin() as connection:
+                batch = connection.execute(
+                    select(prices.c.id, *(prices.c[field] for field in BAR_FIELDS))
+                    .order_by(prices.c.id)
+                    .limit(batch_size)
+                ).all()
+                if not batch:
+                    return moved
+                self.write(connection, batch, rollup=False)
+                connection.execute(delete(prices).where(prices.c.id <= batch[-1].id))
+            moved += len(batch)
+            logger.info(f"Migrated {moved} price bars into monthly partitions")
+
+price_store = PartitionedPriceStore()
+
+@event.listens_for(Engine, "begin")
+@event.listens_for(Engine, "rollback")
+def _discard_pending(connection):
+    connection.info.pop(_PENDING_KEY, None)
+
+@event.listens_for(Engine, "commit")
+def _record_pending(connection):
+    for store, name in connection.info.pop(_PENDING_KEY, ()):
+        store._created([name])
@@ -0,0 +1,479 @@
+from sqlalchemy import and_, bindparam, event, inspect, or_, select, tuple_
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import datetime
+import logging
+import re
+import time
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.database import read_connection
+from ..core.response_cache import invalidate_on_commit
+from ..models.asset import AssetPrice, AssetPriceRollup
+from .bar_cache import bar_cache
+from .price_store import BAR_FIELDS, OHLCV_FIELDS, is_partitioned, price_store
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_INTERVAL_RE = re.compile(r"^(\d+)([smhdw])$")
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+PRICE_FIELDS = ("id", "asset_id", "timestamp") + OHLCV_FIELDS
+
+def parse_interval(interval: str) -> int:
+    """
+    Convert an interval such as `5m`, `4h` or `1d` into seconds.
+    """
+    match = _INTERVAL_RE.match(interval.strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Unsupported interval: {interval}")
+    return int(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+
+def to_epoch(timestamps: Sequence[datetime.datetime]) -> np.ndarray:
+    """
+    Naive timestamps are taken as UTC, which is how the models store them.
+    """
+    naive = [
+        ts.astimezone(datetime.timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+        for ts in timestamps
+    ]
+    return np.array(naive, dtype="datetime64[s]").astype(np.int64)
+
+def from_epoch(seconds: int) -> datetime.datetime:
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=int(seconds))
+
+# The epoch was a Thursday; buckets of whole weeks start on the Monday after it
+_WEEK_OFFSET = 4 * _UNIT_SECONDS["d"]
+
+def bucket_floor(seconds, bucket_seconds: int):
+    """
+    Start of the bucket holding `seconds`, epoch seconds as an int or an
+    array. Buckets are aligned to the epoch, or to Monday 00:00 UTC for
+    intervals of whole weeks.
+    """
+    offset = _WEEK_OFFSET if bucket_seconds % _UNIT_SECONDS["w"] == 0 else 0
+    return seconds - (seconds - offset) % bucket_seconds
+
+def resample(
+    timestamps: np.ndarray,
+    columns: Dict[str, np.ndarray],
+    bucket_seconds: int,
+    counts: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Aggregate time-ordered OHLCV arrays into fixed buckets aligned as in
+    `bucket_floor`.
+
+    `timestamps` are epoch seconds sorted ascending. `counts` lets already
+    aggregated bars be resampled again while keeping the source bar count.
+    Returns bucket starts, OHLCV columns, bar counts and the first and last
+    source timestamp of every bucket.
+    """
+    if len(timestamps) == 0:
+        empty = np.empty(0)
+        return {
+            "bucket_start": empty.astype(np.int64), "bar_count": empty.astype(np.int64),
+            "first_timestamp": empty.astype(np.int64), "last_timestamp": empty.astype(np.int64),
+            **{field: empty for field in OHLCV_FIELDS},
+        }
+    buckets = bucket_floor(timestamps, bucket_seconds)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(timestamps)] - 1
+    volume = np.nan_to_num(columns["volume"].astype(float))
+    if counts is None:
+        counts = np.ones(len(timestamps), dtype=np.int64)
+    return {
+        "bucket_start": buckets[starts],
+        "open_price": columns["open_price"][starts],
+        "high_price": np.maximum.reduceat(columns["high_price"], starts),
+        "low_price": np.minimum.reduceat(columns["low_price"], starts),
+        "close_price": columns["close_price"][ends],
+        "volume": np.add.reduceat(volume, starts),
+        "bar_count": np.add.reduceat(counts, starts),
+        "first_timestamp": timestamps[starts],
+        "last_timestamp": timestamps[ends],
+    }
+
+def _columns(rows: Sequence[Any]) -> Dict[str, np.ndarray]:
+    return {
+        field: np.array([getattr(row, field) for row in rows], dtype=float)
+        for field in OHLCV_FIELDS
+    }
+
+def _bar_columns(asset_id: int, bars: Dict[str, np.ndarray]) -> Dict[str, List[Any]]:
+    count = len(bars["bucket_start"])
+    return {
+        "id": [None] * count,
+        "asset_id": [asset_id] * count,
+        "timestamp": bars["bucket_start"].astype("datetime64[s]").tolist(),
+        **{field: bars[field].tolist() for field in OHLCV_FIELDS},
+    }
+
+def rollup_intervals() -> Dict[str, int]:
+    return {interval: parse_interval(interval) for interval in settings.PRICE_ROLLUP_INTERVALS}
+
+def update_rollups(connection: Connection, bars: Iterable[Any]) -> int:
+    """
+    Fold newly stored raw bars into every rollup interval.
+
+    `bars` are AssetPrice rows or objects with the same attributes. Only the
+    buckets touched by the new bars are read and rewritten. Returns the
+    number of rollup buckets written.
+    """
+    by_asset: Dict[int, List[Any]] = {}
+    for bar in bars:
+        by_asset.setdefault(bar.asset_id, []).append(bar)
+    written = 0
+    for asset_id, asset_bars in by_asset.items():
+        asset_bars.sort(key=lambda bar: bar.timestamp)
+        timestamps = to_epoch([bar.timestamp for bar in asset_bars])
+        columns = _columns(asset_bars)
+        for interval, seconds in rollup_intervals().items():
+            written += _fold(connection, asset_id, interval, resample(timestamps, columns, seconds))
+    # Every raw bar write passes through here
+    invalidate_on_commit(connection, *(f"asset-prices:{asset_id}" for asset_id in by_asset))
+    return written
+
+def _fold(connection: Connection, asset_id: int, interval: str, fresh: Dict[str, np.ndarray]) -> int:
+    """
+    Merge resampled buckets into the stored rollups of one interval.
+    """
+    rollups = AssetPriceRollup.__table__
+    bucket_starts = [from_epoch(start) for start in fresh["bucket_start"]]
+    existing = {
+        row.bucket_start: row
+        for row in connection.execute(
+            select(rollups).where(
+                rollups.c.asset_id == asset_id,
+                rollups.c.interval == interval,
+                rollups.c.bucket_start.in_(bucket_starts),
+            )
+        )
+    }
+    inserts, updates = [], []
+    for i, bucket_start in enumerate(bucket_starts):
+        row = {
+            "asset_id": asset_id,
+            "interval": interval,
+            "bucket_start": bucket_start,
+            "bar_count": int(fresh["bar_count"][i]),
+            "first_timestamp": from_epoch(fresh["first_timestamp"][i]),
+            "last_timestamp": from_epoch(fresh["last_timestamp"][i]),
+            **{field: float(fresh[field][i]) for field in OHLCV_FIELDS},
+        }
+        current = existing.get(bucket_start)
+        if current is None:
+            inserts.append(row)
+            continue
+        # Merge with the stored bucket; late bars may move open or close
+        if current.first_timestamp < row["first_timestamp"]:
+            row["open_price"], row["first_timestamp"] = current.open_price, current.first_timestamp
+        if current.last_timestamp > row["last_timestamp"]:
+            row["close_price"], row["last_timestamp"] = current.close_price, current.last_timestamp
+        row["high_price"] = max(row["high_price"], current.high_price)
+        row["low_price"] = min(row["low_price"], current.low_price)
+        row["volume"] += current.volume or 0.0
+        row["bar_count"] += current.bar_count
+        row["rollup_id"] = current.id
+        updates.append(row)
+    if inserts:
+        connection.execute(rollups.insert(), inserts)
+    if updates:
+        connection.execute(
+            rollups.update().where(rollups.c.id == bindparam("rollup_id")),
+            updates,
+        )
+    return len(inserts) + len(updates)
+
+def refold_rollups(connection: Connection, positions: Iterable[Tuple[int, datetime.datetime]]) -> int:
+    """
+    Recompute the rollup buckets holding the given (asset_id, timestamp)
+    positions from the raw bars stored now, after bars there were rewritten
+    or deleted. Folding is additive, so those buckets cannot be patched in
+    place. Returns the number of rollup buckets written.
+    """
+    by_asset: Dict[int, List[datetime.datetime]] = {}
+    for asset_id, timestamp in positions:
+        by_asset.setdefault(asset_id, []).append(timestamp)
+    rollups = AssetPriceRollup.__table__
+    prices = AssetPrice.__table__
+    written = 0
+    for asset_id, timestamps in by_asset.items():
+        epochs = to_epoch(timestamps)
+        for interval, seconds in rollup_intervals().items():
+            bucket_starts = sorted({from_epoch(start) for start in bucket_floor(epochs, seconds).tolist()})
+            connection.execute(rollups.delete().where(
+                rollups.c.asset_id == asset_id,
+                rollups.c.interval == interval,
+                rollups.c.bucket_start.in_(bucket_starts),
+            ))
+            width = datetime.timedelta(seconds=seconds)
+            if is_partitioned():
+                # Buckets are visited in order, so the rows stay sorted
+                rows = [
+                    row for start in bucket_starts
+                    for row in price_store.read(
+                        connection, asset_id, start, start + width - datetime.timedelta(microseconds=1),
+                        ("timestamp",) + OHLCV_FIELDS,
+                    )
+                ]
+            else:
+                rows = connection.execute(
+                    select(prices.c.timestamp, *(prices.c[field] for field in OHLCV_FIELDS))
+                    .where(
+                        prices.c.asset_id == asset_id,
+                        or_(*(
+                            and_(prices.c.timestamp >= start, prices.c.timestamp < start + width)
+                            for start in bucket_starts
+                        )),
+                    )
+                    .order_by(prices.c.timestamp, prices.c.id)
+                ).all()
+            bars = resample(to_epoch([row.timestamp for row in rows]), _columns(rows), seconds)
+            written += _fold(connection, asset_id, interval, bars)
+    invalidate_on_commit(connection, *(f"asset-prices:{asset_id}" for asset_id in by_asset))
+    return written
+
+def rebuild_rollups(connection: Connection, asset_id: Optional[int] = None, batch_size: int = 100000) -> int:
+    """
+    Recompute rollups from raw bars, for backfills and schema changes.
+    """
+    rollups = AssetPriceRollup.__table__
+    prices = AssetPrice.__table__
+    delete = rollups.delete()
+    query = select(prices).order_by(prices.c.asset_id, prices.c.timestamp, prices.c.id)
+    if asset_id is not None:
+        delete = delete.where(rollups.c.asset_id == asset_id)
+        query = query.where(prices.c.asset_id == asset_id)
+    connection.execute(delete)
+    written = 0
+    last_key = None
+    while True:
+        batch_query = query
+        if last_key is not None:
+            batch_query = batch_query.where(
+                tuple_(prices.c.asset_id, prices.c.timestamp, prices.c.id) > tuple_(*last_key)
+            )
+        batch = connection.execute(batch_query.limit(batch_size)).all()
+        if not batch:
+            break
+        written += update_rollups(connection, batch)
+        last_key = (batch[-1].asset_id, batch[-1].timestamp, batch[-1].id)
+    if is_partitioned():
+        for batch in price_store.iter_batches(connection, asset_id, batch_size):
+            written += update_rollups(connection, batch)
+    return written
+
+def _source_interval(bucket_seconds: int) -> Optional[str]:
+    """
+    Coarsest rollup that evenly divides the requested bucket size.
+    """
+    candidates = [
+        (seconds, interval) for interval, seconds in rollup_intervals().items()
+        if seconds <= bucket_seconds and bucket_seconds % seconds == 0
+    ]
+    return max(candidates)[1] if candidates else None
+
+def load_price_columns(
+    session: Session,
+    asset_id: int,
+    interval: Optional[str] = None,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+) -> Dict[str, List[Any]]:
+    """
+    Price history for an asset at the requested interval, as one list per
+    field of PRICE_FIELDS.
+
+    Raw bars are returned as stored when the interval is at or below the raw
+    resolution. Rollup intervals are read straight from the rollup table,
+    and any other interval is resampled from the coarsest rollup (or raw
+    bars) that divides it. Resampled buckets overlapping `start` or `end`
+    are included whole, whichever source they are read from.
+    Ranges within the newest bars held by the hot bar cache are answered
+    from it, resampling as needed, without the database.
+    """
+    bucket_seconds = parse_interval(interval) if interval else 0
+    raw = bucket_seconds <= parse_interval(settings.RAW_PRICE_INTERVAL)
+    source = None if raw else _source_interval(bucket_seconds)
+    if not raw and start:
+        start = from_epoch(bucket_floor(int(to_epoch([start])[0]), bucket_seconds))
+    if not raw and end:
+        last_bucket = bucket_floor(int(to_epoch([end])[0]), bucket_seconds)
+        end = from_epoch(last_bucket + bucket_seconds) - datetime.timedelta(microseconds=1)
+    if settings.BAR_CACHE_ENABLED:
+        cached = _cached_price_columns(session, asset_id, 0 if raw else bucket_seconds, start, end)
+        if cached is not None:
+            return cached
+
+    if raw:
+        if is_partitioned():
+            # Partitions have no surrogate id
+            rows = price_store.read(read_connection(session), asset_id, start, end, ("timestamp",) + OHLCV_FIELDS)
+            values = list(zip(*rows)) or [()] * (len(OHLCV_FIELDS) + 1)
+            return {
+                "id": [None] * len(rows),
+                "asset_id": [asset_id] * len(rows),
+                **{field: list(column) for field, column in zip(("timestamp",) + OHLCV_FIELDS, values)},
+            }
+        query = select(*(getattr(AssetPrice, field) for field in PRICE_FIELDS)).where(AssetPrice.asset_id == asset_id)
+        if start:
+            query = query.where(AssetPrice.timestamp >= start)
+        if end:
+            query = query.where(AssetPrice.timestamp <= end)
+        rows = session.execute(query.order_by(AssetPrice.timestamp, AssetPrice.id)).all()
+        values = list(zip(*rows)) or [()] * len(PRICE_FIELDS)
+        return {field: list(column) for field, column in zip(PRICE_FIELDS, values)}
+
+    if source is not None:
+        query = select(
+            AssetPriceRollup.bucket_start.label("timestamp"),
+            AssetPriceRollup.bar_count,
+            *(getattr(AssetPriceRollup, field) for field in OHLCV_FIELDS),
+        ).where(AssetPriceRollup.asset_id == asset_id, AssetPriceRollup.interval == source)
+        if start:
+            query = query.where(AssetPriceRollup.bucket_start >= start)
+        if end:
+            query = query.where(AssetPriceRollup.bucket_start <= end)
+        query = query.order_by(AssetPriceRollup.bucket_start)
+        rows = session.execute(query).all()
+    elif is_partitioned():
+        rows = price_store.read(read_connection(session), asset_id, start, end, ("timestamp",) + OHLCV_FIELDS)
+    else:
+        query = select(
+            AssetPrice.timestamp, *(getattr(AssetPrice, field) for field in OHLCV_FIELDS)
+        ).where(AssetPrice.asset_id == asset_id)
+        if start:
+            query = query.where(AssetPrice.timestamp >= start)
+        if end:
+            query = query.where(AssetPrice.timestamp <= end)
+        rows = session.execute(query.order_by(AssetPrice.timestamp)).all()
+
+    counts = np.array([row.bar_count for row in rows], dtype=np.int64) if source else None
+    bars = resample(to_epoch([row.timestamp for row in rows]), _columns(rows), bucket_seconds, counts)
+    return _bar_columns(asset_id, bars)
+
+def _cached_price_columns(
+    session: Session,
+    asset_id: int,
+    bucket_seconds: int,
+    start: Optional[datetime.datetime],
+    end: Optional[datetime.datetime],
+) -> Optional[Dict[str, List[Any]]]:
+    """
+    `load_price_columns` from the hot bar cache, or None when the range
+    reaches past the bars it holds. Resampled ranges come already widened
+    to whole buckets.
+    """
+    # Loading an asset only pays off for ranges the newest bars can cover:
+    # those starting within BAR_CACHE_BARS raw intervals of now
+    horizon = settings.BAR_CACHE_BARS * parse_interval(settings.RAW_PRICE_INTERVAL)
+    recent = start is not None and int(to_epoch([start])[0]) >= time.time() - horizon
+    bars = bar_cache.read(read_connection(session), asset_id, start, end, load=recent)
+    if bars is None:
+        return None
+    if bucket_seconds:
+        timestamps = bars["timestamp"].astype("datetime64[s]").astype(np.int64)
+        return _bar_columns(asset_id, resample(timestamps, bars, bucket_seconds))
+    return {
+        "id": [bar_id or None for bar_id in bars["id"].tolist()],
+        "asset_id": [asset_id] * len(bars["timestamp"]),
+        "timestamp": bars["timestamp"].tolist(),
+        **{field: bars[field].tolist() for field in OHLCV_FIELDS},
+        # NaN marks a bar stored without volume
+        "volume": [None if volume != volume else volume for volume in bars["volume"].tolist()],
+    }
+
+def load_price_bars(session: Session, asset_id: int, *args: Any, **kwargs: Any) -> List[Dict[str, Any]]:
+    """
+    Row form of `load_price_columns`.
+    """
+    columns = load_price_columns(session, asset_id, *args, **kwargs)
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+def price_export_queries(
+    session: Session,
+    asset_id: int,
+    interval: Optional[str] = None,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+) -> List[Select]:
+    """
+    Statements returning the price history of an asset as BAR_FIELDS rows
+    ordered by timestamp when run in sequence, for streaming exports.
+
+    Only raw bars and the rollup intervals can be exported this way; other
+    intervals need the whole range in memory to resample and raise
+    ValueError.
+    """
+    bucket_seconds = parse_interval(interval) if interval else 0
+    if bucket_seconds <= parse_interval(settings.RAW_PRICE_INTERVAL):
+        if is_partitioned():
+            return price_store.range_queries(read_connection(session), asset_id, start, end, BAR_FIELDS)
+        query = select(*(getattr(AssetPrice, field) for field in BAR_FIELDS)).where(AssetPrice.asset_id == asset_id)
+        if start:
+            query = query.where(AssetPrice.timestamp >= start)
+        if end:
+            query = query.where(AssetPrice.timestamp <= end)
+        return [query.order_by(AssetPrice.timestamp)]
+
+    if interval not in rollup_intervals():
+        raise ValueError(
+            f"Exports support raw bars and the {', '.join(rollup_intervals())} rollups, not {interval}"
+        )
+    if start:
+        start = from_epoch(bucket_floor(int(to_epoch([start])[0]), bucket_seconds))
+    query = select(
+        AssetPriceRollup.asset_id,
+        AssetPriceRollup.bucket_start.label("timestamp"),
+        *(getattr(AssetPriceRollup, field) for field in OHLCV_FIELDS),
+    ).where(AssetPriceRollup.asset_id == asset_id, AssetPriceRollup.interval == interval)
+    if start:
+        query = query.where(AssetPriceRollup.bucket_start >= start)
+    if end:
+        query = query.where(AssetPriceRollup.bucket_start <= end)
+    return [query.order_by(AssetPriceRollup.bucket_start)]
+
+# Keep rollups current for bars written through the ORM. Bulk Core inserts
+# must call `update_rollups` themselves, and Core updates and deletes
+# `refold_rollups`.
+_REWRITTEN_KEY = "price_rollups_rewritten"
+
+def _mark(connection: Connection, *positions: Tuple[int, datetime.datetime]) -> None:
+    connection.info.setdefault(_REWRITTEN_KEY, []).extend(positions)
+
+# active_history loads the previous asset and time of a bar before they are
+# overwritten, so a moved bar also refolds the buckets it left
+@event.listens_for(AssetPrice.asset_id, "set", active_history=True)
+@event.listens_for(AssetPrice.timestamp, "set", active_history=True)
+def _price_moved(target, value, oldvalue, initiator):
+    pass
+
+# Before the row goes, while its attributes can still be loaded
+@event.listens_for(AssetPrice, "before_delete")
+def _price_deleted(mapper, connection, target):
+    _mark(connection, (target.asset_id, target.timestamp))
+
+@event.listens_for(AssetPrice, "after_update")
+def _price_updated(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if not any(getattr(attrs, field).history.has_changes() for field in BAR_FIELDS):
+        return
+    old_asset_ids = attrs.asset_id.history.deleted or [target.asset_id]
+    old_timestamps = attrs.timestamp.history.deleted or [target.timestamp]
+    _mark(connection, (target.asset_id, target.timestamp), (old_asset_ids[0], old_timestamps[0]))
+
+@event.listens_for(Session, "after_flush")
+def _rollup_new_prices(session, flush_context):
+    new_bars = [obj for obj in session.new if isinstance(obj, AssetPrice)]
+    if new_bars:
+        update_rollups(session.connection(), new_bars)
+    # After the new bars, so buckets holding both are recomputed whole
+    positions = session.connection().info.pop(_REWRITTEN_KEY, None)
+    if positions:
+        refold_rollups(session.connection(), positions)
@@ -0,0 +1,248 @@
+from sqlalchemy import column, event, func, inspect, literal, literal_column, select, table, text
+from sqlalchemy.engine import Connection, make_url
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Type
+import logging
+import operator
+import re
+
+from ..core.config import settings
+from ..models.news import NewsItem
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# (news_id, title, content, summary)
+Document = Tuple[int, Optional[str], Optional[str], Optional[str]]
+
+# CJK ideographs, kana and hangul are written without spaces, so they are
+# indexed as overlapping bigrams instead of whitespace separated words
+_CJK_RANGES = (
+    r"\u3040-\u30ff"  # Hiragana, Katakana
+    r"\u3400-\u4dbf"  # CJK Extension A
+    r"\u4e00-\u9fff"  # CJK Unified Ideographs
+    r"\uac00-\ud7af"  # Hangul syllables
+    r"\uf900-\ufaff"  # CJK Compatibility Ideographs
+)
+_TOKEN_RE = re.compile(rf"([{_CJK_RANGES}]+)|([^\W{_CJK_RANGES}]+)")
+
+def _cjk_bigrams(run: str) -> List[str]:
+    if len(run) == 1:
+        return [run]
+    return list(map(operator.add, run, run[1:]))
+
+def segment(value: Optional[str]) -> str:
+    """
+    Tokenize text for indexing.
+
+    Latin words are kept as they are and CJK runs become overlapping bigrams
+    followed by the final character of the run, so that single character
+    prefix queries reach every position.
+    """
+    if not value:
+        return ""
+    tokens: List[str] = []
+    for run, word in _TOKEN_RE.findall(value.lower()):
+        if word:
+            tokens.append(word)
+            continue
+        tokens.extend(_cjk_bigrams(run))
+        if len(run) > 1:
+            tokens.append(run[-1])
+    return " ".join(tokens)
+
+def build_match_query(keyword: str) -> Optional[str]:
+    """
+    Translate a user keyword into an FTS5 MATCH expression.
+
+    Every whitespace separated term must match; a term is matched as a phrase
+    of its tokens, which for CJK text means a contiguous substring match.
+    The last token of a phrase matches as a prefix when it is a Latin word
+    ("iphone" finds "iPhone15") or a single CJK character, which the index
+    only holds at the end of a run ("A国" finds "A国央行"). Unlike the LIKE
+    backend, a Latin term never matches inside a word ("phone" does not
+    find "iPhone").
+    """
+    phrases = []
+    for term in keyword.split():
+        tokens = []
+        prefix = False
+        for run, word in _TOKEN_RE.findall(term.lower()):
+            tokens.extend(_cjk_bigrams(run) if run else [word])
+            prefix = bool(word) or len(run) == 1
+        if not tokens:
+            continue
+        phrases.append('"' + " ".join(tokens) + '"' + ("*" if prefix else ""))
+    return " AND ".join(phrases) if phrases else None
+
+class SearchBackend:
+    """
+    Full-text index over NewsItem title, content and summary.
+
+    `search` returns a selectable with `news_id` and `score` columns where a
+    lower score means a better match, so callers can join it against news
+    and order by score.
+    """
+    name = "base"
+
+    def setup(self, connection: Connection) -> None:
+        pass
+
+    def index(self, connection: Connection, documents: Iterable[Document], replace: bool = True) -> None:
+        """
+        Add documents to the index. `replace=False` skips removing previous
+        entries, for rows that were just inserted.
+        """
+        pass
+
+    def remove(self, connection: Connection, news_ids: Sequence[int]) -> None:
+        pass
+
+    def rebuild(self, connection: Connection, batch_size: int = 5000) -> int:
+        return 0
+
+    def search(self, keyword: str):
+        raise NotImplementedError
+
+class LikeSearchBackend(SearchBackend):
+    """
+    Fallback for databases without a native index; keeps the old LIKE scan.
+    """
+    name = "like"
+
+    def search(self, keyword: str):
+        return select(NewsItem.id.label("news_id"), literal(0.0).label("score")).where(
+            NewsItem.title.contains(keyword)
+            | NewsItem.content.contains(keyword)
+            | NewsItem.summary.contains(keyword)
+        )
+
+class Fts5SearchBackend(SearchBackend):
+    """
+    SQLite FTS5 index ranked by BM25.
+
+    The FTS table stores pre-segmented text keyed by news id (rowid), so
+    CJK text is searchable with the default unicode61 tokenizer.
+    """
+    name = "fts5"
+    table_name = "news_fts"
+    # BM25 column weights for title, content, summary
+    weights = (10.0, 1.0, 4.0)
+
+    def __init__(self):
+        self.fts = table(self.table_name, column("rowid"), column("title"), column("content"), column("summary"))
+
+    def setup(self, connection: Connection) -> None:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": self.table_name},
+        ).first()
+        if exists:
+            return
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {self.table_name} USING fts5("
+            "title, content, summary, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        count = self.rebuild(connection)
+        logger.info(f"Created {self.table_name} and indexed {count} news items")
+
+    def index(self, connection: Connection, documents: Iterable[Document], replace: bool = True) -> None:
+        rows = [
+            {"id": news_id, "title": segment(title), "content": segment(content), "summary": segment(summary)}
+            for news_id, title, content, summary in documents
+        ]
+        if not rows:
+            return
+        if replace:
+            self.remove(connection, [row["id"] for row in rows])
+        connection.execute(
+            text(f"INSERT INTO {self.table_name} (rowid, title, content, summary) VALUES (:id, :title, :content, :summary)"),
+            rows,
+        )
+
+    def remove(self, connection: Connection, news_ids: Sequence[int]) -> None:
+        if not news_ids:
+            return
+        connection.execute(
+            text(f"DELETE FROM {self.table_name} WHERE rowid = :id"),
+            [{"id": news_id} for news_id in news_ids],
+        )
+
+    def rebuild(self, connection: Connection, batch_size: int = 5000) -> int:
+        connection.execute(text(f"DELETE FROM {self.table_name}"))
+        news = NewsItem.__table__
+        query = select(news.c.id, news.c.title, news.c.content, news.c.summary).order_by(news.c.id)
+        total = 0
+        last_id = 0
+        while True:
+            batch = connection.execute(query.where(news.c.id > last_id).limit(batch_size)).all()
+            if not batch:
+                return total
+            self.index(connection, batch, replace=False)
+            total += len(batch)
+            last_id = batch[-1][0]
+
+    def search(self, keyword: str):
+        match = build_match_query(keyword)
+        if match is None:
+            # Nothing indexable in the keyword (e.g. only punctuation)
+            return select(literal(None).label("news_id"), literal(0.0).label("score")).where(literal(False))
+        fts_name = literal_column(self.table_name)
+        return (
+            select(
+                self.fts.c.rowid.label("news_id"),
+                func.bm25(fts_name, *self.weights).label("score"),
+            )
+            .select_from(self.fts)
+            .where(fts_name.op("MATCH")(match))
+        )
+
+SEARCH_BACKENDS: Dict[str, Type[SearchBackend]] = {
+    "fts5": Fts5SearchBackend,
+    "like": LikeSearchBackend,
+}
+
+# Default backend per SQL dialect
+DIALECT_BACKENDS: Dict[str, str] = {
+    "sqlite": "fts5",
+}
+
+_backends: Dict[str, SearchBackend] = {}
+
+def register_search_backend(name: str, backend: Type[SearchBackend], dialect: Optional[str] = None) -> None:
+    SEARCH_BACKENDS[name] = backend
+    if dialect:
+        DIALECT_BACKENDS[dialect] = name
+
+def get_search_backend(dialect: Optional[str] = None) -> SearchBackend:
+    """
+    Resolve the configured search backend, falling back to the dialect default.
+    """
+    if dialect is None:
+        dialect = make_url(settings.DATABASE_URL).get_backend_name()
+    name = settings.SEARCH_BACKEND or DIALECT_BACKENDS.get(dialect, "like")
+    if name not in _backends:
+        _backends[name] = SEARCH_BACKENDS[name]()
+    return _backends[name]
+
+# Keep the index in sync with ORM writes. Core level bulk writes must call
+# `index`/`remove` on the backend themselves.
+_INDEXED_FIELDS = ("title", "content", "summary")
+
+@event.listens_for(NewsItem, "after_insert")
+def _index_new_news_item(mapper, connection, target):
+    get_search_backend(connection.dialect.name).index(
+        connection, [(target.id, target.title, target.content, target.summary)]
+    )
+
+@event.listens_for(NewsItem, "after_update")
+def _reindex_news_item(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if not any(attrs[field].history.has_changes() for field in _INDEXED_FIELDS):
+        return
+    get_search_backend(connection.dialect.name).index(
+        connection, [(target.id, target.title, target.content, target.summary)]
+    )
+
+@event.listens_for(NewsItem, "after_delete")
+def _remove_news_item(mapper, connection, target):
+    get_search_backend(connection.dialect.name).remove(connection, [target.id])
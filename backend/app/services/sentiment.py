@@ -0,0 +1,327 @@
+from sqlalchemy import bindparam, event, func, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import datetime
+import logging
+
+from ..core.config import settings
+from ..core.response_cache import invalidate_on_commit
+from ..models.analysis import Analysis, Annotation, NewsSentiment
+from ..models.asset import AssetSentimentRollup
+from ..models.news import AssetMention, NewsItem
+from .resampling import bucket_floor, from_epoch, parse_interval
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SENTIMENT_FIELDS = ("bucket_start", "sentiment", "mentions", "news_count")
+
+# News items whose contribution may have changed wait under this key of the
+# connection's info until the flush ends
+_DIRTY_KEY = "sentiment_dirty"
+
+# SQLite caps bound parameters per statement; stay well below it for IN lists
+_LOOKUP_CHUNK = 500
+
+# (published_at, effective sentiment, ((asset_id, mention_count), ...))
+Contribution = Tuple[datetime.datetime, float, Tuple[Tuple[int, int], ...]]
+BucketKey = Tuple[int, str, datetime.datetime]
+
+def sentiment_intervals() -> Dict[str, int]:
+    return {interval: parse_interval(interval) for interval in settings.SENTIMENT_ROLLUP_INTERVALS}
+
+def _bucket_start(timestamp: datetime.datetime, seconds: int) -> datetime.datetime:
+    # Naive timestamps are UTC, as in the models
+    if timestamp.tzinfo:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    epoch = int((timestamp - datetime.datetime(1970, 1, 1)).total_seconds())
+    return from_epoch(bucket_floor(epoch, seconds))
+
+def current_contributions(connection: Connection, news_ids: List[int]) -> Dict[int, Contribution]:
+    """
+    What each news item should contribute now: its analysis score, or the
+    latest analyst override of it, weighted by the mention count of every
+    asset it mentions. Items without analysis or mentions contribute
+    nothing and are left out.
+    """
+    news = NewsItem.__table__
+    analyses = Analysis.__table__
+    annotations = Annotation.__table__
+    mentions = AssetMention.__table__
+    contributions: Dict[int, Contribution] = {}
+    for i in range(0, len(news_ids), _LOOKUP_CHUNK):
+        chunk = news_ids[i:i + _LOOKUP_CHUNK]
+        scored = {
+            row.news_id: row
+            for row in connection.execute(
+                select(news.c.id.label("news_id"), news.c.published_at, analyses.c.id, analyses.c.sentiment_score)
+                .join(analyses, analyses.c.news_id == news.c.id)
+                .where(news.c.id.in_(chunk))
+            )
+        }
+        if not scored:
+            continue
+        # Ordered oldest first, so the latest override wins
+        overrides = dict(
+            connection.execute(
+                select(annotations.c.analysis_id, annotations.c.override_sentiment)
+                .where(
+                    annotations.c.analysis_id.in_([row.id for row in scored.values()]),
+                    annotations.c.override_sentiment.is_not(None),
+                )
+                .order_by(annotations.c.created_at, annotations.c.id)
+            ).all()
+        )
+        counts: Dict[int, Dict[int, int]] = {}
+        for row in connection.execute(
+            select(mentions.c.news_id, mentions.c.asset_id, func.sum(mentions.c.mention_count).label("mention_count"))
+            .where(mentions.c.news_id.in_(list(scored)))
+            .group_by(mentions.c.news_id, mentions.c.asset_id)
+        ):
+            if row.mention_count and row.mention_count > 0:
+                counts.setdefault(row.news_id, {})[row.asset_id] = int(row.mention_count)
+        for news_id, row in scored.items():
+            if news_id in counts:
+                sentiment = overrides.get(row.id, row.sentiment_score)
+                contributions[news_id] = (row.published_at, float(sentiment), tuple(sorted(counts[news_id].items())))
+    return contributions
+
+def update_sentiment_rollups(connection: Connection, news_ids: Iterable[int]) -> int:
+    """
+    Bring the sentiment rollups in line with the current analysis,
+    annotations and mentions of the given news items.
+
+    Contributions are recomputed from the database and only their
+    difference to what each item contributed before is applied, so a new
+    annotation touches one bucket per interval and mentioned asset. Items
+    that were deleted are taken out again. Returns the number of rollup
+    buckets written. The caller owns the transaction.
+    """
+    news_ids = sorted(set(news_ids))
+    if not news_ids:
+        return 0
+    stored = NewsSentiment.__table__
+    previous: Dict[int, Contribution] = {}
+    for i in range(0, len(news_ids), _LOOKUP_CHUNK):
+        chunk = news_ids[i:i + _LOOKUP_CHUNK]
+        for row in connection.execute(select(stored).where(stored.c.news_id.in_(chunk))):
+            previous[row.news_id] = (
+                row.published_at, row.sentiment, tuple(tuple(pair) for pair in row.mentions or ()),
+            )
+    latest = current_contributions(connection, news_ids)
+    changed = [news_id for news_id in news_ids if previous.get(news_id) != latest.get(news_id)]
+    if not changed:
+        return 0
+
+    # bucket -> [mentions, sentiment_sum, news_count]
+    delta: Dict[BucketKey, List[float]] = {}
+    intervals = sentiment_intervals()
+    for news_id in changed:
+        for contribution, sign in ((previous.get(news_id), -1), (latest.get(news_id), 1)):
+            if contribution is None:
+                continue
+            published_at, sentiment, asset_counts = contribution
+            for interval, seconds in intervals.items():
+                bucket_start = _bucket_start(published_at, seconds)
+                for asset_id, mention_count in asset_counts:
+                    change = delta.setdefault((asset_id, interval, bucket_start), [0, 0.0, 0])
+                    change[0] += sign * mention_count
+                    change[1] += sign * mention_count * sentiment
+                    change[2] += sign
+    written = _apply_delta(connection, delta)
+
+    stale = [news_id for news_id in changed if news_id in previous]
+    for i in range(0, len(stale), _LOOKUP_CHUNK):
+        connection.execute(stored.delete().where(stored.c.news_id.in_(stale[i:i + _LOOKUP_CHUNK])))
+    rows = [
+        {"news_id": news_id, "published_at": latest[news_id][0], "sentiment": latest[news_id][1],
+         "mentions": [list(pair) for pair in latest[news_id][2]]}
+        for news_id in changed if news_id in latest
+    ]
+    if rows:
+        connection.execute(stored.insert(), rows)
+    invalidate_on_commit(connection, *{f"asset-sentiment:{asset_id}" for asset_id, _, _ in delta})
+    return written
+
+def _apply_delta(connection: Connection, delta: Dict[BucketKey, List[float]]) -> int:
+    rollups = AssetSentimentRollup.__table__
+    existing: Dict[BucketKey, Any] = {}
+    # News written together mostly share a few buckets, so the lookups go
+    # per bucket rather than per asset
+    by_bucket: Dict[Tuple[str, datetime.datetime], List[int]] = {}
+    for asset_id, interval, bucket_start in delta:
+        by_bucket.setdefault((interval, bucket_start), []).append(asset_id)
+    for (interval, bucket_start), asset_ids in by_bucket.items():
+        for i in range(0, len(asset_ids), _LOOKUP_CHUNK):
+            query = select(rollups).where(
+                rollups.c.asset_id.in_(asset_ids[i:i + _LOOKUP_CHUNK]),
+                rollups.c.interval == interval,
+                rollups.c.bucket_start == bucket_start,
+            )
+            for row in connection.execute(query):
+                existing[(row.asset_id, interval, bucket_start)] = row
+
+    inserts, updates, deletes = [], [], []
+    for (asset_id, interval, bucket_start), (mentions, sentiment_sum, news_count) in delta.items():
+        if not news_count and not mentions and not sentiment_sum:
+            continue
+        current = existing.get((asset_id, interval, bucket_start))
+        if current is None:
+            if news_count > 0:
+                inserts.append({
+                    "asset_id": asset_id, "interval": interval, "bucket_start": bucket_start,
+                    "mentions": mentions, "sentiment_sum": sentiment_sum, "news_count": news_count,
+                })
+        elif current.news_count + news_count > 0:
+            updates.append({
+                "rollup_id": current.id,
+                "mentions": current.mentions + mentions,
+                "sentiment_sum": current.sentiment_sum + sentiment_sum,
+                "news_count": current.news_count + news_count,
+            })
+        else:
+            # Also clears the rounding left over from subtracting sums
+            deletes.append(current.id)
+    if inserts:
+        connection.execute(rollups.insert(), inserts)
+    if updates:
+        connection.execute(
+            rollups.update().where(rollups.c.id == bindparam("rollup_id")).values(
+                mentions=bindparam("mentions"),
+                sentiment_sum=bindparam("sentiment_sum"),
+                news_count=bindparam("news_count"),
+            ),
+            updates,
+        )
+    for i in range(0, len(deletes), _LOOKUP_CHUNK):
+        connection.execute(rollups.delete().where(rollups.c.id.in_(deletes[i:i + _LOOKUP_CHUNK])))
+    return len(inserts) + len(updates) + len(deletes)
+
+def rebuild_sentiment_rollups(connection: Connection, batch_size: int = 5000) -> int:
+    """
+    Recompute the sentiment rollups from all analyses, for backfills.
+    """
+    connection.execute(AssetSentimentRollup.__table__.delete())
+    connection.execute(NewsSentiment.__table__.delete())
+    analyses = Analysis.__table__
+    query = select(analyses.c.news_id).order_by(analyses.c.news_id)
+    written = 0
+    last_id = None
+    while True:
+        batch_query = query if last_id is None else query.where(analyses.c.news_id > last_id)
+        batch = connection.execute(batch_query.limit(batch_size)).scalars().all()
+        if not batch:
+            return written
+        written += update_sentiment_rollups(connection, batch)
+        last_id = batch[-1]
+
+def _source_interval(bucket_seconds: int) -> Optional[str]:
+    """
+    Coarsest rollup that evenly divides the requested bucket size.
+    """
+    candidates = [
+        (seconds, interval) for interval, seconds in sentiment_intervals().items()
+        if seconds <= bucket_seconds and bucket_seconds % seconds == 0
+    ]
+    return max(candidates)[1] if candidates else None
+
+def load_sentiment_columns(
+    session: Session,
+    asset_id: int,
+    interval: str = "1d",
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+) -> Dict[str, List[Any]]:
+    """
+    Mention-weighted sentiment of an asset per bucket, oldest first, read
+    from the rollups: one row per bucket, however many news items it
+    covers. Intervals that are multiples of a rollup interval, e.g. 1w,
+    are summed from it. Raises ValueError for other intervals.
+    """
+    seconds = parse_interval(interval)
+    source = _source_interval(seconds)
+    if source is None:
+        raise ValueError(f"Unsupported interval: {interval}")
+    query = select(
+        AssetSentimentRollup.bucket_start,
+        AssetSentimentRollup.mentions,
+        AssetSentimentRollup.sentiment_sum,
+        AssetSentimentRollup.news_count,
+    ).where(AssetSentimentRollup.asset_id == asset_id, AssetSentimentRollup.interval == source)
+    if start:
+        query = query.where(AssetSentimentRollup.bucket_start >= _bucket_start(start, seconds))
+    if end:
+        query = query.where(AssetSentimentRollup.bucket_start <= end)
+
+    # bucket -> [mentions, sentiment_sum, news_count], in bucket order
+    buckets: Dict[datetime.datetime, List[float]] = {}
+    for row in session.execute(query.order_by(AssetSentimentRollup.bucket_start)):
+        bucket_start = row.bucket_start if source == interval else _bucket_start(row.bucket_start, seconds)
+        bucket = buckets.setdefault(bucket_start, [0, 0.0, 0])
+        bucket[0] += row.mentions
+        bucket[1] += row.sentiment_sum
+        bucket[2] += row.news_count
+    return {
+        "bucket_start": list(buckets),
+        "sentiment": [round(total / mentions, 4) if mentions else None for mentions, total, _ in buckets.values()],
+        "mentions": [mentions for mentions, _, _ in buckets.values()],
+        "news_count": [news_count for _, _, news_count in buckets.values()],
+    }
+
+# Keep the rollups current for ORM writes of analyses, annotations, mentions
+# and publication times. Core level writes must call
+# `update_sentiment_rollups` themselves.
+def _mark(connection: Connection, *news_ids: Optional[int]) -> None:
+    connection.info.setdefault(_DIRTY_KEY, set()).update(news_id for news_id in news_ids if news_id is not None)
+
+def _changed(target: Any, *attributes: str) -> bool:
+    state = inspect(target)
+    return any(getattr(state.attrs, attribute).history.has_changes() for attribute in attributes)
+
+@event.listens_for(Analysis, "after_insert")
+@event.listens_for(Analysis, "after_delete")
+def _analysis_written(mapper, connection, target):
+    _mark(connection, target.news_id)
+
+@event.listens_for(Analysis, "after_update")
+def _analysis_updated(mapper, connection, target):
+    if _changed(target, "sentiment_score", "news_id"):
+        _mark(connection, target.news_id, *inspect(target).attrs.news_id.history.deleted)
+
+@event.listens_for(Annotation, "after_insert")
+@event.listens_for(Annotation, "after_delete")
+def _annotation_written(mapper, connection, target):
+    _mark_analyses(connection, target.analysis_id)
+
+@event.listens_for(Annotation, "after_update")
+def _annotation_updated(mapper, connection, target):
+    if _changed(target, "override_sentiment", "analysis_id"):
+        _mark_analyses(connection, target.analysis_id, *inspect(target).attrs.analysis_id.history.deleted)
+
+def _mark_analyses(connection: Connection, *analysis_ids: int) -> None:
+    analyses = Analysis.__table__
+    _mark(connection, *connection.execute(
+        select(analyses.c.news_id).where(analyses.c.id.in_(analysis_ids))
+    ).scalars())
+
+@event.listens_for(AssetMention, "after_insert")
+@event.listens_for(AssetMention, "after_delete")
+def _mention_written(mapper, connection, target):
+    _mark(connection, target.news_id)
+
+@event.listens_for(AssetMention, "after_update")
+def _mention_updated(mapper, connection, target):
+    _mark(connection, target.news_id, *inspect(target).attrs.news_id.history.deleted)
+
+@event.listens_for(NewsItem, "after_update")
+def _news_updated(mapper, connection, target):
+    if _changed(target, "published_at"):
+        _mark(connection, target.id)
+
+@event.listens_for(Session, "after_flush")
+def _update_dirty_news(session, flush_context):
+    connection = session.connection()
+    news_ids = connection.info.pop(_DIRTY_KEY, None)
+    if news_ids:
+        update_sentiment_rollups(connection, news_ids)
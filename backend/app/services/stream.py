@@ -0,0 +1,310 @@
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
+import asyncio
+import logging
+import re
+import threading
+
+import orjson
+
+from ..core.config import settings
+from ..models.asset import AssetPrice
+from ..models.news import NewsItem
+from .price_store import OHLCV_FIELDS
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Events written in a transaction wait under this key of the connection's
+# info until it commits
+_PENDING_KEY = "stream_pending"
+
+NEWS_FIELDS = ("id", "title", "content", "summary", "source", "url", "published_at", "created_at", "updated_at")
+
+SLOW_CONSUMER = "slow consumer"
+
+# Ticker-like tokens, e.g. AAPL, BRK.B, BTC-USD, 600519.SH
+_SYMBOL_TOKEN = re.compile(r"[A-Za-z0-9]+(?:[.\-][A-Za-z0-9]+)*")
+
+class StreamEvent:
+    """
+    One committed news item or price bar, encoded once for all subscribers.
+    """
+
+    __slots__ = ("kind", "asset_id", "tokens", "text", "data", "_sse")
+
+    def __init__(self, kind: str, payload: Dict[str, Any], asset_id: Optional[int] = None, text: str = ""):
+        self.kind = kind
+        self.asset_id = asset_id
+        # News text, for symbol and keyword matching
+        self.tokens: Set[str] = set(_SYMBOL_TOKEN.findall(text)) if text else set()
+        self.text = text.lower()
+        self.data = orjson.dumps({"type": kind, "data": payload}).decode()
+        self._sse: Optional[bytes] = None
+
+    @property
+    def sse(self) -> bytes:
+        if self._sse is None:
+            self._sse = f"event: {self.kind}\ndata: {self.data}\n\n".encode()
+        return self._sse
+
+class SubscriptionClosed(Exception):
+    """
+    Raised by `Subscription.next` once the subscription was closed; the
+    message is the reason, e.g. "slow consumer".
+    """
+
+class Subscription:
+    """
+    A subscriber's filters and its bounded buffer of undelivered events.
+
+    When the buffer is full the oldest event is dropped; the next delivery
+    is preceded by a "lagged" event with the number lost, so the client can
+    refetch over REST. A subscriber that loses more than `max_dropped`
+    events in a row is closed instead.
+    """
+
+    def __init__(self, symbols: Dict[int, str], keywords: Iterable[str], queue_size: int, max_dropped: int):
+        self.symbols = dict(symbols)  # asset_id -> symbol
+        self.keywords = {keyword.lower() for keyword in keywords if keyword.strip()}
+        self.max_dropped = max_dropped
+        self._buffer: Deque[StreamEvent] = deque(maxlen=queue_size)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self.delivered = 0
+        self.closed: Optional[str] = None
+
+    def push(self, event: StreamEvent) -> None:
+        if self.closed:
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            # deque(maxlen) discards the oldest entry on append
+            self.dropped += 1
+            if self.dropped > self.max_dropped:
+                self.close(SLOW_CONSUMER)
+                return
+        self._buffer.append(event)
+        self._ready.set()
+
+    def close(self, reason: str) -> None:
+        if self.closed is None:
+            self.closed = reason
+            self._buffer.clear()
+            self._ready.set()
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[StreamEvent]:
+        """
+        Next event, or None after `timeout` seconds without one. Raises
+        SubscriptionClosed once the subscription was closed.
+        """
+        if not self._buffer and not self.closed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.closed:
+            raise SubscriptionClosed(self.closed)
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return StreamEvent("lagged", {"dropped": dropped})
+        self.delivered += 1
+        return self._buffer.popleft()
+
+class StreamBus:
+    """
+    In-process fan-out of committed news items and price bars.
+
+    Subscribers are indexed by asset id and keyword, so publishing an event
+    costs one lookup per distinct subscribed keyword plus one push per
+    matching subscriber, not a scan of every subscriber. Each event is
+    encoded once. Events published from worker threads are handed to the
+    event loop with `call_soon_threadsafe`; all subscriber state is only
+    touched on the loop.
+    """
+
+    def __init__(self, queue_size: int = 256, max_dropped: int = 1024, max_subscribers: int = 10000):
+        self.queue_size = queue_size
+        self.max_dropped = max_dropped
+        self.max_subscribers = max_subscribers
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Set[Subscription] = set()
+        self._everything: Set[Subscription] = set()
+        self._by_asset: Dict[int, Set[Subscription]] = {}
+        self._by_symbol: Dict[str, Set[Subscription]] = {}
+        self._by_keyword: Dict[str, Set[Subscription]] = {}
+        self._symbols: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.disconnected = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def active(self) -> bool:
+        """
+        Whether anyone has subscribed in this process; writers skip building
+        events until then.
+        """
+        return self._loop is not None
+
+    def subscribe(self, symbols: Dict[int, str], keywords: Iterable[str]) -> Optional[Subscription]:
+        """
+        Register a subscriber for the given assets (asset_id -> symbol) and
+        keywords; with neither it receives everything. Returns None when
+        the process is at `max_subscribers`. Must run on the event loop.
+        """
+        if len(self._subscribers) >= self.max_subscribers:
+            return None
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(symbols, keywords, self.queue_size, self.max_dropped)
+        self._subscribers.add(subscription)
+        self._index(subscription)
+        return subscription
+
+    def update(self, subscription: Subscription, symbols: Dict[int, str], keywords: Iterable[str]) -> None:
+        """
+        Replace the filters of a live subscription.
+        """
+        self._unindex(subscription)
+        subscription.symbols = dict(symbols)
+        subscription.keywords = {keyword.lower() for keyword in keywords if keyword.strip()}
+        self._index(subscription)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self._subscribers:
+            self._subscribers.discard(subscription)
+            self._unindex(subscription)
+            if subscription.closed == SLOW_CONSUMER:
+                self.disconnected += 1
+
+    def _index(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._symbols.update(subscription.symbols)
+        if not subscription.symbols and not subscription.keywords:
+            self._everything.add(subscription)
+            return
+        for asset_id, symbol in subscription.symbols.items():
+            self._by_asset.setdefault(asset_id, set()).add(subscription)
+            self._by_symbol.setdefault(symbol, set()).add(subscription)
+        for keyword in subscription.keywords:
+            self._by_keyword.setdefault(keyword, set()).add(subscription)
+
+    def _unindex(self, subscription: Subscription) -> None:
+        self._everything.discard(subscription)
+        for index, keys in (
+            (self._by_asset, subscription.symbols),
+            (self._by_symbol, subscription.symbols.values()),
+            (self._by_keyword, subscription.keywords),
+        ):
+            for key in keys:
+                subscribers = index.get(key)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del index[key]
+
+    def symbol_of(self, asset_id: int) -> Optional[str]:
+        with self._lock:
+            return self._symbols.get(asset_id)
+
+    def publish(self, events: List[StreamEvent]) -> None:
+        """
+        Deliver events to matching subscribers. Safe to call from any
+        thread; a no-op while nobody has subscribed.
+        """
+        loop = self._loop
+        if not events or loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(events)
+        else:
+            loop.call_soon_threadsafe(self._dispatch, events)
+
+    def _dispatch(self, events: List[StreamEvent]) -> None:
+        for event in events:
+            self.published += 1
+            targets = set(self._everything)
+            if event.asset_id is not None:
+                targets.update(self._by_asset.get(event.asset_id, ()))
+            else:
+                for token in event.tokens & self._by_symbol.keys():
+                    targets.update(self._by_symbol[token])
+                for keyword, subscribers in self._by_keyword.items():
+                    if keyword in event.text:
+                        targets.update(subscribers)
+            for subscription in targets:
+                subscription.push(event)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "symbols": len(self._by_symbol),
+            "keywords": len(self._by_keyword),
+            "published": self.published,
+            "disconnected_slow": self.disconnected,
+            "lagging": sum(1 for subscription in self._subscribers if subscription.dropped),
+        }
+
+stream_bus = StreamBus(
+    queue_size=settings.STREAM_QUEUE_SIZE,
+    max_dropped=settings.STREAM_MAX_DROPPED,
+    max_subscribers=settings.STREAM_MAX_SUBSCRIBERS,
+)
+
+def news_event(row: Dict[str, Any]) -> StreamEvent:
+    payload = {field: row.get(field) for field in NEWS_FIELDS}
+    text = "\n".join(value for value in (payload["title"], payload["summary"], payload["content"]) if value)
+    return StreamEvent("news", payload, text=text)
+
+def price_event(bar: Any) -> StreamEvent:
+    payload = {"asset_id": bar.asset_id, "symbol": stream_bus.symbol_of(bar.asset_id), "timestamp": bar.timestamp}
+    payload.update((field, getattr(bar, field)) for field in OHLCV_FIELDS)
+    return StreamEvent("price", payload, asset_id=bar.asset_id)
+
+def stage_events(connection: Connection, events: Iterable[StreamEvent]) -> None:
+    """
+    Hold events until the connection's transaction commits; they are
+    dropped if it rolls back. Core writes of new news items or price bars
+    call this themselves.
+    """
+    connection.info.setdefault(_PENDING_KEY, []).extend(events)
+
+def stage_news(connection: Connection, rows: Iterable[Dict[str, Any]]) -> None:
+    if stream_bus.active:
+        stage_events(connection, map(news_event, rows))
+
+def stage_prices(connection: Connection, bars: Iterable[Any]) -> None:
+    if stream_bus.active:
+        stage_events(connection, map(price_event, bars))
+
+@event.listens_for(Engine, "begin")
+@event.listens_for(Engine, "rollback")
+def _discard_pending(connection):
+    connection.info.pop(_PENDING_KEY, None)
+
+@event.listens_for(Engine, "commit")
+def _publish_pending(connection):
+    pending = connection.info.pop(_PENDING_KEY, None)
+    if pending:
+        stream_bus.publish(pending)
+
+# News items and bars added through the ORM; ids are assigned by now
+@event.listens_for(Session, "after_flush")
+def _stage_new_rows(session, flush_context):
+    if not stream_bus.active:
+        return
+    news = [obj for obj in session.new if isinstance(obj, NewsItem)]
+    bars = [obj for obj in session.new if isinstance(obj, AssetPrice)]
+    if news or bars:
+        connection = session.connection()
+        stage_news(connection, [{field: getattr(obj, field) for field in NEWS_FIELDS} for obj in news])
+        stage_prices(connection, bars)
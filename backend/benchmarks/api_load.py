@@ -0,0 +1,363 @@
+"""
+Latency, throughput and SQL statement counts of the API endpoints under load.
+
+Seeds a synthetic SQLite database (news with analyses and asset mentions,
+assets, minute price bars with their rollups) and drives the read
+endpoints of every router through the ASGI app in-process, with
+--concurrency requests in flight. Reports p50/p95/p99 latency, requests
+per second and SQL statements per request for each endpoint.
+
+    cd backend
+    python -m benchmarks.api_load --db /data/bench.db --output run.json
+    python -m benchmarks.api_load --db /data/bench.db --compare run.json
+
+The defaults seed 1M news items, 10k assets and 100M price bars, which
+takes hours and tens of GB; the database is reused when --db points at a
+seeded file. Use e.g. --news 20000 --assets 200 --prices 1000000 for a
+quick run. --compare exits with status 1 when an endpoint's p95 got worse
+than --tolerance allows or it issues more SQL statements per request.
+Needs httpx for the in-process ASGI client.
+"""
+import argparse
+import asyncio
+import contextvars
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+NEWS_START = datetime.datetime(2023, 1, 1)
+NEWS_DAYS = 730
+PRICE_START = datetime.datetime(2024, 1, 1)
+
+WORDS = (
+    "market rally inflation bank rate cut earnings growth profit loss guidance merger "
+    "acquisition bond yield oil gold crypto bitcoin regulation fraud lawsuit upgrade "
+    "downgrade dividend buyback ipo tariff supply chain demand forecast revenue margin "
+    "strike outage recall approval patent chip cloud retail consumer housing credit "
+    "default liquidity stimulus currency exchange export import sanction energy"
+).split()
+ENTITIES = [f"Entity {i}" for i in range(2000)]
+
+# Statements executed on behalf of the request running in the current task
+_sql_counter: contextvars.ContextVar = contextvars.ContextVar("sql_counter", default=None)
+
+def _count_statement(*args):
+    counter = _sql_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+def seed(args) -> dict:
+    """
+    Fill an empty database; a seeded one is reused as is.
+    """
+    from sqlalchemy import func, select
+    from sqlmodel import SQLModel
+
+    from app.core.database import engine
+    from app.main import _setup_search_index
+    from app.models.analysis import Analysis
+    from app.models.asset import Asset, AssetPrice
+    from app.models.news import AssetMention, NewsItem
+    from app.models.user import User
+    from app.services.entity_graph import rebuild_entity_graph
+    from app.services.ingestion import content_hash
+    from app.services.price_store import is_partitioned, month_of, price_store
+    from app.services.resampling import rebuild_rollups
+    from app.services.search import get_search_backend
+    from app.services.sentiment import rebuild_sentiment_rollups
+
+    SQLModel.metadata.create_all(engine)
+    _setup_search_index()
+    news_table, assets_table = NewsItem.__table__, Asset.__table__
+    with engine.connect() as connection:
+        news_count = connection.execute(select(func.count()).select_from(news_table)).scalar()
+        asset_count = connection.execute(select(func.count()).select_from(assets_table)).scalar()
+    if news_count:
+        return {"news": news_count, "assets": asset_count, "seeded_seconds": 0.0}
+
+    rng = random.Random(0)
+    started = time.perf_counter()
+    now = datetime.datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [{
+            "email": "bench@example.com", "username": "bench", "hashed_password": "-",
+            "is_active": True, "is_superuser": True,
+        }])
+        connection.execute(assets_table.insert(), [
+            {
+                "symbol": f"S{i:05d}", "name": f"Asset {i}", "asset_type": "STOCK",
+                "sector": rng.choice(["tech", "energy", "finance", "health"]), "created_at": now, "updated_at": now,
+            }
+            for i in range(args.assets)
+        ])
+
+    batch = 10000
+    for first in range(0, args.news, batch):
+        news_rows, analyses, mentions = [], [], []
+        for news_id in range(first + 1, min(args.news, first + batch) + 1):
+            title = " ".join(rng.choice(WORDS) for _ in range(8))
+            content = " ".join(rng.choice(WORDS) for _ in range(80))
+            published_at = NEWS_START + datetime.timedelta(seconds=rng.randrange(NEWS_DAYS * 86400))
+            news_rows.append({
+                "id": news_id, "title": title, "content": content, "summary": None, "source": "bench",
+                "url": f"https://example.com/{news_id}", "url_hash": None,
+                "content_hash": content_hash(title, content),
+                "published_at": published_at, "created_at": now, "updated_at": now,
+            })
+            if rng.random() < args.analysed:
+                analyses.append({
+                    "news_id": news_id, "sentiment_score": round(rng.uniform(-1, 1), 3),
+                    "confidence": round(rng.random(), 3), "entities": rng.sample(ENTITIES, 3),
+                    "keywords": rng.sample(WORDS, 4), "summary": title, "model_version": "bench",
+                    "created_at": now, "updated_at": now,
+                })
+            for asset_id in rng.sample(range(1, args.assets + 1), rng.randint(1, 3)):
+                mentions.append({"news_id": news_id, "asset_id": asset_id, "mention_count": rng.randint(1, 4)})
+        with engine.begin() as connection:
+            connection.execute(news_table.insert(), news_rows)
+            connection.execute(Analysis.__table__.insert(), analyses)
+            connection.execute(AssetMention.__table__.insert(), mentions)
+    with engine.begin() as connection:
+        get_search_backend(connection.dialect.name).rebuild(connection)
+        rebuild_entity_graph(connection)
+        rebuild_sentiment_rollups(connection)
+
+    # Minute bars, asset by asset, moved into rollups afterwards
+    import numpy as np
+    per_asset = max(1, args.prices // args.assets)
+    prices = AssetPrice.__table__
+    np_rng = np.random.default_rng(0)
+    for asset_id in range(1, args.assets + 1):
+        closes = 100 + np_rng.standard_normal(per_asset).cumsum() * 0.05
+        volumes = np_rng.integers(1, 1000, per_asset)
+        rows = [
+            {
+                "asset_id": asset_id, "timestamp": PRICE_START + datetime.timedelta(minutes=minute),
+                "open_price": float(close), "high_price": float(close) + 0.05,
+                "low_price": float(close) - 0.05, "close_price": float(close), "volume": float(volume),
+            }
+            for minute, (close, volume) in enumerate(zip(closes, volumes))
+        ]
+        with engine.begin() as connection:
+            if is_partitioned():
+                by_month = {}
+                for row in rows:
+                    by_month.setdefault(month_of(row["timestamp"]), []).append(row)
+                for month, month_rows in by_month.items():
+                    connection.execute(price_store.ensure_partition(connection, month).insert(), month_rows)
+            else:
+                connection.execute(prices.insert(), rows)
+    with engine.begin() as connection:
+        rebuild_rollups(connection)
+    return {"news": args.news, "assets": args.assets, "seeded_seconds": round(time.perf_counter() - started, 1)}
+
+def scenarios(seeded: dict, args):
+    """
+    (name, router, path factory) for the read endpoints of every router.
+    """
+    news, assets = seeded["news"], seeded["assets"]
+    price_minutes = max(1, args.prices // max(1, assets))
+
+    def day(rng):
+        return (NEWS_START + datetime.timedelta(days=rng.randrange(NEWS_DAYS))).date()
+
+    def price_window(rng, hours):
+        offset = rng.randrange(max(1, price_minutes - hours * 60))
+        start = PRICE_START + datetime.timedelta(minutes=offset)
+        return start.isoformat(), (start + datetime.timedelta(hours=hours)).isoformat()
+
+    def prices(interval, hours):
+        def path(rng):
+            start, end = price_window(rng, hours)
+            return f"/api/v1/assets/{rng.randint(1, assets)}/prices?interval={interval}&start_date={start}&end_date={end}"
+        return path
+
+    return [
+        ("news.list", "news", lambda rng: "/api/v1/?limit=50"),
+        ("news.list_page", "news", lambda rng: f"/api/v1/?limit=50&start_date={day(rng)}&end_date={day(rng) + datetime.timedelta(days=30)}"),
+        ("news.list_include", "news", lambda rng: f"/api/v1/?limit=50&start_date={day(rng)}&include=analysis,assets"),
+        ("news.search", "news", lambda rng: f"/api/v1/?limit=20&keyword={rng.choice(WORDS)}"),
+        ("news.get", "news", lambda rng: f"/api/v1/{rng.randint(1, news)}"),
+        ("news.get_include", "news", lambda rng: f"/api/v1/{rng.randint(1, news)}?include=analysis,assets,annotations"),
+        ("news.export_day", "news", lambda rng: f"/api/v1/news/export?start_date={day(rng)}&end_date={day(rng)}"),
+        ("news.analysis_progress", "news", lambda rng: "/api/v1/analysis/progress"),
+        ("news.events", "news", lambda rng: "/api/v1/news/events"),
+        ("market.data", "market", lambda rng: "/api/v1/market/data"),
+        ("market.correlation", "market", lambda rng: "/api/v1/market/correlation"),
+        ("graph.entities", "graph", lambda rng: f"/api/v1/graph/entities?start_date={day(rng)}&end_date={day(rng) + datetime.timedelta(days=7)}"),
+        ("graph.neighbours", "graph", lambda rng: f"/api/v1/graph/entities/{rng.choice(ENTITIES)}/neighbours"),
+        ("assets.list", "assets", lambda rng: "/api/v1/assets/?limit=100"),
+        ("assets.get", "assets", lambda rng: f"/api/v1/assets/{rng.randint(1, assets)}"),
+        ("assets.prices_raw_1d", "assets", prices("1m", 24)),
+        ("assets.prices_1h_week", "assets", prices("1h", 24 * 7)),
+        ("assets.prices_5m_day", "assets", prices("5m", 24)),
+        ("assets.events", "assets", lambda rng: f"/api/v1/assets/{rng.randint(1, assets)}/events"),
+        ("assets.sentiment", "assets", lambda rng: f"/api/v1/assets/{rng.randint(1, assets)}/sentiment?interval=1d"),
+    ]
+
+async def run_scenario(client, name, router, path, args) -> dict:
+    rng = random.Random(name)
+    latencies, sql_counts, statuses = [], [], {}
+    remaining = args.requests + args.warmup
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            warmup = remaining >= args.requests
+            counter = [0]
+            _sql_counter.set(counter)
+            started = time.perf_counter()
+            response = await client.get(path(rng))
+            elapsed = (time.perf_counter() - started) * 1000
+            if warmup:
+                continue
+            latencies.append(elapsed)
+            sql_counts.append(counter[0])
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    seconds = time.perf_counter() - started
+    return {
+        "endpoint": name,
+        "router": router,
+        "requests": len(latencies),
+        "status": statuses,
+        "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+        "requests_per_second": round(len(latencies) / seconds, 1) if seconds else None,
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2),
+        },
+        "sql_per_request": {
+            "mean": round(statistics.mean(sql_counts), 2),
+            "max": max(sql_counts),
+        },
+    }
+
+async def run(args, seeded: dict) -> list:
+    import httpx
+    from sqlalchemy import event
+
+    from app.core.database import dispose_async_engine, engine, get_async_engine, get_async_read_engine, read_engine
+    from app.core.response_cache import response_cache
+    from app.core.security import create_access_token
+    from app.main import app
+
+    if not args.response_cache:
+        # Entries larger than a quarter of the budget are never stored
+        response_cache.max_bytes = 0
+
+    # The read engines are the same objects unless the SQLite profile is on
+    for sql_engine in {engine, read_engine, get_async_engine().sync_engine, get_async_read_engine().sync_engine}:
+        event.listen(sql_engine, "before_cursor_execute", _count_statement)
+
+    token = create_access_token({"sub": "bench"}, datetime.timedelta(days=1))
+    selected = [
+        scenario for scenario in scenarios(seeded, args)
+        if not args.endpoints or any(scenario[0].startswith(prefix) for prefix in args.endpoints)
+    ]
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", headers={"Authorization": f"Bearer {token}"}, timeout=None,
+    ) as client:
+        for name, router, path in selected:
+            results.append(await run_scenario(client, name, router, path, args))
+            print(f"{name}: p95 {results[-1]['latency_ms']['p95']} ms", file=sys.stderr)
+    await dispose_async_engine()
+    return results
+
+def compare(results: list, baseline_path: str, tolerance: float) -> bool:
+    """
+    Print p95 and SQL count changes against an earlier run. Returns False
+    when an endpoint's p95 grew by more than `tolerance` or it runs more
+    statements per request than before.
+    """
+    with open(baseline_path) as f:
+        baseline = {result["endpoint"]: result for result in json.load(f)["results"]}
+    ok = True
+    for result in results:
+        before = baseline.get(result["endpoint"])
+        if before is None:
+            continue
+        p95_before, p95_after = before["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        change = (p95_after - p95_before) / p95_before if p95_before else 0.0
+        sql_before, sql_after = before["sql_per_request"]["mean"], result["sql_per_request"]["mean"]
+        # Statement counts barely vary between runs; growth means new queries
+        regressed = change > tolerance or sql_after > sql_before + 0.5
+        ok = ok and not regressed
+        print(
+            f"{result['endpoint']:28} p95 {p95_before:9.2f} -> {p95_after:9.2f} ms ({change:+.0%})"
+            f"  sql {sql_before} -> {sql_after}"
+            f"{'  REGRESSION' if regressed else ''}",
+            file=sys.stderr,
+        )
+    return ok
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default=None, help="SQLite file to seed or reuse (default: a temp file)")
+    parser.add_argument("--news", type=int, default=1_000_000)
+    parser.add_argument("--assets", type=int, default=10_000)
+    parser.add_argument("--prices", type=int, default=100_000_000)
+    parser.add_argument("--analysed", type=float, default=0.9, help="share of news items with an analysis")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--endpoints", nargs="*", help="only endpoints with these name prefixes, e.g. news. assets.prices")
+    parser.add_argument("--response-cache", action="store_true", help="keep the HTTP response cache on")
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="JSON results of an earlier run to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth for --compare")
+    args = parser.parse_args()
+
+    # Settings are read on import, so the database has to be chosen first
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix="api_load_"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(path)}"
+
+    seeded = seed(args)
+    results = asyncio.run(run(args, seeded))
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "started_at": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "database": path,
+            "seeded": seeded,
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Cold start time of an API worker, with and without FAST_START.
+
+Boots `uvicorn app.main:app` in a fresh process --runs times per mode
+against a database it has already set up once, as a restarted or newly
+scaled-out worker would find it. Measures the time from spawning the
+process until /api/health answers (ready) and until a first API request
+answers (first_api), and reports each startup phase from
+/api/startup/stats.
+
+    cd backend
+    python -m benchmarks.cold_start --runs 5 --budget 2.5
+
+Exits with status 1 when the median first_api time of the fast mode
+exceeds --budget seconds. Needs httpx and uvicorn.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+MODES = {"create_all": "false", "fast": "true"}
+# Answers from the news router without touching the database
+FIRST_API_PATH = "/api/v1/news/events"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def boot(database_url: str, fast_start: str, timeout: float) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, DATABASE_URL=database_url, FAST_START=fast_start)
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=base, timeout=timeout) as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Worker exited with status {process.returncode}")
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"Worker not ready after {timeout}s")
+                try:
+                    client.get("/api/health").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            ready = time.perf_counter() - started
+            client.get(FIRST_API_PATH).raise_for_status()
+            first_api = time.perf_counter() - started
+            # Deferred phases finish in the background after the first request
+            time.sleep(0.5)
+            stats = client.get("/api/startup/stats").json()
+    finally:
+        process.terminate()
+        process.wait()
+    return {"ready": ready, "first_api": first_api, **{f"phase.{name}": seconds for name, seconds in stats["phases"].items()}}
+
+def summarize(runs: list) -> dict:
+    keys = sorted({key for run in runs for key in run})
+    return {
+        key: {
+            "median": round(statistics.median(run[key] for run in runs if key in run), 4),
+            "max": round(max(run[key] for run in runs if key in run), 4),
+        }
+        for key in keys
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="measured boots per mode")
+    parser.add_argument("--modes", nargs="*", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--budget", type=float, default=2.5, help="allowed median first_api seconds of the fast mode")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds before a boot counts as failed")
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="cold_start_")
+    results = {}
+    for mode in args.modes:
+        database_url = f"sqlite:///{db_dir}/{mode}.db"
+        # The first boot creates the schema, like the first deploy did
+        boot(database_url, MODES[mode], args.timeout)
+        runs = [boot(database_url, MODES[mode], args.timeout) for _ in range(args.runs)]
+        results[mode] = summarize(runs)
+        print(f"{mode}:")
+        for key, value in results[mode].items():
+            print(f"  {key:<24} median {value['median'] * 1000:8.1f} ms   max {value['max'] * 1000:8.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"budget": args.budget, "results": results}, output, indent=2)
+
+    if "fast" in results:
+        first_api = results["fast"]["first_api"]["median"]
+        if first_api > args.budget:
+            print(f"Fast start took {first_api:.3f}s to a first API response, over the {args.budget:.3f}s budget")
+            sys.exit(1)
+        print(f"Fast start within budget: {first_api:.3f}s of {args.budget:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Read-endpoint latency while a burst of logins is being processed.
+
+Compares bcrypt running inline on the event loop (the old behaviour) with
+the hashing worker pool from app.core.hashing.
+
+    cd backend
+    python -m benchmarks.login_storm --logins 40 --read-rate 200 --mode both
+
+Needs httpx for the in-process ASGI client.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+_db_dir = tempfile.mkdtemp(prefix="login_storm_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_dir}/bench.db")
+
+import httpx
+from fastapi import FastAPI
+from sqlmodel import Session, SQLModel
+
+from app.api.v1.endpoints import auth, market
+from app.core import hashing
+from app.core.database import dispose_async_engine, engine
+from app.models import User
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(auth.router, prefix="/api/v1/auth")
+    app.include_router(market.router, prefix="/api/v1")
+    return app
+
+def seed(users: int) -> None:
+    SQLModel.metadata.create_all(engine)
+    password_hash = hashing.pwd_context.hash("secret")
+    with Session(engine) as session:
+        for i in range(users):
+            session.add(User(email=f"user{i}@example.com", username=f"user{i}", hashed_password=password_hash))
+        session.commit()
+
+async def _inline_verify(plain_password, hashed_password):
+    return hashing._verify(plain_password, hashed_password)
+
+async def run(mode: str, logins: int, read_rate: float, users: int) -> dict:
+    hasher = hashing.password_hasher
+    original_verify = hasher.verify
+    if mode == "inline":
+        hasher.verify = _inline_verify
+    else:
+        hasher.warm_up()
+        await asyncio.sleep(2)  # let the workers finish starting
+
+    transport = httpx.ASGITransport(app=build_app())
+    read_latencies = []
+    login_statuses = []
+    storm_done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def read_once(scheduled_at):
+            response = await client.get("/api/v1/market/data")
+            response.raise_for_status()
+            read_latencies.append((time.perf_counter() - scheduled_at) * 1000)
+
+        async def reader():
+            # Open-loop load: reads are issued on a fixed schedule and timed
+            # from when they were due, so event-loop stalls count as latency
+            interval = 1 / read_rate
+            next_at = time.perf_counter()
+            pending = []
+            while not storm_done.is_set():
+                pending.append(asyncio.create_task(read_once(next_at)))
+                next_at += interval
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            await asyncio.gather(*pending)
+
+        async def login(i):
+            response = await client.post(
+                "/api/v1/auth/login",
+                data={"username": f"user{i % users}", "password": "secret"},
+            )
+            login_statuses.append(response.status_code)
+
+        reader_task = asyncio.create_task(reader())
+        started = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(logins)))
+        storm_seconds = time.perf_counter() - started
+        storm_done.set()
+        await reader_task
+
+    hasher.verify = original_verify
+    return {
+        "mode": mode,
+        "logins": logins,
+        "login_status": {str(code): login_statuses.count(code) for code in sorted(set(login_statuses))},
+        "storm_seconds": round(storm_seconds, 3),
+        "read_rate": read_rate,
+        "reads": len(read_latencies),
+        "read_ms": {
+            "p50": round(statistics.median(read_latencies), 2),
+            "p95": round(percentile(read_latencies, 95), 2),
+            "p99": round(percentile(read_latencies, 99), 2),
+            "max": round(max(read_latencies), 2),
+        },
+    }
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--read-rate", type=float, default=200, help="reads per second")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--mode", choices=["inline", "pool", "both"], default="both")
+    args = parser.parse_args()
+
+    seed(args.users)
+    modes = ["inline", "pool"] if args.mode == "both" else [args.mode]
+    results = [await run(mode, args.logins, args.read_rate, args.users) for mode in modes]
+    hashing.password_hasher.shutdown()
+    await dispose_async_engine()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
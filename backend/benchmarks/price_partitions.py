@@ -0,0 +1,151 @@
+"""
+Range-read latency of the raw price storage layouts.
+
+Loads the same synthetic minute bars (interleaved across assets, as they
+arrive from a feed) into a fresh SQLite database per layout and times
+one-asset range reads:
+
+- timestamp-index: asset_prices with only the old index on timestamp
+- composite: asset_prices with the (asset_id, timestamp) covering index
+- partitioned: monthly partitions from app.services.price_store
+
+    cd backend
+    python -m benchmarks.price_partitions --rows 100000000 --assets 2000
+
+Loading 100M rows takes a while and a few GB of disk per layout; use
+--rows 1000000 for a quick run.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+from app.models.asset import AssetPrice
+from app.services.price_store import PartitionedPriceStore, month_of
+
+LAYOUTS = ("timestamp-index", "composite", "partitioned")
+START = datetime.datetime(2020, 1, 1)
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def generate(rows: int, assets: int, chunk: int):
+    """
+    Minute bars, every asset once per minute, in chunks of dict rows.
+    """
+    rng = np.random.default_rng(0)
+    for first in range(0, rows, chunk):
+        positions = np.arange(first, min(rows, first + chunk))
+        minutes = positions // assets
+        closes = 100 + rng.standard_normal(len(positions)).cumsum() * 0.01
+        yield [
+            {
+                "asset_id": int(position % assets) + 1,
+                "timestamp": START + datetime.timedelta(minutes=int(minute)),
+                "open_price": float(close),
+                "high_price": float(close) + 0.05,
+                "low_price": float(close) - 0.05,
+                "close_price": float(close),
+                "volume": 1.0,
+            }
+            for position, minute, close in zip(positions, minutes, closes)
+        ]
+
+def load(layout: str, path: str, rows: int, assets: int, chunk: int):
+    engine = create_engine(f"sqlite:///{path}")
+    store = PartitionedPriceStore()
+    prices = AssetPrice.__table__
+    with engine.begin() as connection:
+        connection.execute(text("PRAGMA journal_mode=WAL"))
+        connection.execute(text("PRAGMA synchronous=OFF"))
+        prices.create(connection)
+        if layout == "timestamp-index":
+            connection.execute(text("DROP INDEX ix_asset_prices_asset_id_timestamp"))
+    started = time.perf_counter()
+    for batch in generate(rows, assets, chunk):
+        with engine.begin() as connection:
+            if layout == "partitioned":
+                by_month = {}
+                for row in batch:
+                    by_month.setdefault(month_of(row["timestamp"]), []).append(row)
+                for month, month_rows in by_month.items():
+                    connection.execute(store.ensure_partition(connection, month).insert(), month_rows)
+            else:
+                connection.execute(prices.insert(), batch)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    return engine, store, time.perf_counter() - started
+
+def query_once(layout, engine, store, asset_id, start, end):
+    with engine.connect() as connection:
+        if layout == "partitioned":
+            return len(store.read(connection, asset_id, start, end, ("timestamp", "close_price")))
+        prices = AssetPrice.__table__
+        return len(connection.execute(
+            prices.select()
+            .with_only_columns(prices.c.timestamp, prices.c.close_price)
+            .where(prices.c.asset_id == asset_id, prices.c.timestamp >= start, prices.c.timestamp <= end)
+            .order_by(prices.c.timestamp)
+        ).all())
+
+def run(layout, directory, rows, assets, chunk, queries, window_hours):
+    path = os.path.join(directory, f"{layout}.db")
+    engine, store, load_seconds = load(layout, path, rows, assets, chunk)
+    span_minutes = rows // assets
+    rng = random.Random(1)
+    latencies, returned = [], 0
+    for _ in range(queries):
+        offset = rng.randrange(max(1, span_minutes - window_hours * 60))
+        start = START + datetime.timedelta(minutes=offset)
+        end = start + datetime.timedelta(hours=window_hours)
+        started = time.perf_counter()
+        returned += query_once(layout, engine, store, rng.randrange(assets) + 1, start, end)
+        latencies.append((time.perf_counter() - started) * 1000)
+    engine.dispose()
+    return {
+        "layout": layout,
+        "rows": rows,
+        "load_seconds": round(load_seconds, 1),
+        "db_mb": round(sum(
+            os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory) if name.startswith(layout)
+        ) / 2 ** 20, 1),
+        "queries": queries,
+        "rows_per_query": returned // max(1, queries),
+        "query_ms": {
+            "p50": round(statistics.median(latencies), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "max": round(max(latencies), 2),
+        },
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000_000)
+    parser.add_argument("--assets", type=int, default=2000)
+    parser.add_argument("--chunk", type=int, default=200_000, help="rows per insert transaction")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--window-hours", type=int, default=24, help="length of each range read")
+    parser.add_argument("--layout", choices=LAYOUTS + ("all",), default="all")
+    parser.add_argument("--dir", default=None, help="where to put the databases (default: a temp dir)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="price_partitions_")
+    layouts = LAYOUTS if args.layout == "all" else (args.layout,)
+    results = [
+        run(layout, directory, args.rows, args.assets, args.chunk, args.queries, args.window_hours)
+        for layout in layouts
+    ]
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+# Settings are read on import, so the test database is chosen before the app loads
+_db_dir = tempfile.mkdtemp(prefix="news_monitor_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/test.db"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+@pytest.fixture(scope="session")
+def app():
+    from app.main import _create_schema, app
+    _create_schema()
+    return app
+
+@pytest.fixture(scope="session")
+def engine(app):
+    from app.core.database import engine
+    return engine
+
+@pytest.fixture
+def client(app):
+    # Without the lifespan, so no background workers run during tests
+    return TestClient(app, raise_server_exceptions=True)
+
+def _user(engine, username: str, is_superuser: bool):
+    from app.models import User
+    with Session(engine) as session:
+        user = session.exec(select(User).where(User.username == username)).first()
+        if user is None:
+            user = User(email=f"{username}@example.com", username=username, hashed_password="x", is_superuser=is_superuser)
+            session.add(user)
+            session.commit()
+            session.refresh(user)
+        return user
+
+def _headers(user) -> dict:
+    from app.core.security import create_access_token
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+
+@pytest.fixture
+def superuser_headers(engine) -> dict:
+    return _headers(_user(engine, "admin", True))
+
+@pytest.fixture
+def user_headers(engine) -> dict:
+    return _headers(_user(engine, "reader", False))
@@ -0,0 +1,29 @@
+def _items(prefix: str, count: int):
+    return [
+        {
+            "title": f"{prefix} headline {i}",
+            "content": f"{prefix} body {i} " * 10,
+            "url": f"https://example.com/{prefix}/{i}",
+            "source": "test",
+            "published_at": "2024-01-02T09:30:00",
+        }
+        for i in range(count)
+    ]
+
+def test_superuser_can_bulk_ingest(client, superuser_headers):
+    response = client.post("/api/v1/bulk", json=_items("bulk", 3), headers=superuser_headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["created"] == 3
+    assert [result["status"] for result in report["results"]] == ["created"] * 3
+
+def test_bulk_ingest_skips_duplicates(client, superuser_headers):
+    items = _items("dup", 2)
+    client.post("/api/v1/bulk", json=items, headers=superuser_headers)
+    report = client.post("/api/v1/bulk", json=items, headers=superuser_headers).json()
+    assert report["created"] == 0
+    assert report["duplicates"] == 2
+
+def test_bulk_ingest_requires_superuser(client, user_headers):
+    response = client.post("/api/v1/bulk", json=_items("denied", 1), headers=user_headers)
+    assert response.status_code == 403
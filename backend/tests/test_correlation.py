@@ -0,0 +1,16 @@
+import numpy as np
+
+from app.services.correlation import _trailing_mean
+
+def test_trailing_mean():
+    means = _trailing_mean(np.array([1.0, 2.0, 3.0, 4.0]), 2)
+    np.testing.assert_allclose(means, [np.nan, 1.0, 1.5, 2.5])
+
+def test_trailing_mean_skips_missing_values():
+    # A bar without volume only drops out of the windows holding it
+    means = _trailing_mean(np.array([1.0, np.nan, 3.0, 5.0, 7.0]), 2)
+    np.testing.assert_allclose(means, [np.nan, 1.0, 1.0, 3.0, 4.0])
+
+def test_trailing_mean_of_only_missing_values_is_nan():
+    means = _trailing_mean(np.array([np.nan, np.nan, 2.0]), 2)
+    assert np.isnan(means).all()
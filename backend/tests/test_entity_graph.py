@@ -0,0 +1,47 @@
+import datetime
+
+from sqlmodel import Session, select
+
+from app.models import Analysis, NewsItem
+from app.models.graph import EntityEdge
+from app.services import entity_graph  # noqa: F401  Registers the graph sync events
+
+def _edges(session, source):
+    return [
+        (edge.target, edge.day, edge.weight)
+        for edge in session.exec(select(EntityEdge).where(EntityEdge.source == source).order_by(EntityEdge.target))
+    ]
+
+def test_edges_move_with_published_at(engine):
+    with Session(engine) as session:
+        news_item = NewsItem(
+            title="graph move", content="graph move body", source="test",
+            published_at=datetime.datetime(2029, 3, 1, 10),
+        )
+        news_item.analysis = Analysis(
+            sentiment_score=0.0, confidence=1.0, model_version="test", entities=["GraphMoveA", "GraphMoveB"],
+        )
+        session.add(news_item)
+        session.commit()
+        assert _edges(session, "GraphMoveA") == [("GraphMoveB", datetime.date(2029, 3, 1), 1)]
+
+        news_item.published_at = datetime.datetime(2029, 3, 5, 10)
+        session.commit()
+        assert _edges(session, "GraphMoveA") == [("GraphMoveB", datetime.date(2029, 3, 5), 1)]
+
+def test_edges_follow_published_at_and_entities_changed_together(engine):
+    with Session(engine) as session:
+        news_item = NewsItem(
+            title="graph both", content="graph both body", source="test",
+            published_at=datetime.datetime(2029, 4, 1, 10),
+        )
+        news_item.analysis = Analysis(
+            sentiment_score=0.0, confidence=1.0, model_version="test", entities=["GraphBothA", "GraphBothB"],
+        )
+        session.add(news_item)
+        session.commit()
+
+        news_item.published_at = datetime.datetime(2029, 4, 2, 10)
+        news_item.analysis.entities = ["GraphBothA", "GraphBothC"]
+        session.commit()
+        assert _edges(session, "GraphBothA") == [("GraphBothC", datetime.date(2029, 4, 2), 1)]
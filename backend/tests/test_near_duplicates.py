@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlmodel import SQLModel
+
+from app.core.config import settings
+from app.models import AnalysisJob, NewsItem
+from app.services.near_duplicates import NearDuplicateIndex, signature_text
+
+STORY = (
+    "The central bank kept its policy rate unchanged on Tuesday and said it would keep "
+    "watching inflation and the labour market closely before any further move this year."
+)
+
+@pytest.fixture
+def connection():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        yield connection
+    engine.dispose()
+
+def _add(connection, index, title, content=STORY):
+    news_id = connection.execute(NewsItem.__table__.insert().values(
+        title=title, content=content, source="test",
+    )).inserted_primary_key[0]
+    index.link(connection, [(news_id, signature_text(title, content))])
+    return news_id
+
+def _clusters(connection):
+    news = NewsItem.__table__
+    return dict(connection.execute(select(news.c.id, news.c.cluster_id)).all())
+
+def test_oldest_duplicate_is_promoted(connection, monkeypatch):
+    monkeypatch.setattr(settings, "ANALYZE_ON_INGEST", True)
+    index = NearDuplicateIndex()
+    first = _add(connection, index, "Rates unchanged")
+    second = _add(connection, index, "Rates unchanged")
+    third = _add(connection, index, "Rates unchanged")
+    other = _add(connection, index, "Harvest report", "Wheat and barley yields rose after a mild spring " * 4)
+    assert _clusters(connection) == {first: None, second: first, third: first, other: None}
+
+    connection.execute(NewsItem.__table__.delete().where(NewsItem.__table__.c.id == first))
+    index.remove(connection, [first])
+    assert _clusters(connection) == {second: None, third: second, other: None}
+    # Spared analysis as a duplicate, the new first item is queued for it
+    jobs = AnalysisJob.__table__
+    assert connection.execute(select(jobs.c.news_id)).scalars().all() == [second]
+
+    # Later copies join the promoted item's cluster
+    assert _add(connection, index, "Rates unchanged") in {
+        news_id for news_id, cluster_id in _clusters(connection).items() if cluster_id == second
+    }
+
+def test_removing_a_duplicate_keeps_the_cluster(connection):
+    index = NearDuplicateIndex()
+    first = _add(connection, index, "Rates unchanged")
+    second = _add(connection, index, "Rates unchanged")
+    third = _add(connection, index, "Rates unchanged")
+
+    connection.execute(NewsItem.__table__.delete().where(NewsItem.__table__.c.id == second))
+    index.remove(connection, [second])
+    assert _clusters(connection) == {first: None, third: first}
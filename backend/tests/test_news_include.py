@@ -0,0 +1,85 @@
+import datetime
+import itertools
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PAGE = 100
+# Seeded in a year of their own, so the other tests' news stays off the page
+START_DATE, END_DATE = "2031-01-01", "2031-12-31"
+
+@pytest.fixture(scope="module")
+def seeded(engine):
+    from app.models import Analysis, Annotation, Asset, AssetMention, NewsItem
+    published = datetime.datetime(2031, 1, 1, 9, 30)
+    # Core inserts, so the ORM sync events of the services stay out of it
+    with engine.begin() as connection:
+        asset_ids = [
+            connection.execute(Asset.__table__.insert().values(
+                symbol=f"INC{i}", name=f"Include {i}", asset_type="STOCK",
+                created_at=published, updated_at=published,
+            )).inserted_primary_key[0]
+            for i in range(3)
+        ]
+        for i in range(PAGE):
+            news_id = connection.execute(NewsItem.__table__.insert().values(
+                title=f"include headline {i}", content=f"include body {i}", source="test",
+                published_at=published + datetime.timedelta(minutes=i), created_at=published, updated_at=published,
+            )).inserted_primary_key[0]
+            analysis_id = connection.execute(Analysis.__table__.insert().values(
+                news_id=news_id, sentiment_score=0.1, confidence=0.9, model_version="test",
+                created_at=published, updated_at=published,
+            )).inserted_primary_key[0]
+            connection.execute(Annotation.__table__.insert(), [
+                {"analysis_id": analysis_id, "text": f"note {n}", "created_at": published} for n in range(2)
+            ])
+            connection.execute(AssetMention.__table__.insert(), [
+                {"news_id": news_id, "asset_id": asset_id, "mention_count": 1} for asset_id in asset_ids[:2]
+            ])
+
+def _statements(client, headers, **params):
+    count = 0
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        nonlocal count
+        count += 1
+
+    # Every engine, the async ones' included
+    event.listen(Engine, "before_cursor_execute", _count)
+    try:
+        response = client.get("/api/v1/", params={"start_date": START_DATE, "end_date": END_DATE, **params}, headers=headers)
+    finally:
+        event.remove(Engine, "before_cursor_execute", _count)
+    assert response.status_code == 200
+    return count, response.json()
+
+INCLUDES = ["analysis", "assets", "annotations"]
+
+@pytest.mark.parametrize("include", [
+    ",".join(combination)
+    for size in range(1, len(INCLUDES) + 1)
+    for combination in itertools.combinations(INCLUDES, size)
+])
+def test_include_takes_a_constant_number_of_statements(client, user_headers, seeded, include):
+    # Loads the principal, so the counted requests all see it cached
+    _statements(client, user_headers, limit=1)
+    small, _ = _statements(client, user_headers, limit=10, include=include)
+    full, page = _statements(client, user_headers, limit=PAGE, include=include)
+    assert len(page) == PAGE
+    assert full == small
+    if "annotations" in include:
+        assert all(len(item["analysis"]["annotations"]) == 2 for item in page)
+    elif "analysis" in include:
+        assert all(item["analysis"]["model_version"] == "test" for item in page)
+    if "assets" in include:
+        assert all(len(item["assets"]) == 2 for item in page)
+
+def test_each_include_adds_one_statement(client, user_headers, seeded):
+    _statements(client, user_headers, limit=1)
+    plain, _ = _statements(client, user_headers, limit=PAGE)
+    # Annotations bring the analysis with them
+    expected = {"analysis": 1, "assets": 1, "annotations": 2, "analysis,assets,annotations": 3}
+    for include, extra in expected.items():
+        count, _ = _statements(client, user_headers, limit=PAGE - 1, include=include)
+        assert count == plain + extra, include
@@ -0,0 +1,42 @@
+# Published in a year of their own, so the other tests' news stays off the page
+PARAMS = {"start_date": "2033-01-01", "end_date": "2033-12-31"}
+
+def _titles(client, headers):
+    response = client.get("/api/v1/", params=PARAMS, headers=headers)
+    assert response.status_code == 200
+    return response, [item["title"] for item in response.json()]
+
+def test_writes_invalidate_the_cached_list(client, superuser_headers, user_headers):
+    first, titles = _titles(client, user_headers)
+    assert titles == []
+    # Served from the cache while nothing changes
+    cached = client.get("/api/v1/", params=PARAMS, headers={**user_headers, "If-None-Match": first.headers["etag"]})
+    assert cached.status_code == 304
+
+    created = client.post("/api/v1/", json={
+        "title": "Cache write", "content": "Cache write body", "source": "test",
+        "url": "https://example.com/cache-write", "published_at": "2033-03-01T09:30:00",
+    }, headers=superuser_headers)
+    assert created.status_code == 201
+    news_id = created.json()["id"]
+    assert _titles(client, user_headers)[1] == ["Cache write"]
+
+    updated = client.put(f"/api/v1/{news_id}", json={"title": "Cache rewrite"}, headers=superuser_headers)
+    assert updated.status_code == 200
+    assert _titles(client, user_headers)[1] == ["Cache rewrite"]
+    assert client.get(f"/api/v1/{news_id}", headers=user_headers).json()["title"] == "Cache rewrite"
+
+    assert client.delete(f"/api/v1/{news_id}", headers=superuser_headers).status_code == 204
+    assert _titles(client, user_headers)[1] == []
+
+def test_created_news_is_deduplicated_by_bulk_ingest(client, superuser_headers):
+    item = {
+        "title": "Single then bulk", "content": "Single then bulk body", "source": "test",
+        "url": "https://example.com/single-then-bulk", "published_at": "2033-04-01T09:30:00",
+    }
+    assert client.post("/api/v1/", json=item, headers=superuser_headers).status_code == 201
+    assert client.post("/api/v1/bulk", json=[item], headers=superuser_headers).json()["duplicates"] == 1
+
+def test_news_writes_require_a_superuser(client, user_headers):
+    item = {"title": "Denied", "content": "Denied body", "source": "test"}
+    assert client.post("/api/v1/", json=item, headers=user_headers).status_code == 403
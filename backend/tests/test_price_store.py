@@ -0,0 +1,103 @@
+import datetime
+import threading
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app.core.database import WriteQueue, configure_sqlite
+from app.services.price_store import PartitionedPriceStore, partition_name
+
+def _bar(timestamp: datetime.datetime, asset_id: int = 1):
+    return SimpleNamespace(
+        asset_id=asset_id, timestamp=timestamp, open_price=1.0, high_price=2.0, low_price=0.5, close_price=1.5, volume=10.0,
+    )
+
+@pytest.fixture
+def wal_engine(tmp_path):
+    # Transactional DDL, as under the SQLite profile
+    engine = create_engine(f"sqlite:///{tmp_path}/prices.db")
+    configure_sqlite(engine)
+    yield engine
+    engine.dispose()
+
+def _count(engine, store, month) -> int:
+    with engine.connect() as connection:
+        table = store._table(partition_name(month))
+        return connection.execute(select(func.count()).select_from(table)).scalar()
+
+def test_rolled_back_partition_is_created_again(wal_engine):
+    store = PartitionedPriceStore()
+    bar = _bar(datetime.datetime(2024, 3, 1, 9, 30))
+    with pytest.raises(RuntimeError):
+        with wal_engine.begin() as connection:
+            store.write(connection, [bar], rollup=False)
+            assert partition_name((2024, 3)) in store.partitions(connection)
+            raise RuntimeError("rolled back")
+    with wal_engine.connect() as connection:
+        assert partition_name((2024, 3)) not in store.partitions(connection)
+
+    with wal_engine.begin() as connection:
+        store.write(connection, [bar], rollup=False)
+    assert _count(wal_engine, store, (2024, 3)) == 1
+
+def test_partition_survives_a_failed_write_queue_group(wal_engine):
+    store = PartitionedPriceStore()
+    queue = WriteQueue(wal_engine)
+    release = threading.Event()
+    # Hold the writer so the next two jobs are committed as one group
+    blocker = queue.submit(lambda connection: release.wait(5))
+    write = queue.submit(lambda connection: store.write(connection, [_bar(datetime.datetime(2024, 4, 2))], rollup=False))
+
+    def fail(connection):
+        raise ValueError("bad job")
+
+    failing = queue.submit(fail)
+    release.set()
+    blocker.result()
+    assert write.result() == 1
+    with pytest.raises(ValueError):
+        failing.result()
+    assert queue.regrouped == 1
+    assert _count(wal_engine, store, (2024, 4)) == 1
+    queue.close()
+
+def _legacy(engine, bars):
+    from sqlmodel import SQLModel
+    from app.models import Asset, AssetPrice
+    SQLModel.metadata.create_all(engine, tables=[Asset.__table__, AssetPrice.__table__])
+    with engine.begin() as connection:
+        connection.execute(Asset.__table__.insert().values(
+            id=1, symbol="MIG", name="Migrated", asset_type="STOCK",
+            created_at=datetime.datetime(2024, 1, 1), updated_at=datetime.datetime(2024, 1, 1),
+        ))
+        connection.execute(AssetPrice.__table__.insert(), [vars(bar) for bar in bars])
+
+def _read(engine, store, start, end):
+    with engine.connect() as connection:
+        return [row.timestamp for row in store.read(connection, 1, start, end)]
+
+def test_reads_see_partitions_another_process_migrated(wal_engine):
+    # The API's store and the one a migration script runs in another process
+    api, migrator = PartitionedPriceStore(), PartitionedPriceStore()
+    bars = [_bar(datetime.datetime(2024, 5, day)) for day in range(1, 6)]
+    _legacy(wal_engine, bars)
+    start, end = datetime.datetime(2024, 5, 1), datetime.datetime(2024, 5, 31)
+    assert len(_read(wal_engine, api, start, end)) == 5
+
+    assert migrator.migrate(wal_engine) == 5
+    assert len(_read(wal_engine, api, start, end)) == 5
+
+def test_partition_list_expires(wal_engine, monkeypatch):
+    from app.core.config import settings
+    api, migrator = PartitionedPriceStore(), PartitionedPriceStore()
+    with wal_engine.begin() as connection:
+        api.write(connection, [_bar(datetime.datetime(2024, 6, 3))], rollup=False)
+    _legacy(wal_engine, [_bar(datetime.datetime(2024, 7, 1))])
+    start, end = datetime.datetime(2024, 6, 1), datetime.datetime(2024, 7, 31)
+    assert len(_read(wal_engine, api, start, end)) == 2
+
+    migrator.migrate(wal_engine)
+    # June is known, so only the expiry brings in the July partition
+    monkeypatch.setattr(settings, "PRICE_PARTITION_CATALOG_TTL", 0.0)
+    assert len(_read(wal_engine, api, start, end)) == 2
@@ -0,0 +1,169 @@
+import datetime
+
+import numpy as np
+import pytest
+from sqlmodel import Session, select
+
+from app.models import Asset, AssetPrice, AssetPriceRollup
+from app.services.bar_cache import bar_cache
+from app.services.resampling import (
+    bucket_floor, from_epoch, load_price_bars, parse_interval, resample, rollup_intervals, to_epoch,
+)
+from app.services.sentiment import _bucket_start
+
+WEEK = parse_interval("1w")
+
+def _bars(timestamps):
+    timestamps = to_epoch(timestamps)
+    prices = np.arange(1.0, len(timestamps) + 1)
+    columns = {
+        "open_price": prices, "high_price": prices, "low_price": prices,
+        "close_price": prices, "volume": np.ones(len(timestamps)),
+    }
+    return timestamps, columns
+
+def test_weekly_buckets_start_on_monday():
+    # Sunday 23:59, then Monday 00:00 and Wednesday of the next week
+    timestamps, columns = _bars([
+        datetime.datetime(2024, 6, 9, 23, 59),
+        datetime.datetime(2024, 6, 10),
+        datetime.datetime(2024, 6, 12, 12),
+    ])
+    bars = resample(timestamps, columns, WEEK)
+    starts = [from_epoch(start) for start in bars["bucket_start"]]
+    assert starts == [datetime.datetime(2024, 6, 3), datetime.datetime(2024, 6, 10)]
+    assert all(start.weekday() == 0 for start in starts)
+    assert bars["bar_count"].tolist() == [1, 2]
+
+def test_multi_week_buckets_start_on_monday():
+    assert from_epoch(bucket_floor(int(to_epoch([datetime.datetime(2024, 6, 12)])[0]), 2 * WEEK)).weekday() == 0
+
+def test_sentiment_weekly_buckets_match_the_price_buckets():
+    published = datetime.datetime(2024, 6, 12, 15, 30)
+    assert _bucket_start(published, WEEK) == datetime.datetime(2024, 6, 10)
+    assert _bucket_start(published, parse_interval("1d")) == datetime.datetime(2024, 6, 12)
+
+def test_bucket_edges():
+    hour = parse_interval("1h")
+    # The last second of a bucket stays in it; the next starts a new one
+    timestamps, columns = _bars([
+        datetime.datetime(2024, 6, 3, 9, 0, 0),
+        datetime.datetime(2024, 6, 3, 9, 59, 59),
+        datetime.datetime(2024, 6, 3, 10, 0, 0),
+    ])
+    bars = resample(timestamps, columns, hour)
+    assert [from_epoch(start) for start in bars["bucket_start"]] == [
+        datetime.datetime(2024, 6, 3, 9), datetime.datetime(2024, 6, 3, 10),
+    ]
+    assert bars["open_price"].tolist() == [1.0, 3.0]
+    assert bars["close_price"].tolist() == [2.0, 3.0]
+    assert bars["high_price"].tolist() == [2.0, 3.0]
+    assert bars["low_price"].tolist() == [1.0, 3.0]
+    assert bars["bar_count"].tolist() == [2, 1]
+    assert [from_epoch(last) for last in bars["last_timestamp"]] == [
+        datetime.datetime(2024, 6, 3, 9, 59, 59), datetime.datetime(2024, 6, 3, 10),
+    ]
+
+def test_resampling_rollups_keeps_source_bar_counts():
+    timestamps, columns = _bars([datetime.datetime(2024, 6, 3, 9), datetime.datetime(2024, 6, 3, 10)])
+    columns["volume"] = np.array([5.0, np.nan])
+    bars = resample(timestamps, columns, parse_interval("1d"), counts=np.array([60, 12]))
+    assert bars["bar_count"].tolist() == [72]
+    # A bar stored without volume adds none
+    assert bars["volume"].tolist() == [5.0]
+
+def test_resample_of_no_bars():
+    bars = resample(np.empty(0, dtype=np.int64), {}, parse_interval("1h"))
+    assert all(len(values) == 0 for values in bars.values())
+
+def _asset(engine, symbol, first_bar, count, step):
+    with Session(engine) as session:
+        asset = Asset(symbol=symbol, name=symbol)
+        session.add(asset)
+        session.flush()
+        # Through the ORM, so the rollups are kept by its flush hook
+        session.add_all(
+            AssetPrice(
+                asset_id=asset.id, timestamp=first_bar + i * step,
+                open_price=100.0 + i, high_price=101.0 + i, low_price=99.0 + i, close_price=100.5 + i, volume=10.0,
+            )
+            for i in range(count)
+        )
+        session.commit()
+        return asset.id
+
+def _stored_rollups(session, asset_id, interval):
+    rows = session.exec(
+        select(AssetPriceRollup)
+        .where(AssetPriceRollup.asset_id == asset_id, AssetPriceRollup.interval == interval)
+        .order_by(AssetPriceRollup.bucket_start)
+    ).all()
+    return [(row.bucket_start, row.open_price, row.high_price, row.low_price, row.close_price, row.volume, row.bar_count) for row in rows]
+
+def _expected_rollups(session, asset_id, seconds):
+    bars = session.exec(select(AssetPrice).where(AssetPrice.asset_id == asset_id).order_by(AssetPrice.timestamp)).all()
+    timestamps = to_epoch([bar.timestamp for bar in bars])
+    columns = {field: np.array([getattr(bar, field) for bar in bars], dtype=float) for field in ("open_price", "high_price", "low_price", "close_price", "volume")}
+    fresh = resample(timestamps, columns, seconds)
+    return [
+        (from_epoch(start), *(float(fresh[field][i]) for field in ("open_price", "high_price", "low_price", "close_price", "volume")), int(fresh["bar_count"][i]))
+        for i, start in enumerate(fresh["bucket_start"])
+    ]
+
+@pytest.mark.parametrize("storage", ["table", "partitioned"])
+def test_rollups_follow_orm_updates_and_deletes(engine, monkeypatch, storage):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "PRICE_STORAGE", storage)
+    asset_id = _asset(engine, f"REFOLD{storage}", datetime.datetime(2025, 3, 3), 144, datetime.timedelta(minutes=30))
+    with Session(engine) as session:
+        bars = session.exec(select(AssetPrice).where(AssetPrice.asset_id == asset_id).order_by(AssetPrice.timestamp)).all()
+        # A rewritten close and high, the first bar of a day gone, and a bar
+        # moved to the next day
+        bars[5].close_price, bars[5].high_price = 500.0, 600.0
+        session.delete(bars[48])
+        bars[10].timestamp += datetime.timedelta(days=1, minutes=1)
+        session.commit()
+    # After the commit, so attributes of the deleted bar load lazily
+    with Session(engine) as session:
+        session.delete(session.exec(select(AssetPrice).where(AssetPrice.asset_id == asset_id).order_by(AssetPrice.timestamp.desc())).first())
+        session.commit()
+    with Session(engine) as session:
+        for interval, seconds in rollup_intervals().items():
+            assert _stored_rollups(session, asset_id, interval) == _expected_rollups(session, asset_id, seconds), interval
+        daily = _stored_rollups(session, asset_id, "1d")
+        assert daily[0][2] == 600.0
+        assert [row[-1] for row in daily] == [47, 48, 47]
+
+def test_hot_bars_follow_orm_updates_and_deletes(engine):
+    first_bar = datetime.datetime.utcnow().replace(second=0, microsecond=0) - datetime.timedelta(hours=2)
+    asset_id = _asset(engine, "HOTRW", first_bar, 60, datetime.timedelta(minutes=1))
+    with Session(engine) as session:
+        assert len(load_price_bars(session, asset_id, "1m", first_bar)) == 60
+        assert asset_id in bar_cache.asset_bytes()
+        bars = session.exec(select(AssetPrice).where(AssetPrice.asset_id == asset_id).order_by(AssetPrice.timestamp)).all()
+        bars[3].close_price = 1.0
+        session.delete(bars[4])
+        session.commit()
+    assert asset_id not in bar_cache.asset_bytes()
+    with Session(engine) as session:
+        bars = load_price_bars(session, asset_id, "1m", first_bar)
+        assert len(bars) == 59
+        assert bars[3]["close_price"] == 1.0
+        assert asset_id in bar_cache.asset_bytes()
+
+@pytest.mark.parametrize("interval", ["2h", "90m"])
+def test_resampled_reads_include_whole_edge_buckets(engine, interval):
+    # 2h reads the 1h rollup, 90m the raw bars
+    asset_id = _asset(engine, f"EDGE{interval}", datetime.datetime(2025, 3, 10), 48, datetime.timedelta(minutes=15))
+    seconds = parse_interval(interval)
+    start = datetime.datetime(2025, 3, 10, 1, 45)
+    end = datetime.datetime(2025, 3, 10, 7, 10)
+    with Session(engine) as session:
+        bars = load_price_bars(session, asset_id, interval, start, end)
+    first = from_epoch(bucket_floor(int(to_epoch([start])[0]), seconds))
+    last = from_epoch(bucket_floor(int(to_epoch([end])[0]), seconds))
+    assert bars[0]["timestamp"] == first
+    assert bars[-1]["timestamp"] == last
+    # The first bar of the opening bucket, not the first one after `start`
+    assert bars[0]["open_price"] == 100.0 + (first - datetime.datetime(2025, 3, 10)) / datetime.timedelta(minutes=15)
+    assert bars[-1]["close_price"] == 100.5 + (last + datetime.timedelta(seconds=seconds) - datetime.timedelta(minutes=15) - datetime.datetime(2025, 3, 10)) / datetime.timedelta(minutes=15)
@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import create_engine
+
+from app.core.response_cache import CachedResponse, invalidate_on_commit, response_cache
+
+def _cache(key, tag):
+    response_cache.set(key, CachedResponse(200, [], b"{}", '"etag"', {tag}, expires_at=float("inf")))
+
+@pytest.fixture
+def memory_engine():
+    engine = create_engine("sqlite://")
+    yield engine
+    engine.dispose()
+
+def test_entries_are_dropped_when_the_write_commits(memory_engine):
+    _cache("prices-1", "asset-prices:1")
+    with memory_engine.begin() as connection:
+        invalidate_on_commit(connection, "asset-prices:1")
+        # A read racing the transaction still sees the old rows, so the entry stays
+        assert response_cache.get("prices-1") is not None
+    assert response_cache.get("prices-1") is None
+
+def test_entries_survive_a_rolled_back_write(memory_engine):
+    _cache("prices-2", "asset-prices:2")
+    with pytest.raises(RuntimeError):
+        with memory_engine.begin() as connection:
+            invalidate_on_commit(connection, "asset-prices:2")
+            raise RuntimeError("rolled back")
+    assert response_cache.get("prices-2") is not None
+    response_cache.invalidate("asset-prices:2")
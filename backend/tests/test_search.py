@@ -0,0 +1,55 @@
+import sqlite3
+
+import pytest
+
+from app.services.search import build_match_query, segment
+
+DOCUMENTS = {
+    1: "A国央行宣布降息",
+    2: "C国出口数据超预期",
+    3: "Apple unveils the iPhone15 lineup",
+    4: "央行维持利率不变",
+    5: "Smartphone sales slow down",
+}
+
+@pytest.fixture(scope="module")
+def fts():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE VIRTUAL TABLE docs USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')")
+    connection.executemany(
+        "INSERT INTO docs (rowid, body) VALUES (?, ?)",
+        [(news_id, segment(text)) for news_id, text in DOCUMENTS.items()],
+    )
+    yield connection
+    connection.close()
+
+def search(fts, keyword):
+    match = build_match_query(keyword)
+    return {row[0] for row in fts.execute("SELECT rowid FROM docs WHERE docs MATCH ?", (match,))}
+
+@pytest.mark.parametrize("keyword, expected", [
+    ("A国", {1}),
+    ("C国", {2}),
+    ("国", {1, 2}),
+    ("央行", {1, 4}),
+    ("国央行", {1}),
+    ("降息", {1}),
+    ("iPhone", {3}),
+    ("iphone15", {3}),
+    ("apple iphone", {3}),
+    ("A国 降息", {1}),
+    ("B国", set()),
+])
+def test_terms_match_like_substrings(fts, keyword, expected):
+    assert search(fts, keyword) == expected
+
+def test_latin_terms_do_not_match_inside_words(fts):
+    assert search(fts, "phone") == set()
+
+def test_match_query_shapes():
+    assert build_match_query("A国") == '"a 国"*'
+    assert build_match_query("央行") == '"央行"'
+    assert build_match_query("iPhone 央行") == '"iphone"* AND "央行"'
+
+def test_unindexable_keyword():
+    assert build_match_query("!!! ...") is None
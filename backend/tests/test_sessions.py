@@ -0,0 +1,99 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from app.core import database
+from app.core.database import ReadWriteSession, ReplicaSet, get_async_session, get_session, session_options
+
+def test_get_session_works_without_a_request():
+    generator = get_session()
+    session = next(generator)
+    assert session.connection().exec_driver_sql("SELECT 1").scalar() == 1
+    generator.close()
+
+def test_get_async_session_works_without_a_request():
+    async def run():
+        generator = get_async_session()
+        session = await generator.__anext__()
+        connection = await session.connection()
+        assert (await connection.exec_driver_sql("SELECT 1")).scalar() == 1
+        await generator.aclose()
+        await database.dispose_async_engine()
+
+    asyncio.run(run())
+
+def test_replica_routing(tmp_path, monkeypatch):
+    replicas = ReplicaSet([f"sqlite:///{tmp_path}/r1.db", f"sqlite:///{tmp_path}/r2.db"], pin_seconds=60)
+    for replica in replicas.replicas:
+        with replica.engine.connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
+
+    def request(method, token="a"):
+        return SimpleNamespace(method=method, headers={"authorization": f"Bearer {token}"}, client=("127.0.0.1", 1))
+
+    # No request (scripts) and writes go to the primary
+    assert replicas.route(None) is None
+    assert replicas.route(request("POST")) is None
+    # Reads alternate between the replicas
+    first, second = replicas.route(request("GET")), replicas.route(request("GET"))
+    assert {first, second} == set(replicas.replicas)
+    replicas.release(first)
+    replicas.release(second)
+    # Read-your-writes pins one client to the primary
+    pinned = request("GET")
+    replicas.pin(database.client_key(pinned.headers, pinned.client))
+    assert replicas.route(request("GET")) is None
+    assert replicas.route(request("GET", token="other")) is not None
+
+def _asset_with_prices(engine, symbol):
+    from app.models import Asset, AssetPrice
+    from app.services.price_store import is_partitioned, price_store
+    from app.services.resampling import update_rollups
+    day = datetime.datetime(2023, 2, 6, 9, 30)
+    with engine.begin() as connection:
+        asset_id = connection.execute(Asset.__table__.insert().values(
+            symbol=symbol, name=symbol, asset_type="STOCK", created_at=day, updated_at=day,
+        )).inserted_primary_key[0]
+        bars = [
+            SimpleNamespace(
+                asset_id=asset_id, timestamp=day + datetime.timedelta(minutes=i),
+                open_price=1.0, high_price=2.0, low_price=0.5, close_price=1.5, volume=10.0,
+            )
+            for i in range(3)
+        ]
+        if is_partitioned():
+            price_store.write(connection, bars, rollup=False)
+        else:
+            connection.execute(AssetPrice.__table__.insert(), [vars(bar) for bar in bars])
+        update_rollups(connection, bars)
+    return asset_id, day
+
+@pytest.mark.parametrize("storage", ["table", "partitioned"])
+@pytest.mark.parametrize("interval", [None, "1d", "1w"])
+def test_price_reads_run_on_the_read_pool(engine, monkeypatch, storage, interval):
+    from app.core.config import settings
+    from app.services.resampling import load_price_columns
+    monkeypatch.setattr(settings, "PRICE_STORAGE", storage)
+    asset_id, day = _asset_with_prices(engine, f"READ-{storage}-{interval}")
+    counts = {"writer": 0, "reader": 0}
+
+    def counter(name):
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            counts[name] += 1
+        return _count
+
+    listeners = [(database.engine, counter("writer")), (database.read_engine, counter("reader"))]
+    for bound, listener in listeners:
+        event.listen(bound, "before_cursor_execute", listener)
+    try:
+        with ReadWriteSession(database.engine, **session_options(database.read_engine)) as session:
+            prices = load_price_columns(session, asset_id, interval, day - datetime.timedelta(days=1), day + datetime.timedelta(days=1))
+    finally:
+        for bound, listener in listeners:
+            event.remove(bound, "before_cursor_execute", listener)
+    assert len(prices["timestamp"]) == (3 if interval is None else 1)
+    assert counts["writer"] == 0
+    assert counts["reader"] > 0
@@ -0,0 +1,61 @@
+import uuid
+
+import pytest
+
+@pytest.fixture
+def member(client):
+    name = f"member-{uuid.uuid4().hex[:8]}"
+    response = client.post("/api/v1/auth/register", json={"email": f"{name}@example.com", "username": name, "password": "secret"})
+    assert response.status_code == 201, response.text
+    return {**response.json(), "password": "secret"}
+
+def _login(client, user, password=None):
+    return client.post("/api/v1/auth/login", data={"username": user["username"], "password": password or user["password"]})
+
+def _me(client, headers, user):
+    return client.get(f"/api/v1/users/{user['id']}", headers=headers)
+
+def test_register_and_login(client, member):
+    assert member["is_superuser"] is False
+    assert _login(client, member, "wrong").status_code == 401
+    response = _login(client, member)
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert _me(client, headers, member).json()["username"] == member["username"]
+    # The username is taken
+    response = client.post("/api/v1/auth/register", json={"email": "other@example.com", "username": member["username"], "password": "x"})
+    assert response.status_code == 400
+
+def test_deactivated_user_stops_authenticating_at_once(client, superuser_headers, member):
+    headers = {"Authorization": f"Bearer {_login(client, member).json()['access_token']}"}
+    # Caches the principal
+    assert _me(client, headers, member).status_code == 200
+    response = client.put(f"/api/v1/users/{member['id']}", json={"is_active": False}, headers=superuser_headers)
+    assert response.status_code == 200
+    assert response.json()["is_active"] is False
+    response = _me(client, headers, member)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Inactive user"
+    assert _login(client, member).status_code == 401
+
+def test_users_cannot_grant_themselves_roles(client, member):
+    headers = {"Authorization": f"Bearer {_login(client, member).json()['access_token']}"}
+    response = client.put(f"/api/v1/users/{member['id']}", json={"is_superuser": True}, headers=headers)
+    assert response.status_code == 403
+    # A password change applies to the next login
+    response = client.put(f"/api/v1/users/{member['id']}", json={"password": "changed"}, headers=headers)
+    assert response.status_code == 200
+    assert _login(client, member).status_code == 401
+    assert _login(client, member, "changed").status_code == 200
+
+def test_create_and_delete_user(client, superuser_headers, user_headers):
+    name = f"created-{uuid.uuid4().hex[:8]}"
+    body = {"email": f"{name}@example.com", "username": name, "password": "secret"}
+    assert client.post("/api/v1/users/", json=body, headers=user_headers).status_code == 403
+    response = client.post("/api/v1/users/", json=body, headers=superuser_headers)
+    assert response.status_code == 201, response.text
+    user = {**response.json(), "password": "secret"}
+    headers = {"Authorization": f"Bearer {_login(client, user).json()['access_token']}"}
+    assert _me(client, headers, user).status_code == 200
+    assert client.delete(f"/api/v1/users/{user['id']}", headers=superuser_headers).status_code == 204
+    assert _me(client, headers, user).status_code == 401
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, select
+
+from app.core.database import WriteQueue, configure_sqlite
+
+_metadata = MetaData()
+rows = Table("rows", _metadata, Column("id", Integer, primary_key=True))
+
+@pytest.fixture
+def queue(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/queue.db")
+    configure_sqlite(engine)
+    _metadata.create_all(engine)
+    queue = WriteQueue(engine)
+    yield queue
+    queue.close()
+    engine.dispose()
+
+def _insert(row_id):
+    def job(connection):
+        connection.execute(rows.insert().values(id=row_id))
+        return row_id
+    return job
+
+def _fail(connection):
+    connection.execute(rows.insert().values(id=99))
+    raise ValueError("bad job")
+
+def _grouped(queue, *jobs):
+    # Hold the writer so the jobs queue up and are committed as one group
+    running, release = threading.Event(), threading.Event()
+
+    def block(connection):
+        running.set()
+        release.wait(5)
+
+    blocker = queue.submit(block)
+    running.wait(5)
+    futures = [queue.submit(job) for job in jobs]
+    release.set()
+    blocker.result()
+    return futures
+
+def test_group_commit(queue):
+    futures = _grouped(queue, _insert(1), _insert(2), _insert(3))
+    assert [future.result() for future in futures] == [1, 2, 3]
+    assert queue.stats()["largest_group"] == 3
+    assert queue.regrouped == 0
+
+def test_failed_group_is_run_again_job_by_job(queue):
+    first, failing, last = _grouped(queue, _insert(1), _fail, _insert(2))
+    assert first.result() == 1
+    assert last.result() == 2
+    with pytest.raises(ValueError):
+        failing.result()
+    assert queue.regrouped == 1
+    # The group's transaction and the failing job's own were rolled back
+    with queue.engine.connect() as connection:
+        assert connection.execute(select(rows.c.id).order_by(rows.c.id)).scalars().all() == [1, 2]
+    # The blocker, then each job of the rolled back group alone
+    assert queue.transactions == 4
+
+def test_job_cannot_queue_another(queue):
+    nested = queue.submit(lambda connection: queue.run(_insert(1)))
+    with pytest.raises(RuntimeError):
+        nested.result()